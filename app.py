@@ -7,12 +7,30 @@ from datetime import datetime
 from typing import List, Any, Dict, Optional, Tuple
 import warnings
 import json
+import hashlib
 import pathlib
 import requests
 import shutil
+from contextlib import contextmanager, nullcontext
+from dataclasses import replace
 from tools.converters.converter_factory import ConverterFactory
+from tools.converters.conversion_cache import ConversionCache
+from tools.converters.incremental import PageStore
+from tools.ai_providers.batch import BatchClient, BatchProvider
 from tools.ai_providers.provider_factory import AIProviderFactory
+from tools.ai_providers.rate_limiter import DEFAULT_RATE_LIMITS, FALLBACK_RATE_LIMITS, set_rate_limits
+from tools.ai_providers.response_cache import CachedProvider, ResponseCache
 from tools.esco.esco_client import ESCOClient
+from tools.esco.offline_index import DEFAULT_INDEX_PATH, OfflineESCOClient, build_index
+from tools.esco.response_cache import ESCOResponseCache
+from tools.esco.skill_index import MAX_MATCHES, MIN_MATCH_SIMILARITY, SkillIndex, SkillIndexCache
+from tools.pipeline.chunking import chunks_mentioning, context_budget, count_tokens, merge_lernfelder, split_markdown
+from tools.pipeline.sections import SectionIndex, normalize_text
+from tools.pipeline.tracing import DocumentTrace, span
+from tools.pipeline.structured_output import (
+    DOCUMENT_INSTRUCTION, DOCUMENT_SCHEMA, LERNFELD_INSTRUCTION, LERNFELD_SCHEMA,
+    build_document_data, json_schema_format, lernfeld_to_rows, parse_json_response
+)
 
 warnings.filterwarnings("ignore", message="`resume_download` is deprecated")
 warnings.filterwarnings("ignore", message="`huggingface_hub` cache-system uses symlinks")
@@ -46,121 +64,333 @@ def save_csv(data: List[List[str]], output_path: str):
     except Exception as e:
         print_status(f"Fehler beim Speichern der CSV-Datei {output_path}: {e}", 'red')
 
-def call_openai(client: Any, messages: List[dict], model: str = 'gpt-3.5-turbo') -> Optional[str]:
+def call_openai(client: Any, messages: List[dict], model: str = 'gpt-3.5-turbo', **kwargs) -> Optional[str]:
     """Wrapper für OpenAI API Calls mit Retry-Logik"""
     try:
-        response = client.analyze_text(
-            text=messages[-1]["content"],
-            prompt_template=messages[0]["content"],
-            model=model
-        )
+        response = client.analyze_messages(messages, model=model, **kwargs)
         return response
     except Exception as e:
         print_status(f"Fehler beim OpenAI API Call: {e}", color='red')
         return None
 
-def process_pdf_texts(pdf_file: str, converter: str) -> str:
-    """Konvertiert PDF zu Markdown."""
-    filename = os.path.basename(pdf_file)
+def call_openai_concurrently(client: Any, message_lists: List[List[dict]], model: str,
+                             max_concurrency: int = 4, **kwargs) -> List[Optional[str]]:
+    """Führt mehrere unabhängige OpenAI API Calls nebenläufig aus und liefert die Antworten in Reihenfolge."""
+    try:
+        return client.analyze_batch(message_lists, model=model, max_concurrency=max_concurrency, **kwargs)
+    except Exception as e:
+        print_status(f"Fehler beim OpenAI API Call: {e}", color='red')
+        return [None] * len(message_lists)
+
+def waiting_for_batch(ai_provider: Any, pending_start: int, name: str) -> bool:
+    """Prüft, ob für ein Dokument Anfragen auf den nächsten Batch warten, und meldet dies."""
+    if ai_provider.pending_requests() > pending_start:
+        print_status(f"{name}: wartet auf die Ergebnisse des nächsten Batches", color='blue')
+        return True
+    return False
+
+@contextmanager
+def batch_document(doc_trace: DocumentTrace, source_path: str, completed_documents: set,
+                   results: List[List[str]], document_results: List[List[str]]):
+    """
+    Verfolgt ein Dokument über die Durchläufe des Batch-Modus.
+    
+    Hat das Dokument in diesem Durchlauf keine Anfrage vorgemerkt, ist es abgeschlossen und wird in
+    späteren Durchläufen übersprungen; erst dann werden seine Ergebniszeilen in results übernommen,
+    damit sie nicht je Durchlauf erneut erscheinen. Sonst wird sein Trace nicht gespeichert, nur der
+    des letzten Durchlaufs.
+    """
+    yield
+    if doc_trace.root.totals().get("batch_queued"):
+        doc_trace.output_path = None
+    else:
+        completed_documents.add(source_path)
+        results.extend(document_results)
+
+def document_messages(md_text: str, instruction: str) -> List[dict]:
+    """
+    Baut die Nachrichten für eine Anfrage zu einem Dokument.
+    
+    Das Dokument steht als gleichbleibendes Präfix vor der wechselnden Anweisung, damit
+    der Prompt-Cache des Providers bei allen Anfragen zum selben Dokument greift.
+    """
+    return [
+        {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
+        {"role": "user", "content": "Dokument:\n\n" + md_text},
+        {"role": "user", "content": instruction}
+    ]
+
+def lernfeld_texts(md_text: str, section_index: Optional[SectionIndex], chunks: List[str],
+                   lernfeld_zeitraum_kombinationen: List[List[str]], model: str, budget: int) -> Dict[str, List[str]]:
+    """
+    Ermittelt je Lernfeld die zu sendenden Texte.
+    
+    Das ist der Abschnitt des Lernfelds mit Dokumentkopf oder das ganze Dokument. Überschreitet
+    der Text das Kontextbudget, werden alle Teile gesendet, in denen das Lernfeld vorkommt.
+    """
+    texts = {}
+    for entry in lernfeld_zeitraum_kombinationen:
+        if entry[2] in texts:
+            continue
+        text = section_index.text_for(entry[2]) if section_index else md_text
+        if count_tokens(text, model) <= budget:
+            texts[entry[2]] = [text]
+        else:
+            texts[entry[2]] = chunks_mentioning(chunks, entry[2]) or chunks
+    return texts
+
+def extract_lernfelder_structured(client: Any, texts: Dict[str, List[str]], lernfeld_zeitraum_kombinationen: List[List[str]],
+                                  model: str, max_concurrency: int = 4) -> List[Dict[str, Any]]:
+    """Fragt Zeiträume, Zeitwerte und Lernziele je Lernfeld und Text mit einer strukturierten Antwort ab (texts aus lernfeld_texts)."""
+    zeitraeume_je_lernfeld: Dict[str, List[str]] = {}
+    for entry in lernfeld_zeitraum_kombinationen:
+        zeitraeume_je_lernfeld.setdefault(entry[2], []).append(entry[3])
+    
+    anfragen = [(lernfeld, text) for lernfeld in zeitraeume_je_lernfeld for text in texts[lernfeld]]
+    message_lists = [
+        document_messages(text, LERNFELD_INSTRUCTION.format(lernfeld_name=lernfeld,
+                                                            zeitraeume="; ".join(zeitraeume_je_lernfeld[lernfeld])))
+        for lernfeld, text in anfragen
+    ]
+    pending_start = client.pending_requests()
+    responses = call_openai_concurrently(client, message_lists, model, max_concurrency,
+                                         response_format=json_schema_format("lernfeld", LERNFELD_SCHEMA))
+    # Im Batch-Modus vorgemerkte Anfragen haben noch keine Antwort, das ist kein Fehler
+    queued = client.pending_requests() > pending_start
+    
+    ergebnisse: Dict[str, List[Dict[str, Any]]] = {}
+    for (lernfeld, _), response in zip(anfragen, responses):
+        data = parse_json_response(response)
+        if data is None:
+            continue
+        # Namen aus der Lernfeld-Abfrage beibehalten, damit die Zuordnung eindeutig bleibt
+        data["lernfeld"] = lernfeld
+        ergebnisse.setdefault(lernfeld, []).append(data)
+    for lernfeld in zeitraeume_je_lernfeld:
+        if lernfeld not in ergebnisse and not queued:
+            print_status(f"Keine strukturierte Antwort für {lernfeld} erhalten", color='red')
+    return merge_lernfelder(list(ergebnisse.values()))
+
+def extract_document_structured(client: Any, chunks: List[str], model: str, max_concurrency: int = 4) -> List[Dict[str, Any]]:
+    """Fragt alle Lernfelder eines Dokuments mit einer strukturierten Antwort je Teil ab und führt sie zusammen."""
+    pending_start = client.pending_requests()
+    responses = call_openai_concurrently(client, [document_messages(chunk, DOCUMENT_INSTRUCTION) for chunk in chunks],
+                                         model, max_concurrency,
+                                         response_format=json_schema_format("dokument", DOCUMENT_SCHEMA))
+    ergebnisse = [data["lernfelder"] for data in map(parse_json_response, responses) if data is not None]
+    if not ergebnisse and client.pending_requests() <= pending_start:
+        print_status("Keine strukturierte Antwort für das Dokument erhalten", color='red')
+    return merge_lernfelder(ergebnisse)
+
+@st.cache_resource
+def get_conversion_cache() -> ConversionCache:
+    """Gibt den prozessweit geteilten Konvertierungs-Cache zurück."""
+    return ConversionCache()
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Gibt den prozessweit geteilten Cache für LLM-Antworten zurück."""
+    return ResponseCache()
+
+@st.cache_resource
+def get_esco_client() -> ESCOClient:
+    """Gibt den prozessweit geteilten ESCO-Client mit Verbindungspool und Antwort-Cache zurück."""
+    return ESCOClient(cache=ESCOResponseCache())
+
+@st.cache_resource
+def get_offline_esco_client(index_path: str) -> OfflineESCOClient:
+    """Gibt den prozessweit geteilten ESCO-Client für einen Offline-Index zurück, mit einer SQLite-Verbindung je Index."""
+    return OfflineESCOClient(index_path)
+
+@st.cache_resource
+def get_skill_index_cache() -> SkillIndexCache:
+    """Gibt den prozessweit geteilten Cache für die Vektorindizes der ESCO-Kompetenzen zurück."""
+    return SkillIndexCache()
+
+@st.cache_resource
+def get_page_store() -> PageStore:
+    """Gibt den prozessweit geteilten Speicher für seitenweise konvertiertes Markdown zurück."""
+    return PageStore()
+
+def process_pdf_batch(pdf_files: List[str], converter: str, conversion_cache: Optional[ConversionCache] = None,
+                      sandbox_options: Optional[Dict[str, Any]] = None,
+                      in_memory_documents: Optional[Dict[str, bytes]] = None,
+                      page_store: Optional[PageStore] = None) -> Dict[str, str]:
+    """Konvertiert mehrere PDFs in einem Durchlauf zu Markdown, hochgeladene Inhalte direkt aus dem Speicher."""
+    in_memory_documents = in_memory_documents or {}
+    if not pdf_files:
+        return {}
     
     try:
-        print_status(f"Konvertiere {filename} mit {converter}...", color='blue')
+        print_status(f"Konvertiere {len(pdf_files)} PDF-Datei(en) mit {converter}...", color='blue')
         # Hole den passenden Konverter über die Factory
-        # Konvertiere alte Namen in neue Namen
-        name_mapping = {
-            "IBMDocling": "IBMDocling (genau)",
-            "PyMuPDF4LLM": "PyMuPDF4LLM (schnell)",
-            "PDFPlumber": "PDFPlumber (robust)"
-        }
-        converter = name_mapping.get(converter, converter)
-        converter_instance = ConverterFactory.get_converter(converter)
-        # Konvertiere die Datei
-        md_text = converter_instance.convert_to_markdown(pdf_file)
+        converter_instance = ConverterFactory.get_converter(converter, cache=conversion_cache, page_store=page_store,
+                                                            **(sandbox_options or {}))
+        # Konvertiere alle Dateien gemeinsam, damit Modelle nur einmal geladen werden
+        converted = converter_instance.convert_all([f for f in pdf_files if f not in in_memory_documents])
+        # Hochgeladene Dokumente ohne erneutes Lesen von der Festplatte konvertieren
+        for pdf_file in pdf_files:
+            if pdf_file in in_memory_documents:
+                converted[pdf_file] = converter_instance.convert_to_markdown(in_memory_documents[pdf_file])
         
-        if md_text:
-            # Speichere die Markdown-Datei im output Ordner
-            output_path = os.path.join('output', os.path.splitext(filename)[0] + '.md')
-            os.makedirs('output', exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(md_text)
-            print_status(f"PDF-Konvertierung von {filename} erfolgreich abgeschlossen", color='green')
-            return md_text
-        else:
-            print_status(f"Fehler bei der Konvertierung von {filename}: Keine Ausgabe erhalten", 'red')
-            return ""
+        md_texts = {}
+        for pdf_file, md_text in converted.items():
+            filename = os.path.basename(pdf_file)
+            if md_text:
+                md_texts[pdf_file] = md_text
+                info = converter_instance.get_conversion_info(in_memory_documents.get(pdf_file, pdf_file))
+                ocr_hint = f" (OCR für {info['ocr_page_count']} Seiten)" if "ocr_page_count" in info else ""
+                if info.get("reused_pages"):
+                    ocr_hint += f" ({info['reused_pages']} unveränderte Seiten übernommen)"
+                if info.get("failed_attempts"):
+                    ocr_hint += f" (Fallback auf {info['converter']})"
+                print_status(f"PDF-Konvertierung von {filename} erfolgreich abgeschlossen{ocr_hint}", color='green')
+            else:
+                print_status(f"Fehler bei der Konvertierung von {filename}: Keine Ausgabe erhalten", 'red')
+        return md_texts
     except Exception as e:
-        print_status(f"Fehler bei der Konvertierung von {filename}: {e}", 'red')
-        return ""
+        print_status(f"Fehler bei der Konvertierung: {e}", 'red')
+        return {}
 
-def process_all_files(data_folder: str, api_key: str, selected_model: str, prompts: Dict[str, Any], output_folder: str, converter: str) -> (List[List[str]], List[str], List[str]):
+def process_all_files(data_folder: str, api_key: str, selected_model: str, prompts: Dict[str, Any], output_folder: str, converter: str,
+                      sandbox_options: Optional[Dict[str, Any]] = None,
+                      uploaded_documents: Optional[Dict[str, bytes]] = None,
+                      llm_concurrency: int = 4,
+                      use_response_cache: bool = True,
+                      extraction_mode: str = "lernfeld",
+                      section_retrieval: bool = True,
+                      context_budget_tokens: Optional[int] = None,
+                      batch_provider: Optional[BatchProvider] = None,
+                      esco_index_path: Optional[str] = None,
+                      esco_shortlist_k: int = 10,
+                      esco_matching_mode: str = "llm",
+                      esco_min_similarity: float = MIN_MATCH_SIMILARITY,
+                      esco_max_matches: int = MAX_MATCHES,
+                      completed_documents: Optional[set] = None) -> (List[List[str]], List[str], List[str]):
+    """
+    Verarbeitet alle Dateien im Datenordner.
+    
+    Im Batch-Modus werden die Pfade abgeschlossener Dokumente in completed_documents gesammelt
+    und in weiteren Durchläufen mit derselben Menge übersprungen.
+    """
     results = []
     json_paths = []
     csv_paths = []
     berufsbeschreibungen = {}  # Initialize berufsbeschreibungen dictionary
+    traces = []
     
-    # Initialisiere KI-Provider und ESCO Client
-    ai_provider = AIProviderFactory.get_provider('OpenAI')
-    ai_provider.initialize(api_key)
-    esco_client = ESCOClient()
+    # Geteilten KI-Provider holen und ESCO Client initialisieren
+    response_cache = get_response_cache()
+    if batch_provider is not None:
+        ai_provider = CachedProvider(batch_provider, 'OpenAI', response_cache, bypass=not use_response_cache)
+    else:
+        ai_provider = AIProviderFactory.get_shared_provider('OpenAI', api_key, cache=response_cache,
+                                                            bypass_cache=not use_response_cache)
+    # Mit Offline-Index werden Berufe und Kompetenzen ohne Netzwerkzugriff gesucht
+    esco_client = get_offline_esco_client(esco_index_path) if esco_index_path else get_esco_client()
+    conversion_cache = get_conversion_cache()
     
     # Konverter-Name bereinigen
     converter = converter.split()[0] if " " in converter else converter
     
+    # Alle PDFs vorab gemeinsam konvertieren
+    pdf_files = [
+        os.path.join(root, file)
+        for root, dirs, files in os.walk(data_folder)
+        for file in files if file.endswith('.pdf')
+        and os.path.join(root, file) not in (completed_documents or ())
+    ]
+    # Hochgeladene Dateien liegen bereits im Speicher vor
+    uploaded_documents = uploaded_documents or {}
+    in_memory_documents = {
+        pdf_file: uploaded_documents[os.path.basename(pdf_file)]
+        for pdf_file in pdf_files
+        if os.path.basename(pdf_file) in uploaded_documents
+        and os.path.normpath(os.path.dirname(pdf_file)) == os.path.normpath(data_folder)
+    }
+    page_store = get_page_store()
+    with span("Konvertierung", kind="conversion", converter=converter, files=len(pdf_files)) as conversion_span:
+        converted_texts = process_pdf_batch(pdf_files, converter, conversion_cache, sandbox_options, in_memory_documents,
+                                            page_store)
+    
     for root, dirs, files in os.walk(data_folder):
         for file in files:
             if file.endswith('.pdf') or file.endswith('.md'):
                 source_path = os.path.join(root, file)
                 filename = os.path.basename(source_path)
+                if completed_documents is not None and source_path in completed_documents:
+                    continue
                 
                 # Verarbeitung der Datei
                 if not hasattr(st.session_state, 'progress_container'):
                     st.session_state.progress_container = st.container()
 
-                with st.session_state.progress_container:
+                # Trace mit Dauer, Tokens, Kosten, Cache-Treffern und Wiederholungen je Schritt
+                trace_path = os.path.join(
+                    output_folder, f"{os.path.splitext(file)[0]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_trace.json"
+                )
+                doc_trace = DocumentTrace(filename, trace_path, model=selected_model, extraction_mode=extraction_mode)
+                # Im Batch-Modus werden die Ergebniszeilen erst bei Abschluss des Dokuments übernommen
+                document_results = [] if completed_documents is not None else results
+                with st.session_state.progress_container, doc_trace, \
+                        (batch_document(doc_trace, source_path, completed_documents, results, document_results)
+                         if completed_documents is not None else nullcontext()):
+                    traces.append(doc_trace)
+                    
                     # Progress header
                     st.subheader(f"Verarbeite: {filename}")
                     progress_text = st.empty()
                     
-                    # Update progress
-                    def update_progress(step: str):
+                    # Update progress und neuen Schritt im Trace beginnen
+                    def update_progress(step: str, span_name: Optional[str] = None):
                         progress_text.text(f"Schritt: {step}")
+                        doc_trace.step(span_name or step)
                     
+                    # Die gemeinsame Konvertierung aller PDFs nur im Trace des ersten Dokuments
+                    # zählen, damit Summen über mehrere Dokumente sie nicht mehrfach enthalten
+                    if file.endswith('.pdf') and conversion_span is not None:
+                        doc_trace.attach(conversion_span)
+                        conversion_span = None
                     update_progress("Konvertiere Datei")
                     
                     # Bestimme den Pfad für die Markdown-Datei
                     md_filename = os.path.splitext(filename)[0] + '.md'
                     md_output_path = os.path.join(output_folder, md_filename)
                     
-                    # Prüfe ob bereits eine konvertierte Markdown-Datei existiert
-                    if os.path.exists(md_output_path):
-                        print_status(f"Verwende existierende Markdown-Datei: {md_output_path}", color='green')
-                        with open(md_output_path, 'r', encoding='utf-8') as f:
-                            md_text = f.read()
-                    else:
-                        # PDF zu Markdown konvertieren wenn nötig
-                        if file.endswith('.pdf'):
-                            md_text = process_pdf_texts(source_path, converter)
-                            if not md_text:
-                                continue
-                            # Speichere die konvertierte Datei
-                            with open(md_output_path, 'w', encoding='utf-8') as f:
-                                f.write(md_text)
-                            print_status(f"Neue Markdown-Datei erstellt: {md_output_path}", color='green')
-                        else:  # .md Datei
-                            try:
-                                with open(source_path, 'r', encoding='utf-8') as f:
-                                    md_text = f.read()
-                            except Exception as e:
-                                print_status(f"Fehler beim Lesen der Markdown-Datei {file}: {e}", 'red')
-                                continue
+                    # Konvertiertes Markdown der PDF übernehmen
+                    if file.endswith('.pdf'):
+                        md_text = converted_texts.get(source_path)
+                        if not md_text:
+                            continue
+                        # Speichere die konvertierte Datei
+                        with open(md_output_path, 'w', encoding='utf-8') as f:
+                            f.write(md_text)
+                        print_status(f"Markdown-Datei erstellt: {md_output_path}", color='green')
+                    else:  # .md Datei
+                        try:
+                            with open(source_path, 'r', encoding='utf-8') as f:
+                                md_text = f.read()
+                        except Exception as e:
+                            print_status(f"Fehler beim Lesen der Markdown-Datei {file}: {e}", 'red')
+                            continue
+                    
+                    pending_start = ai_provider.pending_requests()
+                    section_index = SectionIndex(md_text) if section_retrieval else None
+                    
+                    # Kontextbudget prüfen und zu lange Dokumente an Abschnittsgrenzen aufteilen
+                    budget = context_budget_tokens or context_budget(selected_model)
+                    document_tokens = count_tokens(md_text, selected_model)
+                    chunks = [md_text]
+                    if document_tokens > budget:
+                        chunks = split_markdown(md_text, budget, selected_model)
+                        print_status(f"{file} umfasst {document_tokens} Tokens und überschreitet das Kontextbudget "
+                                     f"von {budget} Tokens für {selected_model}, Verarbeitung in {len(chunks)} Teilen",
+                                     color='yellow')
                     
                     # 1. Dokumententyp bestimmen
                     update_progress("Bestimme Dokumententyp")
-                    doc_type_messages = [
-                        {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
-                        {"role": "user", "content": prompts["document_type_prompt"] + "\n\n" + md_text}
-                    ]
-                    document_type = call_openai(ai_provider, doc_type_messages, selected_model).strip()
+                    doc_type_messages = document_messages(chunks[0], prompts["document_type_prompt"])
+                    document_type = (call_openai(ai_provider, doc_type_messages, selected_model) or "").strip()
                     if not document_type:
                         continue
                     
@@ -170,11 +400,8 @@ def process_all_files(data_folder: str, api_key: str, selected_model: str, promp
                     # 2. Name des Berufsbildes
                     update_progress("Analysiere Berufsbild")
                     prompts_set = "rahmenlehrplan_prompts" if document_type == "Rahmenlehrplan" else "ausbildungsrahmenplan_prompts"
-                    berufsbild_messages = [
-                        {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
-                        {"role": "user", "content": prompts[prompts_set]["berufsbild_query"] + "\n\n" + md_text}
-                    ]
-                    berufsbild_name = call_openai(ai_provider, berufsbild_messages, selected_model).strip()
+                    berufsbild_messages = document_messages(chunks[0], prompts[prompts_set]["berufsbild_query"])
+                    berufsbild_name = (call_openai(ai_provider, berufsbild_messages, selected_model) or "").strip()
                     if not berufsbild_name:
                         continue
                     
@@ -185,13 +412,11 @@ def process_all_files(data_folder: str, api_key: str, selected_model: str, promp
                     
                     # 3. Berufsbeschreibung generieren
                     update_progress("Generiere Berufsbeschreibung")
-                    berufsbeschreibung_messages = [
-                        {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
-                        {"role": "user", "content": prompts[prompts_set]["berufsbeschreibung_query"] + "\n\n" + md_text}
-                    ]
-                    berufsbeschreibung = call_openai(ai_provider, berufsbeschreibung_messages, selected_model).strip()
+                    berufsbeschreibung_messages = document_messages(chunks[0], prompts[prompts_set]["berufsbeschreibung_query"])
+                    berufsbeschreibung = (call_openai(ai_provider, berufsbeschreibung_messages, selected_model) or "").strip()
                     if not berufsbeschreibung:
-                        print_status("Keine Berufsbeschreibung generiert", color='red')
+                        if not waiting_for_batch(ai_provider, pending_start, file):
+                            print_status("Keine Berufsbeschreibung generiert", color='red')
                         continue
                     
                     with st.expander("Generierte Berufsbeschreibung", expanded=False):
@@ -202,7 +427,7 @@ def process_all_files(data_folder: str, api_key: str, selected_model: str, promp
                         st.dataframe(berufsbeschreibung_df, use_container_width=True)
 
                     # Speichere Ergebnisse für später
-                    results.append([document_type, berufsbild_name])
+                    document_results.append([document_type, berufsbild_name])
                     berufsbeschreibungen[berufsbild_name] = berufsbeschreibung
                     
                     # 4. ESCO-Beruf suchen
@@ -259,80 +484,136 @@ def process_all_files(data_folder: str, api_key: str, selected_model: str, promp
                             print_status("Kein passender ESCO-Beruf gefunden", color='yellow')
                     
                     # 5. Lernfelder/Ausbildungsteile und ihre Zeiträume
-                    update_progress("Analysiere Lernfelder und Zeiträume")
-                    lernfeld_messages = [
-                        {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
-                        {"role": "user", "content": prompts[prompts_set]["lernfeld_query"] + "\n\n" + md_text}
-                    ]
-                    lernfeld_response = call_openai(ai_provider, lernfeld_messages, selected_model)
-                    
-                    # Parse die Antwort in Lernfeld-Zeitraum-Kombinationen
-                    lernfeld_zeitraum_kombinationen = []
-                    for line in lernfeld_response.strip().split('\n'):
-                        if line.strip():
-                            parts = line.strip().split(';')
-                            lernfeld = parts[0].strip()
-                            zeitraeume = [z.strip() for z in parts[1:]]
-                            for zeitraum in zeitraeume:
-                                lernfeld_zeitraum_kombinationen.append([document_type, berufsbild_name, lernfeld, zeitraum])
+                    document_data = None
+                    if extraction_mode == "dokument":
+                        # Alle Lernfelder mit Zeiträumen, Zeitwerten und Lernzielen in einer Antwort
+                        update_progress("Extrahiere alle Lernfelder strukturiert")
+                        lernfelder_structured = extract_document_structured(ai_provider, chunks, selected_model, llm_concurrency)
+                        lernfeld_zeitraum_kombinationen = [
+                            [document_type, berufsbild_name, lernfeld["lernfeld"], zeitraum["zeitraum"]]
+                            for lernfeld in lernfelder_structured for zeitraum in lernfeld["zeitraeume"]
+                        ]
+                    else:
+                        update_progress("Analysiere Lernfelder und Zeiträume")
+                        lernfeld_responses = call_openai_concurrently(
+                            ai_provider,
+                            [document_messages(chunk, prompts[prompts_set]["lernfeld_query"]) for chunk in chunks],
+                            selected_model,
+                            llm_concurrency
+                        )
+                        
+                        # Parse die Antworten in Lernfeld-Zeitraum-Kombinationen, an Teilgrenzen
+                        # doppelt genannte Lernfelder werden nur einmal übernommen
+                        lernfeld_zeitraum_kombinationen = []
+                        lernfeld_namen = {}
+                        gesehen = set()
+                        for lernfeld_response in lernfeld_responses:
+                            for line in (lernfeld_response or "").strip().split('\n'):
+                                if line.strip():
+                                    parts = line.strip().split(';')
+                                    lernfeld = lernfeld_namen.setdefault(normalize_text(parts[0]), parts[0].strip())
+                                    zeitraeume = [z.strip() for z in parts[1:]]
+                                    for zeitraum in zeitraeume:
+                                        if (lernfeld, zeitraum) in gesehen:
+                                            continue
+                                        gesehen.add((lernfeld, zeitraum))
+                                        lernfeld_zeitraum_kombinationen.append([document_type, berufsbild_name, lernfeld, zeitraum])
 
+                    if waiting_for_batch(ai_provider, pending_start, file):
+                        continue
+                    
+                    texts = lernfeld_texts(md_text, section_index, chunks, lernfeld_zeitraum_kombinationen,
+                                           selected_model, budget)
                     with st.expander("Lernfelder und Zeiträume", expanded=False):
                         st.subheader("Gefundene Lernfelder/Ausbildungsteile")
                         st.dataframe(pd.DataFrame(lernfeld_zeitraum_kombinationen,
                                    columns=["Dokumententyp", "Berufsbild", "Lernfeld/Ausbildungsteil", "Zeitraum"]))
+                        if section_index and texts and extraction_mode != "dokument":
+                            share = sum(len(text) for lf_texts in texts.values() for text in lf_texts) / (len(texts) * max(len(md_text), 1))
+                            found = sum(1 for lf_texts in texts.values() if lf_texts != [md_text])
+                            st.caption(f"Abschnitte gefunden für {found} von {len(texts)} Lernfeldern, "
+                                       f"Ø {share:.0%} des Dokuments je Anfrage")
                     
-                    # Verarbeite Zeitwerte und Lernziele
-                    final_entries = []
-                    for entry in lernfeld_zeitraum_kombinationen:
-                        lernfeld = entry[2]
-                        zeitraeume = [entry[3]]  # Liste für mögliche mehrere Zeiträume
-                        
-                        update_progress(f"Verarbeite Lernfeld: {lernfeld}")
-                        
-                        # Zeitwerte abfragen
-                        zeitwert_messages = [
-                            {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
-                            {"role": "user", "content": prompts[prompts_set]["zeitwerte_query"].format(
-                                lernfeld_name=lernfeld
-                            ) + "\n\n" + md_text}
-                        ]
-                        zeitwert_response = call_openai(ai_provider, zeitwert_messages, selected_model)
-                        zeitwerte = zeitwert_response.strip().split(';')
-                        
-                        # Lernziele abfragen
-                        lernziel_messages = [
-                            {"role": "system", "content": "Du bist ein hilfreicher Assistent."},
-                            {"role": "user", "content": prompts[prompts_set]["lernziel_query"].format(
-                                lernfeld_name=lernfeld
-                            ) + "\n\n" + md_text}
-                        ]
-                        lernziel_response = call_openai(ai_provider, lernziel_messages, selected_model)
+                    if extraction_mode == "lernfeld":
+                        # Zeiträume, Zeitwerte und Lernziele je Lernfeld in einer Antwort
+                        update_progress(f"Extrahiere {len(set(e[2] for e in lernfeld_zeitraum_kombinationen))} Lernfelder strukturiert",
+                                        "Extrahiere Lernfelder strukturiert")
+                        lernfelder_structured = extract_lernfelder_structured(
+                            ai_provider, texts, lernfeld_zeitraum_kombinationen, selected_model, llm_concurrency
+                        )
+                    
+                    if extraction_mode != "text":
+                        final_entries = []
+                        for lernfeld in lernfelder_structured:
+                            lernfeld_entries = lernfeld_to_rows(document_type, berufsbild_name, lernfeld)
+                            with st.expander(f"Lernziele - {lernfeld['lernfeld']}", expanded=False):
+                                st.dataframe(pd.DataFrame([[z[3], z[4], z[5]] for z in lernfeld_entries],
+                                                       columns=["Zeitraum", "Zeit", "Lernziel"]))
+                            final_entries.extend(lernfeld_entries)
+                        document_data = build_document_data(
+                            berufsbild_name, berufsbeschreibungen.get(berufsbild_name, ""), lernfelder_structured
+                        )
+                    else:
+                        # Zeitwerte und Lernziele aller Lernfelder sind voneinander unabhängig
+                        # und werden nebenläufig abgefragt
+                        update_progress(f"Verarbeite {len(lernfeld_zeitraum_kombinationen)} Lernfelder",
+                                        "Zeitwerte und Lernziele")
+                        # Bei Dokumenten über dem Kontextbudget wird jeder Teil abgefragt, in dem das Lernfeld vorkommt
+                        lernfeld_messages_list = []
+                        for entry in lernfeld_zeitraum_kombinationen:
+                            for text in texts[entry[2]]:
+                                for query in ("zeitwerte_query", "lernziel_query"):
+                                    lernfeld_messages_list.append(document_messages(
+                                        text, prompts[prompts_set][query].format(lernfeld_name=entry[2])
+                                    ))
+                        lernfeld_responses = iter(call_openai_concurrently(ai_provider, lernfeld_messages_list,
+                                                                           selected_model, llm_concurrency))
                         
-                        # Verarbeite Lernziele nach Zeiträumen
-                        with st.expander(f"Lernziele - {lernfeld}", expanded=False):
-                            for line in lernziel_response.strip().split('\n'):
-                                if line.strip():
-                                    zeitraum, lernziel = line.strip().split(';', 1)
-                                    zeitraum = zeitraum.strip()
-                                    lernziel = lernziel.strip()
-                                    
-                                    # Finde den passenden Zeitwert
-                                    zeitwert_index = zeitraeume.index(zeitraum) if zeitraum in zeitraeume else 0
-                                    zeitwert = zeitwerte[zeitwert_index] if zeitwert_index < len(zeitwerte) else "unspezifisch"
-                                    
-                                    final_entry = [
-                                        document_type,
-                                        berufsbild_name,
-                                        lernfeld,
-                                        zeitraum,
-                                        zeitwert.strip(),
-                                        lernziel
-                                    ]
-                                    final_entries.append(final_entry)
+                        # Verarbeite Zeitwerte und Lernziele
+                        final_entries = []
+                        for entry in lernfeld_zeitraum_kombinationen:
+                            lernfeld = entry[2]
+                            zeitraeume = [entry[3]]  # Liste für mögliche mehrere Zeiträume
+                            
+                            # Antworten aller Teile zusammenführen: erster Zeitwert, Lernziele ohne Duplikate
+                            zeitwert_response, lernziel_lines, gesehen = None, [], set()
+                            for _ in texts[lernfeld]:
+                                teil_zeitwert, teil_lernziele = next(lernfeld_responses), next(lernfeld_responses)
+                                zeitwert_response = zeitwert_response or (teil_zeitwert or "").strip() or None
+                                for line in (teil_lernziele or "").strip().split('\n'):
+                                    if line.strip() and normalize_text(line) not in gesehen:
+                                        gesehen.add(normalize_text(line))
+                                        lernziel_lines.append(line)
+                            zeitwerte = (zeitwert_response or "").strip().split(';')
                             
-                            # Zeige Zwischenergebnis
-                            st.dataframe(pd.DataFrame([[z[3], z[4], z[5]] for z in final_entries if z[2] == lernfeld],
-                                                   columns=["Zeitraum", "Zeit", "Lernziel"]))
+                            # Verarbeite Lernziele nach Zeiträumen
+                            with st.expander(f"Lernziele - {lernfeld}", expanded=False):
+                                for line in lernziel_lines:
+                                    if line.strip():
+                                        zeitraum, lernziel = line.strip().split(';', 1)
+                                        zeitraum = zeitraum.strip()
+                                        lernziel = lernziel.strip()
+                                        
+                                        # Finde den passenden Zeitwert
+                                        zeitwert_index = zeitraeume.index(zeitraum) if zeitraum in zeitraeume else 0
+                                        zeitwert = zeitwerte[zeitwert_index] if zeitwert_index < len(zeitwerte) else "unspezifisch"
+                                        
+                                        final_entry = [
+                                            document_type,
+                                            berufsbild_name,
+                                            lernfeld,
+                                            zeitraum,
+                                            zeitwert.strip(),
+                                            lernziel
+                                        ]
+                                        final_entries.append(final_entry)
+                                
+                                # Zeige Zwischenergebnis
+                                st.dataframe(pd.DataFrame([[z[3], z[4], z[5]] for z in final_entries if z[2] == lernfeld],
+                                                       columns=["Zeitraum", "Zeit", "Lernziel"]))
+                    
+                    if waiting_for_batch(ai_provider, pending_start, file):
+                        continue
                     
                     # Gesamtergebnis
                     with st.expander("Gesamtergebnis", expanded=True):
@@ -355,7 +636,10 @@ def process_all_files(data_folder: str, api_key: str, selected_model: str, promp
                         csv_path = os.path.join(output_folder, csv_filename)
                         
                         # Erstelle und speichere JSON mit ESCO-Daten
-                        json_data = save_json(final_entries, esco_data, json_path, ai_provider, selected_model, berufsbeschreibungen)
+                        update_progress("Ordne Lernziele ESCO-Kompetenzen zu")
+                        json_data = save_json(final_entries, esco_data, json_path, ai_provider, selected_model, berufsbeschreibungen,
+                                              document_data, pending_start, esco_shortlist_k,
+                                              esco_matching_mode, esco_min_similarity, esco_max_matches)
                         
                         if json_data:
                             # Speichere CSV mit den vollständigen Daten
@@ -377,29 +661,129 @@ def process_all_files(data_folder: str, api_key: str, selected_model: str, promp
                                                 for mapping in lz_data["mappings"]:
                                                     st.write(f"  * {mapping['typ'].upper()}: {', '.join(mapping['kompetenzen'])}")
                         
-                        results.extend(final_entries)
+                        document_results.extend(final_entries)
                     else:
                         print_status("Keine Daten zum Speichern gefunden.", 'red')
+                    
+                    # Token-Nutzung je API-Aufruf dieses Dokuments aus dem Trace, unabhängig von anderen
+                    # Sitzungen auf demselben Provider, inklusive Treffer im Prompt-Cache des Providers
+                    call_spans = [call for call in doc_trace.root.descendants("llm") if call.metrics.get("calls")]
+                    if call_spans:
+                        totals = doc_trace.root.totals()
+                        with st.expander(
+                            f"Token-Nutzung ({totals['cached_tokens'] / totals['prompt_tokens'] if totals['prompt_tokens'] else 0:.0%} "
+                            f"der Eingabe-Tokens aus dem Prompt-Cache)",
+                            expanded=False
+                        ):
+                            st.dataframe(pd.DataFrame(
+                                [[call.attributes.get("model"), int(call.metrics.get("prompt_tokens", 0)),
+                                  int(call.metrics.get("cached_tokens", 0)), int(call.metrics.get("completion_tokens", 0)),
+                                  f"{call.elapsed:.1f} s", f"{call.metrics.get('cost', 0):.4f} $"]
+                                 for call in call_spans],
+                                columns=["Modell", "Eingabe-Tokens", "davon gecacht", "Ausgabe-Tokens", "Dauer", "Kosten"]
+                            ))
+    
+    if traces:
+        show_trace_summary(traces)
+    
+    with st.expander("Caches", expanded=False):
+        st.dataframe(pd.DataFrame([[
+            cache_stats.hits,
+            cache_stats.misses,
+            f"{cache_stats.hit_rate:.0%}",
+            cache_stats.entries,
+            f"{cache_stats.size_bytes / (1024 * 1024):.1f} MB"
+        ] for cache_stats in (conversion_cache.stats(), page_store.stats(), response_cache.stats(),
+                              get_esco_client().cache.stats())],
+            columns=["Treffer", "Fehlzugriffe", "Trefferquote", "Einträge", "Größe"],
+            index=["Dokumente", "Seiten", "LLM-Antworten", "ESCO-Antworten"]))
+    
+    return results, json_paths, csv_paths
+
+def show_trace_summary(traces: List[DocumentTrace]) -> None:
+    """Zeigt Dauer, Aufrufe, Tokens und Kosten je Dokument und Verarbeitungsschritt an."""
+    rows = [
+        [trace.root.name, row["schritt"], f"{row['dauer']:.1f} s", f"{row['llm_seconds']:.1f} s", int(row["calls"]),
+         int(row["retries"]), int(row["cache_hits"]), int(row["prompt_tokens"]), int(row["cached_tokens"]),
+         int(row["completion_tokens"]), f"{row['cost']:.4f} $", int(row["esco_calls"]), f"{row['esco_seconds']:.1f} s"]
+        for trace in traces for row in trace.summary()
+    ]
+    total_cost = sum(trace.root.totals()["cost"] for trace in traces)
+    with st.expander(f"Laufzeit und Kosten je Schritt (gesamt {total_cost:.4f} $)", expanded=False):
+        st.dataframe(pd.DataFrame(rows, columns=[
+            "Dokument", "Schritt", "Dauer", "LLM-Dauer", "LLM-Aufrufe", "Wiederholungen", "Cache-Treffer",
+            "Eingabe-Tokens", "davon gecacht", "Ausgabe-Tokens", "Kosten", "ESCO-Aufrufe", "ESCO-Dauer"
+        ]), use_container_width=True)
+        st.caption("Die Traces je Dokument liegen als *_trace.json im Ausgabeordner. Die gemeinsame Konvertierung "
+                   "aller PDFs ist im ersten PDF-Dokument enthalten. Bei nebenläufigen Aufrufen summiert sich die "
+                   "LLM-Dauer über alle Aufrufe und kann die Dauer des Schritts übersteigen.")
+
+def process_all_files_batched(api_key: str, max_passes: int = 20, **kwargs) -> (List[List[str]], List[str], List[str]):
+    """
+    Verarbeitet alle Dateien über die Batch-API in mehreren Durchläufen.
+    
+    Jeder Durchlauf beantwortet alle Anfragen, deren Ergebnisse bereits vorliegen, und merkt
+    neue Anfragen vor. Diese werden gesammelt als ein Batch eingereicht; da spätere Schritte
+    von früheren abhängen, rückt jedes Dokument je Batch um die nächsten Schritte vor.
+    """
+    provider = AIProviderFactory.get_shared_provider('OpenAI', api_key)
+    batch_provider = BatchProvider(provider, BatchClient(provider.client))
+    st.session_state.status_container = st.empty()
+    batch_status = st.empty()
+    output = st.empty()
     
+    def show_batch(batch: Any) -> None:
+        counts = batch.request_counts
+        batch_status.info(f"Batch {batch.id}: {batch.status}"
+                          + (f" ({counts.completed}/{counts.total} Anfragen)" if counts else ""))
+    
+    # Abgeschlossene Dokumente werden in späteren Durchläufen nicht erneut verarbeitet und gespeichert
+    completed_documents = set()
+    results, json_paths, csv_paths = [], [], []
+    for durchlauf in range(1, max_passes + 1):
+        with output.container():
+            pass_results, pass_json_paths, pass_csv_paths = process_all_files(
+                api_key=api_key, batch_provider=batch_provider, completed_documents=completed_documents, **kwargs
+            )
+        results.extend(pass_results)
+        json_paths.extend(pass_json_paths)
+        csv_paths.extend(pass_csv_paths)
+        pending = batch_provider.pending_requests()
+        if not pending:
+            batch_status.success(f"Batch-Verarbeitung abgeschlossen nach {batch_provider.batches} Batches")
+            break
+        batch_status.info(f"Durchlauf {durchlauf}: {pending} Anfragen als Batch eingereicht, warte auf Ergebnisse ...")
+        batch_provider.flush(on_poll=show_batch)
+    else:
+        print_status(f"Batch-Verarbeitung nach {max_passes} Durchläufen abgebrochen", color='red')
     return results, json_paths, csv_paths
 
 def get_esco_occupation(berufsbild_name: str) -> Optional[Dict[str, Any]]:
     """Sucht nach einem Beruf in ESCO basierend auf dem Berufsbildnamen."""
-    esco_client = ESCOClient()
-    occupation = esco_client.get_occupation(berufsbild_name)
+    occupation = get_esco_client().get_occupation(berufsbild_name)
     return occupation
 
 def get_esco_skills(occupation_uri: str) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
     """Holt die wesentlichen und optionalen Kompetenzen für einen Beruf."""
-    esco_client = ESCOClient()
-    essential_skills, optional_skills = esco_client.get_skills(occupation_uri)
+    essential_skills, optional_skills = get_esco_client().get_skills(occupation_uri)
     return essential_skills, optional_skills
 
 def match_learning_objectives_with_esco(learning_objectives: List[str], esco_skills: List[Dict[str, str]], 
-                                      ai_provider: Any, model: str) -> Dict[str, List[Dict[str, str]]]:
-    """Ordnet Lernziele den ESCO-Kompetenzen zu."""
+                                      ai_provider: Any, model: str,
+                                      skill_index: Optional[SkillIndex] = None,
+                                      shortlist_k: int = 0) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Ordnet Lernziele den ESCO-Kompetenzen zu.
+    
+    Mit skill_index und shortlist_k werden dem Modell nur die shortlist_k ähnlichsten Kompetenzen
+    je Lernziel vorgelegt (Vereinigung über alle Lernziele, in der ursprünglichen Reihenfolge).
+    """
     if not learning_objectives or not esco_skills:
         return {}
+    
+    if skill_index is not None and 0 < shortlist_k < len(esco_skills):
+        candidates = sorted({i for shortlist in skill_index.shortlist(learning_objectives, shortlist_k) for i in shortlist})
+        esco_skills = [esco_skills[i] for i in candidates]
 
     # Erstelle nummerierte Listen
     numbered_objectives = [f"{i+1}. {obj}" for i, obj in enumerate(learning_objectives)]
@@ -430,7 +814,7 @@ Bitte gib nur die Zuordnungen zurück, keine weiteren Erklärungen.
         response = call_openai(ai_provider, messages, model)
         mappings = {}
         
-        for line in response.strip().split('\n'):
+        for line in (response or "").strip().split('\n'):
             if '->' in line:
                 try:
                     src, targets = line.split('->')
@@ -455,6 +839,24 @@ Bitte gib nur die Zuordnungen zurück, keine weiteren Erklärungen.
         print_status(f"Fehler bei der Zuordnung von Lernzielen zu ESCO-Kompetenzen: {e}", color='red')
         return {}
 
+def match_learning_objectives_by_similarity(learning_objectives: List[str], esco_skills: List[Dict[str, str]],
+                                            skill_index: SkillIndex,
+                                            min_similarity: float = MIN_MATCH_SIMILARITY,
+                                            max_matches: int = MAX_MATCHES) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Ordnet Lernziele ohne LLM über die Ähnlichkeit im Vektorindex den ESCO-Kompetenzen zu.
+    
+    Die Ähnlichkeit wird als Konfidenz der Zuordnung (0 bis 1) übernommen.
+    """
+    mappings = {}
+    for lernziel, matches in zip(learning_objectives, skill_index.match(learning_objectives, min_similarity, max_matches)):
+        if matches:
+            mappings[lernziel] = [
+                {'label': esco_skills[i]['label'], 'uri': esco_skills[i]['uri'], 'konfidenz': score}
+                for i, score in matches
+            ]
+    return mappings
+
 def process_document_data(data: List[List[str]], berufsbezeichnung: str, berufsbeschreibung: str) -> Dict[str, Any]:
     """Konvertiert die Rohdaten in eine hierarchische Struktur."""
     doc_data = {
@@ -553,8 +955,21 @@ def create_matching_structure(doc_data: Dict[str, Any], esco_data: Dict[str, Any
     return matching
 
 def save_json(data: List[List[str]], esco_data: Optional[Dict[str, Any]], output_path: str, 
-             ai_provider: Any, model: str, berufsbeschreibungen: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    """Speichert die Daten im JSON-Format mit hierarchischer Struktur."""
+             ai_provider: Any, model: str, berufsbeschreibungen: Dict[str, str],
+             document_data: Optional[Dict[str, Any]] = None,
+             pending_start: Optional[int] = None,
+             shortlist_k: int = 10,
+             matching_mode: str = "llm",
+             min_similarity: float = MIN_MATCH_SIMILARITY,
+             max_matches: int = MAX_MATCHES) -> Optional[Dict[str, Any]]:
+    """
+    Speichert die Daten im JSON-Format mit hierarchischer Struktur (document_data aus strukturierter Ausgabe).
+    
+    Mit pending_start wird im Batch-Modus nicht gespeichert, solange Zuordnungen auf den nächsten Batch warten.
+    Bei shortlist_k > 0 werden dem Modell je Lernziel nur die shortlist_k ähnlichsten ESCO-Kompetenzen
+    eines lokalen TF-IDF-Index vorgelegt. Mit matching_mode "vector" ordnet der Index die Lernziele
+    ohne LLM zu (höchstens max_matches Kompetenzen ab min_similarity, mit Konfidenz).
+    """
     try:
         # Erstelle die Basis-Struktur
         berufsbezeichnung = data[0][1]
@@ -562,7 +977,7 @@ def save_json(data: List[List[str]], esco_data: Optional[Dict[str, Any]], output
         json_data = {
             "dokumententyp": dokument_typ,
             "beruf": {
-                "dokumente_daten": process_document_data(data, berufsbezeichnung, berufsbeschreibungen.get(berufsbezeichnung, "")),
+                "dokumente_daten": document_data or process_document_data(data, berufsbezeichnung, berufsbeschreibungen.get(berufsbezeichnung, "")),
                 "esco_daten": {},
                 "matching": {}
             }
@@ -575,6 +990,23 @@ def save_json(data: List[List[str]], esco_data: Optional[Dict[str, Any]], output
         if esco_data:
             json_data["beruf"]["esco_daten"] = process_esco_data(esco_data)
             
+            # Alle Kompetenzen des Berufs, für alle Lernfelder gleich
+            all_skills = []
+            for skill_type in ["essentiell", "optional"]:
+                skills_data = json_data["beruf"]["esco_daten"]["kompetenzen"][skill_type]
+                for skill_id, skill_data in skills_data.items():
+                    all_skills.append({
+                        "label": skill_data["titel"],
+                        "description": skill_data["beschreibung"],
+                        "uri": skill_data["uri"],
+                        "type": skill_type
+                    })
+            # Vektorindex der Kompetenzen für die Vorauswahl, je Kompetenzliste nur einmal erstellt
+            skill_index = None
+            if all_skills and (matching_mode == "vector" or 0 < shortlist_k < len(all_skills)):
+                with span("Kompetenzindex", kind="index", skills=len(all_skills)):
+                    skill_index = get_skill_index_cache().get_or_build(all_skills)
+            
             # Erstelle und integriere die Mappings
             lernfelder = json_data["beruf"]["dokumente_daten"]["lernfelder_ausbildungsteile"]
             for lernfeld, lernfeld_data in lernfelder.items():
@@ -588,24 +1020,25 @@ def save_json(data: List[List[str]], esco_data: Optional[Dict[str, Any]], output
                         lz_mapping[lz_data["text"]] = {"zeitraum": zeitraum, "lz_id": lz_id}
                 
                 # Führe Mapping für alle Lernziele des Lernfelds durch
-                all_skills = []
-                for skill_type in ["essentiell", "optional"]:
-                    skills_data = json_data["beruf"]["esco_daten"]["kompetenzen"][skill_type]
-                    for skill_id, data in skills_data.items():
-                        all_skills.append({
-                            "label": data["titel"],
-                            "uri": data["uri"],
-                            "type": skill_type
-                        })
-                
                 if all_lernziele_im_lernfeld and all_skills:
-                    # Führe das Matching durch
-                    mappings = match_learning_objectives_with_esco(
-                        all_lernziele_im_lernfeld,
-                        all_skills,
-                        ai_provider,
-                        model
-                    )
+                    # Führe das Matching durch, im Modus "vector" ohne LLM über den Vektorindex
+                    if matching_mode == "vector":
+                        mappings = match_learning_objectives_by_similarity(
+                            all_lernziele_im_lernfeld,
+                            all_skills,
+                            skill_index,
+                            min_similarity,
+                            max_matches
+                        )
+                    else:
+                        mappings = match_learning_objectives_with_esco(
+                            all_lernziele_im_lernfeld,
+                            all_skills,
+                            ai_provider,
+                            model,
+                            skill_index,
+                            shortlist_k
+                        )
                     
                     # Integriere die Mappings in die JSON-Struktur
                     for lernziel_text, matched_skills in mappings.items():
@@ -619,8 +1052,13 @@ def save_json(data: List[List[str]], esco_data: Optional[Dict[str, Any]], output
                                     "kompetenz": skill["label"],
                                     "uri": skill["uri"]
                                 }
+                                if "konfidenz" in skill:
+                                    mapping["konfidenz"] = skill["konfidenz"]
                                 lernfelder[lernfeld]["zeitraeume"][zeitraum]["lernziele"][lz_id]["esco_mappings"].append(mapping)
         
+        if pending_start is not None and waiting_for_batch(ai_provider, pending_start, os.path.basename(output_path)):
+            return None
+            
         # Speichere die JSON-Datei
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(json_data, f, ensure_ascii=False, indent=2)
@@ -646,7 +1084,8 @@ def save_csv(json_data: Dict[str, Any], output_path: str):
             "Zeiteinheiten",
             "Lernziel Dokument",
             "Lernziel ESCO Entsprechung",
-            "Lernziel ESCO URI"
+            "Lernziel ESCO URI",
+            "Konfidenz der Zuordnung"
         ]
         
         rows = []
@@ -673,11 +1112,14 @@ def save_csv(json_data: Dict[str, Any], output_path: str):
                     
                     # Wenn keine ESCO-Mappings vorhanden sind
                     if not lz_data["esco_mappings"]:
-                        rows.append(base_row + ["-", "-"])
+                        rows.append(base_row + ["-", "-", "-"])
                     else:
                         # Für jedes Mapping eine neue Zeile
                         for mapping in lz_data["esco_mappings"]:
-                            row = base_row + [mapping["kompetenz"], mapping["uri"]]
+                            # Konfidenz nur bei Zuordnung über den Vektorindex, nicht durch das LLM
+                            konfidenz = mapping.get("konfidenz")
+                            row = base_row + [mapping["kompetenz"], mapping["uri"],
+                                              f"{konfidenz:.2f}" if konfidenz is not None else ""]
                             rows.append(row)
         
         # Speichere CSV
@@ -901,6 +1343,75 @@ with st.sidebar:
         )
         model_options = ["gpt-4o-mini", "gpt-4o"]
         selected_model = st.selectbox("Wähle das LLM-Modell", model_options, index=0)
+        default_limits = DEFAULT_RATE_LIMITS.get(selected_model, FALLBACK_RATE_LIMITS)
+        rate_limits = replace(
+            default_limits,
+            requests_per_minute=st.number_input(
+                "Anfragen je Minute (RPM)",
+                min_value=1,
+                value=default_limits.requests_per_minute,
+                step=100,
+                key=f"rpm_limit_{selected_model}",
+                help="Ratenlimit des eigenen API-Kontingents für das gewählte Modell (siehe Limits-Seite der OpenAI-Plattform)"
+            ),
+            tokens_per_minute=st.number_input(
+                "Tokens je Minute (TPM)",
+                min_value=1000,
+                value=default_limits.tokens_per_minute,
+                step=10000,
+                key=f"tpm_limit_{selected_model}",
+                help="Tokenlimit des eigenen API-Kontingents für das gewählte Modell. Die Voreinstellung entspricht "
+                     "der untersten Nutzungsstufe; höhere Stufen erlauben deutlich mehr Tokens je Minute"
+            )
+        )
+        set_rate_limits(selected_model, rate_limits)
+        llm_concurrency = st.number_input(
+            "Parallele LLM-Anfragen",
+            min_value=1,
+            max_value=16,
+            value=4,
+            help="Anzahl gleichzeitig gesendeter Anfragen je Dokument (1 = nacheinander)"
+        )
+        extraction_modes = {
+            "Strukturiert je Lernfeld": "lernfeld",
+            "Strukturiert für das ganze Dokument": "dokument",
+            "Textformat (Zeitwerte und Lernziele getrennt)": "text"
+        }
+        extraction_mode = extraction_modes[st.selectbox(
+            "Extraktionsmodus",
+            list(extraction_modes),
+            index=0,
+            help="Strukturierte Modi liefern Zeiträume, Zeitwerte und Lernziele als JSON in einer Antwort "
+                 "je Lernfeld bzw. für das ganze Dokument"
+        )]
+        context_budget_tokens = st.number_input(
+            "Kontextbudget (Tokens)",
+            min_value=1000,
+            max_value=200000,
+            value=context_budget(selected_model),
+            step=1000,
+            key=f"context_budget_{selected_model}",
+            help="Maximale Tokens des Dokumenttexts je Anfrage. Längere Dokumente werden an Abschnittsgrenzen "
+                 "aufgeteilt, die Teile parallel verarbeitet und die Ergebnisse zusammengeführt"
+        )
+        section_retrieval = st.checkbox(
+            "Nur relevante Abschnitte je Lernfeld senden",
+            value=True,
+            help="Anfragen zu einzelnen Lernfeldern erhalten nur deren Abschnitt und den Dokumentkopf statt des "
+                 "ganzen Dokuments. Wird kein Abschnitt gefunden, wird das ganze Dokument gesendet"
+        )
+        use_batch_api = st.checkbox(
+            "Batch-API verwenden",
+            value=False,
+            help="Alle Anfragen eines Verarbeitungsschritts werden gesammelt als Batch eingereicht. "
+                 "Halbe Kosten und keine Ratenlimits, Ergebnisse aber erst nach Abschluss des Batches (bis zu 24 h)"
+        )
+        use_response_cache = st.checkbox(
+            "Gespeicherte LLM-Antworten verwenden",
+            value=True,
+            help="Identische Anfragen werden aus dem lokalen Cache beantwortet. Deaktivieren, "
+                 "um alle Antworten neu abzufragen (der Cache wird dabei aktualisiert)"
+        )
 
     # Dokumentenkonvertierung
     with st.expander("Konverter Konfiguration", expanded=False):
@@ -913,6 +1424,20 @@ with st.sidebar:
             help="Wählen Sie den PDF Konverter aus"
         )
 
+        sandbox_enabled = st.checkbox(
+            "Isolierte Ausführung mit Fallback",
+            value=False,
+            help="Führt den Konverter in einem eigenen Prozess mit Zeit- und Speicherbudget aus "
+                 "und wechselt bei Überschreitung zum nächsten Konverter"
+        )
+        sandbox_options = None
+        if sandbox_enabled:
+            sandbox_options = {
+                "sandboxed": True,
+                "timeout": st.number_input("Zeitbudget je Datei (Sekunden)", min_value=10, value=300, step=30),
+                "max_rss_mb": st.number_input("Speicherbudget (MB)", min_value=256, value=4096, step=256)
+            }
+
         # Definiere erlaubte Dateiformate basierend auf Konvertierungstool
         allowed_extensions = []
         if "IBMDocling" in selected_converter:
@@ -922,6 +1447,55 @@ with st.sidebar:
         else:  # PDFPlumber
             allowed_extensions = ['.pdf', '.md']
 
+    # ESCO Konfiguration
+    with st.expander("ESCO Konfiguration", expanded=False):
+        esco_index_input = st.text_input("ESCO-Offline-Index", value=DEFAULT_INDEX_PATH, key='esco_index_path')
+        esco_sources = ["Offline-Index", "ESCO-API (online)"] if os.path.exists(esco_index_input) else ["ESCO-API (online)"]
+        esco_source = st.selectbox(
+            "ESCO-Quelle",
+            esco_sources,
+            index=0,
+            help="Der Offline-Index beantwortet Berufssuche und Kompetenzabfragen lokal in Millisekunden. "
+                 "Er wird einmalig aus dem ESCO-Download (CSV, Deutsch und Englisch) erstellt"
+        )
+        esco_index_path = esco_index_input if esco_source == "Offline-Index" else None
+        esco_dump_folder = st.text_input("Ordner mit ESCO-Download (CSV)", value="./esco", key='esco_dump_folder')
+        if st.button("Offline-Index erstellen", key="build_esco_index"):
+            with st.spinner("Erstelle ESCO-Offline-Index..."):
+                try:
+                    counts = build_index([esco_dump_folder], esco_index_input)
+                    # Geteilte Clients lesen sonst weiter aus der ersetzten Indexdatei
+                    get_offline_esco_client.clear()
+                    st.success(f"Index erstellt: {counts['occupations']} Berufe, {counts['skills']} Kompetenzen, "
+                               f"{counts['relations']} Relationen")
+                except Exception as e:
+                    st.error(f"Fehler beim Erstellen des ESCO-Index: {e}")
+        esco_shortlist_k = st.number_input(
+            "ESCO-Vorauswahl je Lernziel (Top-k)",
+            min_value=0,
+            value=10,
+            step=1,
+            help="Legt dem Modell je Lernziel nur die k ähnlichsten Kompetenzen eines lokalen TF-IDF-Index "
+                 "vor statt aller Kompetenzen des Berufs (0 = alle Kompetenzen)"
+        )
+        esco_matching_label = st.selectbox(
+            "ESCO-Zuordnung",
+            ["LLM", "Vektorähnlichkeit (ohne LLM)"],
+            index=0,
+            help="Ohne LLM werden die Lernziele über die Ähnlichkeit im lokalen TF-IDF-Index in Millisekunden "
+                 "zugeordnet, mit der Ähnlichkeit als Konfidenz der Zuordnung; geeignet für große Bestände"
+        )
+        esco_matching_mode = "vector" if esco_matching_label.startswith("Vektor") else "llm"
+        esco_min_similarity = MIN_MATCH_SIMILARITY
+        esco_max_matches = MAX_MATCHES
+        if esco_matching_mode == "vector":
+            esco_min_similarity = st.slider("Mindestähnlichkeit", min_value=0.0, max_value=1.0,
+                                            value=MIN_MATCH_SIMILARITY, step=0.05,
+                                            help="Zuordnungen unterhalb dieser Ähnlichkeit werden verworfen. Vor "
+                                                 "Massenläufen an einigen Lernzielen mit bekannter Zuordnung prüfen")
+            esco_max_matches = st.number_input("Höchstens Kompetenzen je Lernziel", min_value=1,
+                                               value=MAX_MATCHES, step=1)
+
     # Ordner Konfiguration
     with st.expander("Ordner Konfiguration", expanded=False):
         # Ordner Einstellungen
@@ -938,15 +1512,26 @@ with st.sidebar:
             uploaded_files = st.file_uploader("Dateien hochladen", 
                                            accept_multiple_files=True,
                                            key="file_uploader")
+            # Hochgeladene Inhalte bleiben im Speicher und werden direkt konvertiert. In den
+            # Datenordner wird eine Datei nur geschrieben, wenn sich ihr Inhalt geändert hat,
+            # nicht bei jedem Rerun.
+            written_uploads = st.session_state.setdefault("written_uploads", {})
+            uploaded_documents = {}
             if uploaded_files:
                 for uploaded_file in uploaded_files:
                     if not os.path.exists(data_folder):
                         os.makedirs(data_folder)
                     
+                    data = uploaded_file.getvalue()
+                    uploaded_documents[uploaded_file.name] = data
                     file_path = os.path.join(data_folder, uploaded_file.name)
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    st.success(f"Datei hochgeladen: {uploaded_file.name}")
+                    fingerprint = hashlib.sha256(data).hexdigest()
+                    if written_uploads.get(file_path) != fingerprint or not os.path.exists(file_path):
+                        with open(file_path, "wb") as f:
+                            f.write(data)
+                        written_uploads[file_path] = fingerprint
+                        st.success(f"Datei hochgeladen: {uploaded_file.name}")
+            st.session_state.uploaded_documents = uploaded_documents
         
         with tab2:
             folder = st.radio("Ordner auswählen", 
@@ -1034,14 +1619,26 @@ if st.button("Start Verarbeitung"):
                         
                     input_files.append(os.path.join(data_folder, file))
 
-                # Verarbeite die Dateien
-                results, json_paths, csv_paths = process_all_files(
+                # Verarbeite die Dateien, im Batch-Modus in mehreren Durchläufen
+                results, json_paths, csv_paths = (process_all_files_batched if use_batch_api else process_all_files)(
                     data_folder=data_folder,
                     api_key=api_key_input,
                     selected_model=selected_model,
                     prompts=prompts,
                     output_folder=output_folder,
-                    converter=selected_converter
+                    converter=selected_converter,
+                    sandbox_options=sandbox_options,
+                    uploaded_documents=st.session_state.get("uploaded_documents"),
+                    llm_concurrency=llm_concurrency,
+                    use_response_cache=use_response_cache,
+                    extraction_mode=extraction_mode,
+                    section_retrieval=section_retrieval,
+                    context_budget_tokens=context_budget_tokens,
+                    esco_index_path=esco_index_path,
+                    esco_shortlist_k=int(esco_shortlist_k),
+                    esco_matching_mode=esco_matching_mode,
+                    esco_min_similarity=esco_min_similarity,
+                    esco_max_matches=int(esco_max_matches)
                 )
                 
                 if json_paths and csv_paths:
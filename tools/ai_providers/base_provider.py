@@ -1,5 +1,53 @@
+import asyncio
+import functools
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from .concurrency import run_coroutine
+
+# Anzahl der Aufrufe, deren Nutzung ein Provider höchstens vorhält; die Nutzung je Dokument
+# steht im Trace des Dokuments (tools.pipeline.tracing)
+USAGE_LOG_SIZE = 1000
+
+# Standardwert für temperature, wenn der Aufrufer keinen angibt
+DEFAULT_TEMPERATURE = 0.7
+
+# Preise je 1 Mio. Tokens in USD: (Eingabe, gecachte Eingabe, Ausgabe)
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4': (30.00, 30.00, 60.00),
+    'gpt-4-turbo-preview': (10.00, 10.00, 30.00),
+    'gpt-3.5-turbo': (0.50, 0.50, 1.50),
+    'gpt-3.5-turbo-16k': (3.00, 3.00, 4.00)
+}
+
+@dataclass
+class CallUsage:
+    """Token-Nutzung eines einzelnen API-Aufrufs"""
+    model: str
+    prompt_tokens: int
+    cached_tokens: int  # Aus dem Prompt-Cache des Providers gelesene Eingabe-Tokens
+    completion_tokens: int
+    duration: float
+    
+    @property
+    def cache_ratio(self) -> float:
+        """Anteil der gecachten an allen Eingabe-Tokens (0.0 - 1.0)"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+    
+    @property
+    def cost(self) -> float:
+        """Kosten des Aufrufs in USD laut MODEL_PRICES, 0.0 für unbekannte Modelle"""
+        prices = MODEL_PRICES.get(self.model)
+        if prices is None:
+            # Antworten nennen das Modell mit Versionsdatum, z.B. gpt-4o-mini-2024-07-18
+            prices = next((MODEL_PRICES[m] for m in sorted(MODEL_PRICES, key=len, reverse=True)
+                           if self.model.startswith(m)), (0.0, 0.0, 0.0))
+        input_price, cached_price, output_price = prices
+        return ((self.prompt_tokens - self.cached_tokens) * input_price
+                + self.cached_tokens * cached_price
+                + self.completion_tokens * output_price) / 1_000_000
 
 class BaseAIProvider(ABC):
     """Basisklasse für alle KI-Provider"""
@@ -36,6 +84,148 @@ class BaseAIProvider(ABC):
         """
         pass
     
+    def analyze_messages(self,
+                         messages: List[Dict[str, str]],
+                         model: str,
+                         max_retries: int = 3,
+                         **kwargs) -> Optional[str]:
+        """
+        Sendet eine vollständige Nachrichtenliste an das KI-Modell
+        
+        Erlaubt Layouts mit mehreren Nachrichten, z.B. das Dokument als gleichbleibendes
+        Präfix und die wechselnde Anweisung als letzte Nachricht. Die Standardimplementierung
+        fasst die Nachrichten für analyze_text() zusammen.
+        
+        Args:
+            messages: Nachrichten im Format {"role": ..., "content": ...}
+            model: Name des zu verwendenden Modells
+            max_retries: Maximale Anzahl von Wiederholungsversuchen
+            **kwargs: Zusätzliche Parameter für den Provider
+            
+        Returns:
+            Optional[str]: Analyseergebnis oder None bei Fehler
+        """
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        user = [m["content"] for m in messages if m["role"] != "system"]
+        return self.analyze_text("\n\n".join(user), "\n\n".join(system), model, max_retries, **kwargs)
+    
+    async def analyze_text_async(self,
+                                 text: str,
+                                 prompt_template: str,
+                                 model: str,
+                                 max_retries: int = 3,
+                                 **kwargs) -> Optional[str]:
+        """
+        Asynchrone Variante von analyze_text()
+        
+        Args:
+            text: Zu analysierender Text
+            prompt_template: Template für den Prompt
+            model: Name des zu verwendenden Modells
+            max_retries: Maximale Anzahl von Wiederholungsversuchen
+            **kwargs: Zusätzliche Parameter für den Provider
+            
+        Returns:
+            Optional[str]: Analyseergebnis oder None bei Fehler
+        """
+        messages = [
+            {"role": "system", "content": prompt_template},
+            {"role": "user", "content": text}
+        ]
+        return await self.analyze_messages_async(messages, model, max_retries, **kwargs)
+    
+    async def analyze_messages_async(self,
+                                     messages: List[Dict[str, str]],
+                                     model: str,
+                                     max_retries: int = 3,
+                                     **kwargs) -> Optional[str]:
+        """
+        Asynchrone Variante von analyze_messages()
+        
+        Die Standardimplementierung führt analyze_messages() in einem Thread aus. Provider
+        mit asynchronem Client sollten die Methode überschreiben.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.analyze_messages, messages, model, max_retries, **kwargs)
+        )
+    
+    async def analyze_batch_async(self,
+                                  message_lists: Sequence[List[Dict[str, str]]],
+                                  model: str,
+                                  max_concurrency: int = 4,
+                                  **kwargs) -> List[Optional[str]]:
+        """
+        Sendet mehrere unabhängige Anfragen nebenläufig
+        
+        Args:
+            message_lists: Nachrichtenliste je Anfrage
+            model: Name des zu verwendenden Modells
+            max_concurrency: Maximale Anzahl gleichzeitiger Anfragen
+            **kwargs: Zusätzliche Parameter für analyze_messages_async()
+            
+        Returns:
+            List[Optional[str]]: Analyseergebnis (oder None bei Fehler) je Anfrage in Eingabereihenfolge
+        """
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        
+        async def analyze(messages: List[Dict[str, str]]) -> Optional[str]:
+            async with semaphore:
+                return await self.analyze_messages_async(messages, model, **kwargs)
+                
+        return list(await asyncio.gather(*(analyze(messages) for messages in message_lists)))
+    
+    def analyze_batch(self,
+                      message_lists: Sequence[List[Dict[str, str]]],
+                      model: str,
+                      max_concurrency: int = 4,
+                      **kwargs) -> List[Optional[str]]:
+        """
+        Synchroner Einstieg für analyze_batch_async(), z.B. aus der Streamlit-App
+        
+        Die Anfragen laufen in der prozessweit geteilten Hintergrund-Loop, es werden
+        keine Threads je Anfrage gestartet.
+        
+        Args:
+            message_lists: Nachrichtenliste je Anfrage
+            model: Name des zu verwendenden Modells
+            max_concurrency: Maximale Anzahl gleichzeitiger Anfragen
+            **kwargs: Zusätzliche Parameter für analyze_messages_async()
+            
+        Returns:
+            List[Optional[str]]: Analyseergebnis (oder None bei Fehler) je Anfrage in Eingabereihenfolge
+        """
+        return run_coroutine(self.analyze_batch_async(message_lists, model, max_concurrency, **kwargs))
+    
+    def pending_requests(self) -> int:
+        """
+        Gibt die Anzahl vorgemerkter, noch nicht gesendeter Anfragen zurück
+        
+        Returns:
+            int: Anzahl ausstehender Anfragen (nur im Batch-Modus größer 0)
+        """
+        return 0
+    
+    def get_default_params(self) -> Dict[str, Any]:
+        """
+        Gibt die Parameter zurück, die der Provider ohne Angabe des Aufrufers sendet
+        
+        Returns:
+            Dict[str, Any]: Standardwerte der Anfrageparameter, z.B. temperature
+        """
+        return {}
+    
+    def get_usage_log(self) -> List[CallUsage]:
+        """
+        Gibt die Token-Nutzung der letzten API-Aufrufe zurück
+        
+        Der Provider wird prozessweit geteilt; die Liste enthält daher Aufrufe aller Sitzungen
+        und höchstens USAGE_LOG_SIZE Einträge.
+        
+        Returns:
+            List[CallUsage]: Nutzung je Aufruf in Aufrufreihenfolge (leer, wenn nicht erfasst)
+        """
+        return []
+    
     @abstractmethod
     def get_available_models(self) -> List[str]:
         """
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from openai import OpenAI
+from tools.pipeline.tracing import add_metric, record_usage, span
+from .base_provider import DEFAULT_TEMPERATURE, USAGE_LOG_SIZE, BaseAIProvider, CallUsage
+
+_log = logging.getLogger(__name__)
+
+# Maximale Anzahl Anfragen je Batch-Datei laut Batch-API
+MAX_BATCH_REQUESTS = 50_000
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchClient:
+    """Reicht Chat-Anfragen als JSONL-Datei bei der Batch-API ein und holt die Ergebnisse ab
+    
+    Funktioniert mit der OpenAI-API und mit dem lokalen Stub-Server (OPENAI_BASE_URL).
+    """
+    
+    def __init__(self,
+                 client: OpenAI,
+                 work_dir: str = "./cache/batches",
+                 completion_window: str = "24h",
+                 poll_interval: float = 2.0,
+                 max_poll_interval: float = 60.0):
+        """
+        Args:
+            client: Initialisierter OpenAI Client
+            work_dir: Ordner für die eingereichten und abgeholten JSONL-Dateien
+            completion_window: Zeitfenster, in dem der Batch abgearbeitet wird
+            poll_interval: Erste Wartezeit zwischen zwei Statusabfragen in Sekunden
+            max_poll_interval: Maximale Wartezeit zwischen zwei Statusabfragen in Sekunden
+        """
+        self.client = client
+        self.work_dir = work_dir
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+    
+    def submit(self, requests: Dict[str, Dict[str, Any]]) -> str:
+        """
+        Schreibt die Anfragen in eine JSONL-Datei, lädt sie hoch und startet den Batch
+        
+        Args:
+            requests: Request-Body je custom_id
+            
+        Returns:
+            str: ID des Batches
+        """
+        os.makedirs(self.work_dir, exist_ok=True)
+        input_path = os.path.join(self.work_dir, f"batch_{time.strftime('%Y%m%d_%H%M%S')}_{len(requests)}.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for custom_id, body in requests.items():
+                f.write(json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": body
+                }, ensure_ascii=False) + "\n")
+                
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window
+        )
+        _log.info(f"Batch {batch.id} mit {len(requests)} Anfragen eingereicht ({input_path})")
+        return batch.id
+    
+    def wait(self, batch_id: str, on_poll: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Wartet, bis der Batch abgeschlossen ist
+        
+        Die Wartezeit zwischen den Statusabfragen wächst bis max_poll_interval, damit kurze
+        Batches schnell und lange Batches ohne unnötige Abfragen abgeholt werden.
+        
+        Args:
+            batch_id: ID des Batches
+            on_poll: Wird nach jeder Statusabfrage mit dem Batch-Objekt aufgerufen
+            
+        Returns:
+            Any: Batch-Objekt im Endstatus
+        """
+        interval = self.poll_interval
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if on_poll:
+                on_poll(batch)
+            if batch.status in FINAL_STATUSES:
+                return batch
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+    
+    def _read_file(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        content = self.client.files.content(file_id).text
+        with open(os.path.join(self.work_dir, f"{file_id}.jsonl"), "w", encoding="utf-8") as f:
+            f.write(content)
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    
+    def results(self, batch: Any) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Liest die Antworten eines abgeschlossenen Batches
+        
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: Chat-Completion je custom_id, None bei Fehlern
+        """
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        for line in self._read_file(batch.output_file_id) + self._read_file(getattr(batch, "error_file_id", None)):
+            response = line.get("response") or {}
+            if response.get("status_code") == 200:
+                results[line["custom_id"]] = response.get("body")
+            else:
+                _log.error(f"Batch-Anfrage {line['custom_id']} fehlgeschlagen: {line.get('error') or response.get('body')}")
+                results[line["custom_id"]] = None
+        return results
+    
+    def run(self,
+            requests: Dict[str, Dict[str, Any]],
+            on_poll: Optional[Callable[[Any], None]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Reicht Anfragen ein, wartet auf den Abschluss und gibt die Antworten zurück
+        
+        Mehr als MAX_BATCH_REQUESTS Anfragen werden auf mehrere Batches verteilt.
+        
+        Args:
+            requests: Request-Body je custom_id
+            on_poll: Wird nach jeder Statusabfrage mit dem Batch-Objekt aufgerufen
+            
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: Chat-Completion je custom_id, None bei Fehlern
+        """
+        items = list(requests.items())
+        batch_ids = [self.submit(dict(items[start:start + MAX_BATCH_REQUESTS]))
+                     for start in range(0, len(items), MAX_BATCH_REQUESTS)]
+                     
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        for batch_id in batch_ids:
+            batch = self.wait(batch_id, on_poll)
+            if batch.status != "completed":
+                _log.error(f"Batch {batch_id} beendet mit Status {batch.status}")
+            results.update(self.results(batch))
+        # Fehlende Antworten (z.B. abgelaufener Batch) als fehlgeschlagen werten
+        for custom_id in requests:
+            results.setdefault(custom_id, None)
+        return results
+
+
+class BatchProvider(BaseAIProvider):
+    """Provider, der Anfragen für die Batch-API sammelt statt sie sofort zu senden
+    
+    Unbekannte Anfragen werden vorgemerkt und mit None beantwortet. Nach einem Durchlauf
+    der Pipeline reicht flush() alle vorgemerkten Anfragen als einen Batch ein; im
+    nächsten Durchlauf werden sie mit den Batch-Ergebnissen beantwortet. So rückt jedes
+    Dokument je Batch um die Schritte vor, deren Eingaben bereits vorliegen.
+    """
+    
+    def __init__(self, provider: BaseAIProvider, batch_client: BatchClient):
+        """
+        Args:
+            provider: Initialisierter Provider (für Modellliste und Textanalyse-Standardwerte)
+            batch_client: Client für die Batch-API
+        """
+        self.provider = provider
+        self.batch_client = batch_client
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.completed: Dict[str, Optional[Tuple[str, CallUsage]]] = {}
+        self.usage_log: "deque[CallUsage]" = deque(maxlen=USAGE_LOG_SIZE)
+        self.batches = 0
+    
+    def initialize(self, api_key: str) -> None:
+        self.provider.initialize(api_key)
+    
+    @staticmethod
+    def make_request(messages: List[Dict[str, str]], model: str, temperature: float, **kwargs) -> Tuple[str, Dict[str, Any]]:
+        """Bildet Request-Body und custom_id einer Anfrage"""
+        body = {"model": model, "messages": messages, "temperature": temperature, **kwargs}
+        custom_id = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return custom_id, body
+    
+    def analyze_text(self,
+                    text: str,
+                    prompt_template: str,
+                    model: str,
+                    max_retries: int = 3,
+                    **kwargs) -> Optional[str]:
+        messages = [
+            {"role": "system", "content": prompt_template},
+            {"role": "user", "content": text}
+        ]
+        return self.analyze_messages(messages, model, max_retries, **kwargs)
+    
+    def analyze_messages(self,
+                         messages: List[Dict[str, str]],
+                         model: str,
+                         max_retries: int = 3,
+                         temperature: float = DEFAULT_TEMPERATURE,
+                         **kwargs) -> Optional[str]:
+        """Gibt das Batch-Ergebnis zurück oder merkt die Anfrage für den nächsten Batch vor (Rückgabe None)"""
+        custom_id, body = self.make_request(messages, model, temperature, **kwargs)
+        if custom_id in self.completed:
+            result = self.completed[custom_id]
+            if result is None:
+                return None
+            content, usage = result
+            # Nutzung beim ersten Abruf erfassen, damit sie dem anfragenden Dokument zugeordnet wird
+            if usage is not None:
+                self.usage_log.append(usage)
+                with span("batch.result", kind="llm", model=usage.model, batch=True) as call_span:
+                    record_usage(usage)
+                    call_span.add("calls")
+                self.completed[custom_id] = (content, None)
+            return content
+        self.pending[custom_id] = body
+        add_metric("batch_queued")
+        return None
+    
+    async def analyze_messages_async(self,
+                                     messages: List[Dict[str, str]],
+                                     model: str,
+                                     max_retries: int = 3,
+                                     **kwargs) -> Optional[str]:
+        return self.analyze_messages(messages, model, max_retries, **kwargs)
+    
+    def pending_requests(self) -> int:
+        return len(self.pending)
+    
+    def flush(self, on_poll: Optional[Callable[[Any], None]] = None) -> int:
+        """
+        Reicht alle vorgemerkten Anfragen als Batch ein und wartet auf die Ergebnisse
+        
+        Args:
+            on_poll: Wird nach jeder Statusabfrage mit dem Batch-Objekt aufgerufen
+            
+        Returns:
+            int: Anzahl eingereichter Anfragen
+        """
+        if not self.pending:
+            return 0
+        requests, self.pending = self.pending, {}
+        started = time.monotonic()
+        results = self.batch_client.run(requests, on_poll)
+        duration = time.monotonic() - started
+        self.batches += 1
+        
+        for custom_id, body in results.items():
+            if body is None:
+                self.completed[custom_id] = None
+                continue
+            usage = body.get("usage") or {}
+            self.completed[custom_id] = (body["choices"][0]["message"]["content"], CallUsage(
+                model=body.get("model", requests[custom_id]["model"]),
+                prompt_tokens=usage.get("prompt_tokens") or 0,
+                cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+                completion_tokens=usage.get("completion_tokens") or 0,
+                duration=duration
+            ))
+        return len(requests)
+    
+    def get_default_params(self) -> Dict[str, Any]:
+        return {"temperature": DEFAULT_TEMPERATURE}
+    
+    def get_usage_log(self) -> List[CallUsage]:
+        return list(self.usage_log)
+    
+    def get_available_models(self) -> List[str]:
+        return self.provider.get_available_models()
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from typing import Awaitable, Optional, TypeVar
+import httpx
+
+T = TypeVar('T')
+
+# Verbindungspool für alle Provider-Anfragen eines Prozesses
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+class BackgroundEventLoop:
+    """Event-Loop in einem eigenen Daemon-Thread, der über Streamlit-Reruns hinweg bestehen bleibt
+    
+    Synchroner Code (z.B. die Streamlit-App) kann darauf Coroutinen ausführen und auf ihr
+    Ergebnis warten. Alle asynchronen HTTP-Verbindungen leben in dieser einen Loop und
+    werden damit zwischen Aufrufen wiederverwendet.
+    """
+    
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Gibt die laufende Event-Loop zurück und startet sie beim ersten Zugriff"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="ai-provider-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+    
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Führt eine Coroutine in der Hintergrund-Loop aus und wartet auf das Ergebnis
+        
+        Args:
+            coro: Auszuführende Coroutine
+            timeout: Maximale Wartezeit in Sekunden (None = unbegrenzt)
+            
+        Returns:
+            T: Rückgabewert der Coroutine
+            
+        Raises:
+            RuntimeError: Wenn der Aufruf aus der Hintergrund-Loop selbst erfolgt
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("run() darf nicht aus der Hintergrund-Loop aufgerufen werden, dort direkt awaiten")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+_background_loop = BackgroundEventLoop()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_client_lock = threading.Lock()
+
+def run_coroutine(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Führt eine Coroutine in der prozessweit geteilten Hintergrund-Loop aus"""
+    return _background_loop.run(coro, timeout)
+
+def get_http_client() -> httpx.Client:
+    """Gibt den prozessweit geteilten synchronen HTTP-Client mit Verbindungspool zurück"""
+    global _http_client
+    with _client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        return _http_client
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Gibt den prozessweit geteilten asynchronen HTTP-Client mit Verbindungspool zurück
+    
+    Die Verbindungen sind an eine Event-Loop gebunden; der Client darf daher nur in
+    Coroutinen verwendet werden, die über run_coroutine() ausgeführt werden.
+    """
+    global _async_http_client
+    with _client_lock:
+        if _async_http_client is None:
+            _async_http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        return _async_http_client
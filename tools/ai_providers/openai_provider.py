@@ -1,13 +1,24 @@
+import asyncio
+import logging
 import time
+from collections import deque
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from .base_provider import BaseAIProvider
+import openai
+from openai import AsyncOpenAI, OpenAI
+from tools.pipeline.tracing import record_usage, span
+from .base_provider import DEFAULT_TEMPERATURE, USAGE_LOG_SIZE, BaseAIProvider, CallUsage
+from .concurrency import get_async_http_client, get_http_client
+from .rate_limiter import AdaptiveRateLimiter, backoff_delay, estimate_tokens, get_rate_limiter, parse_retry_after
+
+_log = logging.getLogger(__name__)
 
 class OpenAIProvider(BaseAIProvider):
     """OpenAI API Implementierung"""
     
     def __init__(self):
         self.client = None
+        self.async_client = None
+        self.usage_log: "deque[CallUsage]" = deque(maxlen=USAGE_LOG_SIZE)
         self.available_models = [
             'gpt-4',
             'gpt-4-turbo-preview',
@@ -16,15 +27,22 @@ class OpenAIProvider(BaseAIProvider):
         ]
     
     def initialize(self, api_key: str) -> None:
-        """Initialisiert den OpenAI Client"""
-        self.client = OpenAI(api_key=api_key)
+        """
+        Initialisiert die OpenAI Clients auf den prozessweit geteilten Verbindungspools
+        
+        Die Wiederholungen des SDK sind abgeschaltet, damit Drosselungen und Wiederholungen
+        zentral über den Rate-Limiter des Modells laufen. Die Basis-URL kann über
+        OPENAI_BASE_URL z.B. auf den lokalen Stub-Server umgestellt werden.
+        """
+        self.client = OpenAI(api_key=api_key, http_client=get_http_client(), max_retries=0)
+        self.async_client = AsyncOpenAI(api_key=api_key, http_client=get_async_http_client(), max_retries=0)
     
     def analyze_text(self,
                     text: str,
                     prompt_template: str,
                     model: str,
                     max_retries: int = 3,
-                    temperature: float = 0.7,
+                    temperature: float = DEFAULT_TEMPERATURE,
                     **kwargs) -> Optional[str]:
         """
         Analysiert Text mit OpenAI API
@@ -37,33 +55,155 @@ class OpenAIProvider(BaseAIProvider):
             temperature: Kreativität der Antworten (0.0 - 1.0)
             **kwargs: Weitere Parameter für die OpenAI API
         """
+        messages = [
+            {"role": "system", "content": prompt_template},
+            {"role": "user", "content": text}
+        ]
+        return self.analyze_messages(messages, model, max_retries, temperature=temperature, **kwargs)
+    
+    def _record_usage(self, response: Any, model: str, duration: float) -> Optional[int]:
+        """
+        Erfasst die Token-Nutzung einer Antwort inklusive der aus dem Prompt-Cache gelesenen Tokens
+        
+        Returns:
+            Optional[int]: Insgesamt verbrauchte Tokens oder None, wenn keine Nutzung gemeldet wurde
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        details = getattr(usage, "prompt_tokens_details", None)
+        call_usage = CallUsage(
+            model=model,
+            prompt_tokens=usage.prompt_tokens or 0,
+            cached_tokens=getattr(details, "cached_tokens", None) or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            duration=duration
+        )
+        self.usage_log.append(call_usage)
+        record_usage(call_usage)
+        return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+    
+    def _retry_delay(self, error: Exception, attempt: int, limiter: AdaptiveRateLimiter) -> Optional[float]:
+        """
+        Bestimmt die Wartezeit vor einem erneuten Versuch nach einem Fehler
+        
+        Args:
+            error: Aufgetretener Fehler
+            attempt: Nummer des fehlgeschlagenen Versuchs (0-basiert)
+            limiter: Rate-Limiter des Modells
+            
+        Returns:
+            Optional[float]: Wartezeit in Sekunden oder None, wenn der Fehler nicht behebbar ist
+        """
+        if isinstance(error, openai.RateLimitError):
+            if error.code == "insufficient_quota":
+                return None
+            retry_after = parse_retry_after(error.response.headers)
+            limiter.on_throttle(retry_after)
+            return backoff_delay(attempt, retry_after)
+        if isinstance(error, openai.APIStatusError):
+            if error.status_code < 500 and error.status_code not in (408, 409):
+                return None
+            return backoff_delay(attempt, parse_retry_after(error.response.headers))
+        return backoff_delay(attempt)
+    
+    def analyze_messages(self,
+                         messages: List[Dict[str, str]],
+                         model: str,
+                         max_retries: int = 3,
+                         temperature: float = DEFAULT_TEMPERATURE,
+                         **kwargs) -> Optional[str]:
+        """
+        Sendet eine Nachrichtenliste an die OpenAI API
+        
+        OpenAI liest übereinstimmende Präfixe ab 1024 Tokens automatisch aus dem
+        Prompt-Cache; die Anzahl der gecachten Tokens wird je Aufruf im usage_log erfasst.
+        """
         if not self.client:
             raise ValueError("OpenAI Client nicht initialisiert. Bitte initialize() aufrufen.")
             
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                messages = [
-                    {"role": "system", "content": prompt_template},
-                    {"role": "user", "content": text}
-                ]
-                
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    **kwargs
-                )
-                
+        limiter = get_rate_limiter(model)
+        reserved = estimate_tokens(messages, kwargs.get("max_tokens"))
+        with span("chat.completions", kind="llm", model=model) as call_span:
+            for attempt in range(max_retries):
+                limiter.acquire(reserved)
+                try:
+                    start = time.monotonic()
+                    response = self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        **kwargs
+                    )
+                except Exception as e:
+                    limiter.release(reserved)
+                    delay = self._retry_delay(e, attempt, limiter)
+                    if delay is None or attempt + 1 == max_retries:
+                        _log.error(f"Fehler bei OpenAI Anfrage nach {attempt + 1} Versuchen: {e}")
+                        call_span.set(error=str(e))
+                        return None
+                    call_span.add("retries")
+                    _log.warning(f"Fehler bei OpenAI Anfrage (Versuch {attempt + 1}), neuer Versuch in {delay:.1f}s: {e}")
+                    time.sleep(delay)
+                    continue
+                    
+                limiter.release(reserved, self._record_usage(response, model, time.monotonic() - start))
+                limiter.on_success()
+                call_span.add("calls")
+                return response.choices[0].message.content
+            return None
+    
+    async def analyze_messages_async(self,
+                                     messages: List[Dict[str, str]],
+                                     model: str,
+                                     max_retries: int = 3,
+                                     temperature: float = DEFAULT_TEMPERATURE,
+                                     **kwargs) -> Optional[str]:
+        """
+        Sendet eine Nachrichtenliste mit dem asynchronen OpenAI Client
+        
+        Muss in der Hintergrund-Loop laufen (z.B. über analyze_batch()), da der geteilte
+        Verbindungspool an diese Loop gebunden ist.
+        """
+        if not self.async_client:
+            raise ValueError("OpenAI Client nicht initialisiert. Bitte initialize() aufrufen.")
+            
+        limiter = get_rate_limiter(model)
+        reserved = estimate_tokens(messages, kwargs.get("max_tokens"))
+        with span("chat.completions", kind="llm", model=model) as call_span:
+            for attempt in range(max_retries):
+                await limiter.acquire_async(reserved)
+                try:
+                    start = time.monotonic()
+                    response = await self.async_client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        **kwargs
+                    )
+                except Exception as e:
+                    limiter.release(reserved)
+                    delay = self._retry_delay(e, attempt, limiter)
+                    if delay is None or attempt + 1 == max_retries:
+                        _log.error(f"Fehler bei OpenAI Anfrage nach {attempt + 1} Versuchen: {e}")
+                        call_span.set(error=str(e))
+                        return None
+                    call_span.add("retries")
+                    _log.warning(f"Fehler bei OpenAI Anfrage (Versuch {attempt + 1}), neuer Versuch in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                    
+                limiter.release(reserved, self._record_usage(response, model, time.monotonic() - start))
+                limiter.on_success()
+                call_span.add("calls")
                 return response.choices[0].message.content
-                
-            except Exception as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    print(f"Fehler bei OpenAI Anfrage nach {max_retries} Versuchen: {e}")
-                    return None
-                print(f"Fehler bei OpenAI Anfrage (Versuch {retry_count}): {e}")
-                time.sleep(1)  # Kurze Pause vor erneutem Versuch
+            return None
+    
+    def get_default_params(self) -> Dict[str, Any]:
+        return {"temperature": DEFAULT_TEMPERATURE}
+    
+    def get_usage_log(self) -> List[CallUsage]:
+        return list(self.usage_log)
     
     def get_available_models(self) -> List[str]:
         """Gibt die Liste der verfügbaren OpenAI Modelle zurück"""
@@ -1,6 +1,8 @@
-from typing import Dict, Type
+import threading
+from typing import Dict, Optional, Tuple, Type
 from .base_provider import BaseAIProvider
 from .openai_provider import OpenAIProvider
+from .response_cache import CachedProvider, ResponseCache
 
 class AIProviderFactory:
     """Factory-Klasse für die Erstellung von KI-Providern"""
@@ -9,6 +11,10 @@ class AIProviderFactory:
         'OpenAI': OpenAIProvider
     }
     
+    # Initialisierte Provider je (Name, API-Key), die über Streamlit-Reruns erhalten bleiben
+    _shared_providers: Dict[Tuple[str, str], BaseAIProvider] = {}
+    _shared_lock = threading.Lock()
+    
     @classmethod
     def get_provider(cls, provider_name: str) -> BaseAIProvider:
         """
@@ -28,6 +34,40 @@ class AIProviderFactory:
             raise ValueError(f"Unbekannter KI-Provider: {provider_name}")
         return provider_class()
     
+    @classmethod
+    def get_shared_provider(cls,
+                            provider_name: str,
+                            api_key: str,
+                            cache: Optional[ResponseCache] = None,
+                            bypass_cache: bool = False) -> BaseAIProvider:
+        """
+        Gibt einen initialisierten, prozessweit geteilten Provider zurück
+        
+        Anders als get_provider() wird je Provider und API-Key nur einmal ein Client
+        erzeugt, sodass Verbindungen zwischen Läufen wiederverwendet werden.
+        
+        Args:
+            provider_name: Name des gewünschten Providers
+            api_key: Der API-Schlüssel für den Service
+            cache: Optionaler Antwort-Cache, über den Antworten wiederverwendet werden
+            bypass_cache: Antworten nicht aus dem Cache lesen, aber neu speichern
+            
+        Returns:
+            BaseAIProvider: Initialisierte Instanz des gewählten Providers
+            
+        Raises:
+            ValueError: Wenn der Provider nicht gefunden wurde
+        """
+        with cls._shared_lock:
+            provider = cls._shared_providers.get((provider_name, api_key))
+            if provider is None:
+                provider = cls.get_provider(provider_name)
+                provider.initialize(api_key)
+                cls._shared_providers[(provider_name, api_key)] = provider
+        if cache is not None:
+            return CachedProvider(provider, provider_name, cache, bypass=bypass_cache)
+        return provider
+    
     @classmethod
     def register_provider(cls, name: str, provider_class: Type[BaseAIProvider]):
         """
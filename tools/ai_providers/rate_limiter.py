@@ -0,0 +1,258 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Any, Dict, List, Mapping, Optional
+
+_log = logging.getLogger(__name__)
+
+# Schätzung der Tokens einer Anfrage vor dem Senden (deutscher Text, eher vorsichtig)
+CHARS_PER_TOKEN = 3.0
+# Für die Antwort reservierte Tokens, wenn max_tokens nicht gesetzt ist
+DEFAULT_COMPLETION_TOKENS = 1000
+# Wartezeit zwischen zwei Prüfungen, wenn keine freie Kapazität besteht
+POLL_INTERVAL = 0.05
+
+
+@dataclass
+class RateLimits:
+    """Limits eines Modells für Anfragen und Tokens je Minute sowie gleichzeitige Anfragen"""
+    requests_per_minute: int
+    tokens_per_minute: int
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+
+
+# Standardlimits je Modell (Kontingent der untersten Nutzungsstufe), mit set_rate_limits an das
+# eigene Kontingent anpassbar
+DEFAULT_RATE_LIMITS: Dict[str, RateLimits] = {
+    'gpt-4o': RateLimits(requests_per_minute=500, tokens_per_minute=30_000),
+    'gpt-4o-mini': RateLimits(requests_per_minute=500, tokens_per_minute=200_000),
+    'gpt-4': RateLimits(requests_per_minute=500, tokens_per_minute=10_000),
+    'gpt-4-turbo-preview': RateLimits(requests_per_minute=500, tokens_per_minute=30_000),
+    'gpt-3.5-turbo': RateLimits(requests_per_minute=500, tokens_per_minute=200_000),
+    'gpt-3.5-turbo-16k': RateLimits(requests_per_minute=500, tokens_per_minute=200_000)
+}
+FALLBACK_RATE_LIMITS = RateLimits(requests_per_minute=500, tokens_per_minute=30_000)
+
+
+class TokenBucket:
+    """Token-Bucket, der sich kontinuierlich mit einer Rate je Minute auffüllt"""
+    
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Sekunden, bis amount verfügbar ist (0, wenn sofort)"""
+        self._refill(now)
+        # Anfragen über der Kapazität dürfen den vollen Bucket leeren, statt ewig zu warten
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+    
+    def take(self, amount: float) -> None:
+        self.available -= amount
+    
+    def give(self, amount: float) -> None:
+        self.available = min(self.capacity, self.available + amount)
+
+
+class AdaptiveRateLimiter:
+    """Ratenbegrenzung eines Modells mit Token-Buckets und adaptiver Nebenläufigkeit
+    
+    Vor jeder Anfrage werden Anfrage- und Token-Budget je Minute reserviert; nach der
+    Antwort wird die Reservierung mit der tatsächlichen Token-Nutzung verrechnet.
+    Die Zahl gleichzeitiger Anfragen wächst nach erfolgreichen Antworten additiv und
+    halbiert sich bei jeder Drosselung (AIMD). Ein Retry-After der API hält alle
+    Anfragen des Modells bis zum angegebenen Zeitpunkt an.
+    
+    Der Limiter kann aus synchronem Code (acquire()) und aus Coroutinen (acquire_async())
+    gleichzeitig verwendet werden.
+    """
+    
+    def __init__(self, limits: RateLimits):
+        self.limits = limits
+        self.requests = TokenBucket(limits.requests_per_minute)
+        self.tokens = TokenBucket(limits.tokens_per_minute)
+        self.concurrency = float(limits.max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+    
+    def _try_acquire(self, tokens: int) -> float:
+        """Reserviert Kapazität; gibt 0 zurück oder die Sekunden bis zum nächsten Versuch"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.in_flight >= int(self.concurrency):
+                return POLL_INTERVAL
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            return 0.0
+    
+    def acquire(self, tokens: int) -> None:
+        """Wartet blockierend, bis eine Anfrage mit der geschätzten Tokenzahl gesendet werden darf"""
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 1.0))
+    
+    async def acquire_async(self, tokens: int) -> None:
+        """Wartet asynchron, bis eine Anfrage mit der geschätzten Tokenzahl gesendet werden darf"""
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+    
+    def release(self, reserved_tokens: int, used_tokens: Optional[int] = None) -> None:
+        """
+        Gibt eine Anfrage frei und verrechnet die reservierten mit den tatsächlichen Tokens
+        
+        Args:
+            reserved_tokens: Bei acquire() reservierte Tokens
+            used_tokens: Tatsächlich verbrauchte Tokens (None = Reservierung bleibt bestehen)
+        """
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+            if used_tokens is not None:
+                difference = reserved_tokens - used_tokens
+                if difference > 0:
+                    self.tokens.give(difference)
+                else:
+                    self.tokens.take(-difference)
+    
+    def on_success(self) -> None:
+        """Erhöht die Nebenläufigkeit additiv um etwa eine Anfrage je voller Runde"""
+        with self._lock:
+            self.completed += 1
+            self.concurrency = min(float(self.limits.max_concurrency), self.concurrency + 1.0 / max(self.concurrency, 1.0))
+    
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        Reagiert auf eine Drosselung (HTTP 429) der API
+        
+        Args:
+            retry_after: Wartezeit in Sekunden laut Retry-After, sofern angegeben
+        """
+        with self._lock:
+            self.throttled += 1
+            self.concurrency = max(float(self.limits.min_concurrency), self.concurrency / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        _log.warning(f"Anfragen gedrosselt, Nebenläufigkeit auf {int(self.concurrency)} reduziert"
+                     + (f", Pause {retry_after:.1f}s" if retry_after else ""))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Gibt den aktuellen Zustand des Limiters zurück"""
+        with self._lock:
+            return {
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "throttled": self.throttled
+            }
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(model: str) -> AdaptiveRateLimiter:
+    """Gibt den prozessweit geteilten Limiter eines Modells zurück"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(DEFAULT_RATE_LIMITS.get(model, FALLBACK_RATE_LIMITS))
+            _limiters[model] = limiter
+        return limiter
+
+def set_rate_limits(model: str, limits: RateLimits) -> None:
+    """
+    Setzt die Limits eines Modells, z.B. entsprechend dem eigenen API-Kontingent
+    
+    Ein Limiter mit unveränderten Limits bleibt samt Zustand erhalten, so dass der Aufruf
+    bei jedem Durchlauf der App wiederholt werden kann.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None or limiter.limits != limits:
+            _limiters[model] = AdaptiveRateLimiter(limits)
+            _log.info(f"Ratenlimits für {model}: {limits.requests_per_minute} RPM, {limits.tokens_per_minute} TPM")
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> int:
+    """Schätzt die Tokens einer Anfrage aus Nachrichtenlänge und erwarteter Antwortlänge"""
+    characters = sum(len(message.get("content") or "") for message in messages)
+    return int(characters / CHARS_PER_TOKEN) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Liest die Wartezeit aus den Headern retry-after-ms bzw. retry-after
+    
+    Args:
+        headers: Header der Antwort
+        
+    Returns:
+        Optional[float]: Wartezeit in Sekunden oder None, wenn keine angegeben ist
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000.0, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        # HTTP-Datumsangaben sind in GMT, ohne Zeitzone nicht als Ortszeit deuten
+        date = date.replace(tzinfo=timezone.utc)
+    return max(date.timestamp() - time.time(), 0.0)
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Wartezeit vor einem erneuten Versuch
+    
+    Ohne Retry-After wird exponentiell mit vollem Jitter gewartet, damit gleichzeitig
+    gedrosselte Anfragen nicht wieder gleichzeitig senden.
+    
+    Args:
+        attempt: Nummer des fehlgeschlagenen Versuchs (0-basiert)
+        retry_after: Von der API vorgegebene Wartezeit in Sekunden
+        base: Wartezeit des ersten Versuchs in Sekunden
+        cap: Maximale Wartezeit in Sekunden
+    """
+    if retry_after is not None:
+        return min(retry_after + random.uniform(0, base / 4), cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from tools.cache.disk_cache import CacheStats, DiskCache
+from tools.pipeline.tracing import add_metric
+from .base_provider import BaseAIProvider, CallUsage
+
+_log = logging.getLogger(__name__)
+
+# Erhöhen, wenn sich die Bildung der Anfragen an die Provider ändert
+CACHE_VERSION = 2
+
+
+class ResponseCache:
+    """Persistenter Cache für LLM-Antworten
+    
+    Der Schlüssel setzt sich aus Provider, Modell, Parametern (z.B. temperature) sowie
+    Rolle und SHA-256 jeder Nachricht zusammen. Ändert sich nur ein
+    Prompt, werden alle übrigen Anfragen weiterhin aus dem Cache beantwortet.
+    """
+    
+    def __init__(self,
+                 cache_path: str = "./cache/llm_responses.sqlite",
+                 max_bytes: int = 256 * 1024 * 1024,
+                 ttl: Optional[float] = 30 * 24 * 3600):
+        """
+        Args:
+            cache_path: Pfad zur SQLite-Datei des Caches
+            max_bytes: Maximale Größe aller gespeicherten Antworten in Bytes
+            ttl: Lebensdauer einer Antwort in Sekunden (None = unbegrenzt)
+        """
+        self._cache = DiskCache(cache_path, max_bytes=max_bytes, ttl=ttl)
+    
+    @staticmethod
+    def make_key(provider_name: str, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        """
+        Bildet den Cache-Schlüssel einer Anfrage
+        
+        Args:
+            provider_name: Name des Providers
+            model: Name des Modells
+            messages: Nachrichten der Anfrage
+            params: Weitere Parameter der Anfrage, z.B. temperature
+            
+        Returns:
+            str: Cache-Schlüssel
+        """
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "provider": provider_name,
+            "model": model,
+            "params": params,
+            "messages": [
+                [m["role"], hashlib.sha256(m["content"].encode("utf-8")).hexdigest()] for m in messages
+            ]
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Liest eine Antwort oder None, wenn sie fehlt oder abgelaufen ist"""
+        return self._cache.get_text(key)
+    
+    def set(self, key: str, response: str, provider_name: str, model: str) -> None:
+        """Speichert eine Antwort"""
+        self._cache.set_text(key, response, meta={"provider": provider_name, "model": model})
+    
+    def stats(self) -> CacheStats:
+        """Gibt die Trefferstatistik des Caches zurück"""
+        return self._cache.stats()
+    
+    def clear(self) -> None:
+        """Leert den Cache"""
+        self._cache.clear()
+
+
+class CachedProvider(BaseAIProvider):
+    """Provider-Wrapper, der Antworten über einen ResponseCache wiederverwendet"""
+    
+    def __init__(self, provider: BaseAIProvider, provider_name: str, cache: ResponseCache, bypass: bool = False):
+        """
+        Args:
+            provider: Initialisierter Provider
+            provider_name: Name des Providers (Teil des Cache-Schlüssels)
+            cache: Zu verwendender Antwort-Cache
+            bypass: Cache nicht lesen, frische Antworten aber speichern
+        """
+        self.provider = provider
+        self.provider_name = provider_name
+        self.cache = cache
+        self.bypass = bypass
+    
+    def initialize(self, api_key: str) -> None:
+        self.provider.initialize(api_key)
+    
+    def _lookup(self, messages: List[Dict[str, str]], model: str, params: Dict[str, Any]):
+        # Standardwerte des Providers gehören zum Schlüssel, damit geänderte Standardwerte
+        # keine unter anderen Einstellungen erzeugten Antworten liefern
+        params = {**self.provider.get_default_params(), **params}
+        key = self.cache.make_key(self.provider_name, model, messages, params)
+        if self.bypass:
+            return key, None
+        try:
+            return key, self.cache.get(key)
+        except Exception as e:
+            _log.error(f"Fehler beim Zugriff auf den LLM-Antwort-Cache: {str(e)}")
+            return key, None
+    
+    def _store(self, key: str, response: Optional[str], model: str) -> None:
+        if not response:
+            return
+        try:
+            self.cache.set(key, response, self.provider_name, model)
+        except Exception as e:
+            _log.error(f"Fehler beim Speichern im LLM-Antwort-Cache: {str(e)}")
+    
+    def analyze_text(self,
+                    text: str,
+                    prompt_template: str,
+                    model: str,
+                    max_retries: int = 3,
+                    **kwargs) -> Optional[str]:
+        messages = [
+            {"role": "system", "content": prompt_template},
+            {"role": "user", "content": text}
+        ]
+        return self.analyze_messages(messages, model, max_retries, **kwargs)
+    
+    def analyze_messages(self,
+                         messages: List[Dict[str, str]],
+                         model: str,
+                         max_retries: int = 3,
+                         **kwargs) -> Optional[str]:
+        key, response = self._lookup(messages, model, kwargs)
+        if response is not None:
+            add_metric("cache_hits")
+            return response
+        response = self.provider.analyze_messages(messages, model, max_retries, **kwargs)
+        self._store(key, response, model)
+        return response
+    
+    async def analyze_messages_async(self,
+                                     messages: List[Dict[str, str]],
+                                     model: str,
+                                     max_retries: int = 3,
+                                     **kwargs) -> Optional[str]:
+        key, response = self._lookup(messages, model, kwargs)
+        if response is not None:
+            add_metric("cache_hits")
+            return response
+        response = await self.provider.analyze_messages_async(messages, model, max_retries, **kwargs)
+        self._store(key, response, model)
+        return response
+    
+    def get_default_params(self) -> Dict[str, Any]:
+        return self.provider.get_default_params()
+    
+    def get_usage_log(self) -> List[CallUsage]:
+        return self.provider.get_usage_log()
+    
+    def pending_requests(self) -> int:
+        return self.provider.pending_requests()
+    
+    def get_available_models(self) -> List[str]:
+        return self.provider.get_available_models()
@@ -0,0 +1,292 @@
+import argparse
+import email.parser
+import email.policy
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+_log = logging.getLogger(__name__)
+
+# Erzeugt die Antwort auf eine Anfrage aus deren JSON-Inhalt
+Responder = Callable[[Dict[str, Any]], str]
+
+
+def example_for_schema(schema: Dict[str, Any]) -> Any:
+    """Erzeugt ein minimales Beispiel, das einem JSON-Schema entspricht"""
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {name: example_for_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [example_for_schema(schema.get("items", {}))]
+    if schema_type in ("integer", "number"):
+        return 0
+    if schema_type == "boolean":
+        return False
+    return "stub"
+
+def default_responder(request: Dict[str, Any]) -> str:
+    """Antwortet bei strukturierter Ausgabe mit einem Beispiel zum Schema, sonst mit der letzten Nachricht"""
+    response_format = request.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(example_for_schema(response_format["json_schema"]["schema"]))
+    messages = request.get("messages") or [{}]
+    return f"Stub-Antwort auf: {str(messages[-1].get('content', ''))[:200]}"
+
+
+class StubOpenAIServer:
+    """Lokaler Ersatz für die Chat-Completions-API von OpenAI zum Testen ohne Netzwerk
+    
+    Der Server setzt eigene Limits für Anfragen und Tokens je Minute durch und antwortet
+    bei Überschreitung wie die API mit HTTP 429 und Retry-After. Antworten, Latenz und
+    Länge des Zeitfensters sind einstellbar. Zusätzlich werden Datei-Upload und Batch-API
+    nachgebildet; Batches gelten nach batch_delay Sekunden als abgeschlossen. Die App wird über OPENAI_BASE_URL=http://host:port/v1
+    auf den Server umgeleitet.
+    """
+    
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8765,
+                 requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None,
+                 latency: float = 0.2,
+                 responder: Responder = default_responder,
+                 window: float = 60.0,
+                 batch_delay: float = 1.0):
+        """
+        Args:
+            host: Adresse, an die der Server gebunden wird
+            port: Port des Servers (0 = beliebiger freier Port)
+            requests_per_minute: Erlaubte Anfragen je Minute (None = unbegrenzt)
+            tokens_per_minute: Erlaubte Tokens je Minute (None = unbegrenzt)
+            latency: Antwortzeit je Anfrage in Sekunden
+            responder: Funktion, die aus einer Anfrage den Antworttext erzeugt
+            window: Zeitfenster der Limits in Sekunden (kürzer für schnelle Tests)
+            batch_delay: Bearbeitungszeit eines Batches in Sekunden
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.latency = latency
+        self.responder = responder
+        self.window = window
+        self.batch_delay = batch_delay
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.received: List[Dict[str, Any]] = []
+        self.throttled = 0
+        self._window: List[tuple] = []  # (Zeitpunkt, Tokens) angenommener Anfragen im Zeitfenster
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def _admit(self, tokens: int) -> Optional[float]:
+        """Nimmt eine Anfrage an oder gibt die Sekunden bis zur nächsten freien Kapazität zurück"""
+        with self._lock:
+            now = time.monotonic()
+            self._window = [(t, n) for t, n in self._window if now - t < self.window]
+            over_requests = self.requests_per_minute is not None and len(self._window) >= self.requests_per_minute
+            over_tokens = self.tokens_per_minute is not None and \
+                sum(n for _, n in self._window) + tokens > self.tokens_per_minute
+            if (over_requests or over_tokens) and self._window:
+                self.throttled += 1
+                return max(self.window - (now - self._window[0][0]), 0.1)
+            self._window.append((now, tokens))
+            return None
+    
+    def _completion(self, request: Dict[str, Any], prompt_tokens: int) -> Dict[str, Any]:
+        """Erzeugt eine Chat-Completion zu einer Anfrage"""
+        content = self.responder(request)
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-stub-{len(self.received)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+    
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        """Bearbeitet alle Anfragen einer Batch-Datei ohne Ratenbegrenzung und legt das Ergebnis ab"""
+        lines = [json.loads(line) for line in self.files[input_file_id].decode("utf-8").splitlines() if line.strip()]
+        output = []
+        for line in lines:
+            body = line["body"]
+            with self._lock:
+                self.received.append(body)
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+            output.append({
+                "id": f"batch_req_{len(output) + 1}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 200, "request_id": "", "body": self._completion(body, prompt_tokens)},
+                "error": None
+            })
+        with self._lock:
+            output_file_id = f"file-stub-{len(self.files) + 1}"
+            self.files[output_file_id] = "".join(json.dumps(entry) + "\n" for entry in output).encode("utf-8")
+            batch_id = f"batch_stub_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": endpoint,
+                "input_file_id": input_file_id,
+                "completion_window": completion_window,
+                "status": "in_progress",
+                "created_at": int(time.time()),
+                "output_file_id": None,
+                "error_file_id": None,
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                "_output_file_id": output_file_id,
+                "_ready_at": time.monotonic() + self.batch_delay
+            }
+        return self._batch_state(batch_id)
+    
+    def _batch_state(self, batch_id: str) -> Dict[str, Any]:
+        """Gibt den aktuellen Zustand eines Batches im Format der API zurück"""
+        with self._lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "in_progress" and time.monotonic() >= batch["_ready_at"]:
+                batch["status"] = "completed"
+                batch["output_file_id"] = batch["_output_file_id"]
+                batch["request_counts"]["completed"] = batch["request_counts"]["total"]
+            return {key: value for key, value in batch.items() if not key.startswith("_")}
+    
+    def _handler_class(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 3 and parts[1] == "batches" and parts[2] in stub.batches:
+                    self._send_json(200, stub._batch_state(parts[2]))
+                elif len(parts) == 4 and parts[1] == "files" and parts[3] == "content" and parts[2] in stub.files:
+                    body = stub.files[parts[2]]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self._send_json(404, {"error": {"message": f"Unbekannter Pfad: {self.path}", "type": "invalid_request_error"}})
+            
+            def _upload_file(self, body: bytes) -> None:
+                message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+                )
+                for part in message.iter_parts():
+                    if part.get_param("name", header="content-disposition") == "file":
+                        content = part.get_payload(decode=True)
+                        with stub._lock:
+                            file_id = f"file-stub-{len(stub.files) + 1}"
+                            stub.files[file_id] = content
+                        self._send_json(200, {
+                            "id": file_id,
+                            "object": "file",
+                            "bytes": len(content),
+                            "created_at": int(time.time()),
+                            "filename": part.get_filename() or "batch.jsonl",
+                            "purpose": "batch",
+                            "status": "processed"
+                        })
+                        return
+                self._send_json(400, {"error": {"message": "Keine Datei übergeben", "type": "invalid_request_error"}})
+            
+            def do_POST(self):
+                path = self.path.rstrip("/")
+                if path.endswith("/files"):
+                    self._upload_file(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    return
+                if path.endswith("/batches"):
+                    request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    if request.get("input_file_id") not in stub.files:
+                        self._send_json(404, {"error": {"message": "Datei nicht gefunden", "type": "invalid_request_error"}})
+                        return
+                    self._send_json(200, stub._create_batch(request["input_file_id"], request.get("endpoint", ""),
+                                                            request.get("completion_window", "24h")))
+                    return
+                if not path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unbekannter Pfad: {self.path}", "type": "invalid_request_error"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+                retry_after = stub._admit(prompt_tokens)
+                if retry_after is not None:
+                    self._send_json(429, {"error": {
+                        "message": "Rate limit reached",
+                        "type": "requests",
+                        "code": "rate_limit_exceeded"
+                    }}, headers={"retry-after": f"{retry_after:.1f}"})
+                    return
+                    
+                with stub._lock:
+                    stub.received.append(request)
+                time.sleep(stub.latency)
+                self._send_json(200, stub._completion(request, prompt_tokens))
+            
+            def log_message(self, format, *args):
+                _log.debug(format % args)
+                
+        return Handler
+    
+    def start(self) -> "StubOpenAIServer":
+        """Startet den Server in einem Hintergrund-Thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-openai-server", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        """Beendet den Server"""
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokaler Ersatz für die OpenAI Chat-Completions-API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=None, help="Erlaubte Anfragen je Minute")
+    parser.add_argument("--tpm", type=int, default=None, help="Erlaubte Tokens je Minute")
+    parser.add_argument("--latency", type=float, default=0.2, help="Antwortzeit in Sekunden")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Bearbeitungszeit eines Batches in Sekunden")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    server = StubOpenAIServer(args.host, args.port, args.rpm, args.tpm, args.latency, batch_delay=args.batch_delay)
+    print(f"Stub-Server läuft, OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class CacheStats:
+    """Trefferstatistik eines Caches"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+    
+    @property
+    def hit_rate(self) -> float:
+        """Anteil der Treffer an allen Zugriffen (0.0 - 1.0)"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self.entries,
+            "size_bytes": self.size_bytes,
+            "hit_rate": round(self.hit_rate, 4)
+        }
+
+
+@dataclass
+class CacheEntry:
+    """Ein gespeicherter Cache-Eintrag inklusive Metadaten"""
+    value: bytes
+    created_at: float
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+class DiskCache:
+    """SQLite-basierter Key-Value-Cache mit LRU-Verdrängung, optionaler TTL und Trefferstatistik"""
+    
+    def __init__(self,
+                 path: str,
+                 max_bytes: Optional[int] = None,
+                 max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        """
+        Args:
+            path: Pfad zur SQLite-Datei (Ordner wird bei Bedarf angelegt)
+            max_bytes: Maximale Gesamtgröße aller Werte in Bytes (None = unbegrenzt)
+            max_entries: Maximale Anzahl von Einträgen (None = unbegrenzt)
+            ttl: Lebensdauer eines Eintrags in Sekunden (None = unbegrenzt)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                       key TEXT PRIMARY KEY,
+                       value BLOB NOT NULL,
+                       size INTEGER NOT NULL,
+                       meta TEXT NOT NULL DEFAULT '{}',
+                       created_at REAL NOT NULL,
+                       last_access REAL NOT NULL
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+            self._conn.commit()
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+    
+    def get_entry(self, key: str, allow_expired: bool = False) -> Optional[CacheEntry]:
+        """
+        Liest einen Eintrag inklusive Metadaten
+        
+        Args:
+            key: Schlüssel des Eintrags
+            allow_expired: Auch abgelaufene Einträge zurückgeben (z.B. für Revalidierung)
+            
+        Returns:
+            Optional[CacheEntry]: Eintrag oder None, wenn nicht vorhanden bzw. abgelaufen
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, meta, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self._is_expired(row[2]) and not allow_expired):
+                self._stats.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._stats.hits += 1
+            return CacheEntry(value=bytes(row[0]), created_at=row[2], meta=json.loads(row[1]))
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Liest einen Wert oder gibt None zurück, wenn er fehlt oder abgelaufen ist"""
+        entry = self.get_entry(key)
+        return entry.value if entry else None
+    
+    def get_text(self, key: str) -> Optional[str]:
+        """Liest einen als UTF-8 gespeicherten Text"""
+        value = self.get(key)
+        return value.decode("utf-8") if value is not None else None
+    
+    def set(self, key: str, value: bytes, meta: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Speichert einen Wert und verdrängt bei Bedarf die am längsten ungenutzten Einträge
+        
+        Args:
+            key: Schlüssel des Eintrags
+            value: Zu speichernde Bytes
+            meta: Optionale JSON-serialisierbare Metadaten
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, meta, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), json.dumps(meta or {}), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+    
+    def set_text(self, key: str, value: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Speichert einen Text als UTF-8"""
+        self.set(key, value.encode("utf-8"), meta)
+    
+    def touch(self, key: str) -> None:
+        """Setzt den Erstellungszeitpunkt eines Eintrags zurück (z.B. nach erfolgreicher Revalidierung)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET created_at = ?, last_access = ? WHERE key = ?", (now, now, key)
+            )
+            self._conn.commit()
+    
+    def delete(self, key: str) -> None:
+        """Entfernt einen Eintrag"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+    
+    def clear(self) -> None:
+        """Entfernt alle Einträge"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+    
+    def _evict(self) -> None:
+        """Verdrängt abgelaufene und am längsten ungenutzte Einträge (Lock muss gehalten werden)"""
+        if self.ttl is not None:
+            cursor = self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+            self._stats.evictions += max(cursor.rowcount, 0)
+            
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if (self.max_entries is None or count <= self.max_entries) and \
+                (self.max_bytes is None or total <= self.max_bytes):
+            return
+            
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access ASC").fetchall():
+            if (self.max_entries is None or count <= self.max_entries) and \
+                    (self.max_bytes is None or total <= self.max_bytes):
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            self._stats.evictions += 1
+    
+    def stats(self) -> CacheStats:
+        """Gibt die aktuelle Trefferstatistik inklusive Füllstand zurück"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                entries=count,
+                size_bytes=total
+            )
@@ -1,18 +1,192 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Type, Union
+import hashlib
+import importlib
+import io
+import mmap
+import os
+
+# Eingabe eines Konverters: Dateipfad oder Dokumentinhalt im Speicher
+DocumentSource = Union[str, os.PathLike, bytes, bytearray, memoryview]
+
+# Ab dieser Größe werden Dateien für den Lesezugriff per mmap eingeblendet
+MMAP_THRESHOLD = 32 * 1024 * 1024
+
+def load_converter_class(path: str) -> Type["BaseConverter"]:
+    """
+    Importiert eine Konverter-Klasse erst bei Bedarf
+    
+    Args:
+        path: Modul und Klasse im Format "paket.modul:Klasse"
+        
+    Returns:
+        Type[BaseConverter]: Konverter-Klasse
+    """
+    module_name, class_name = path.split(":", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+@dataclass
+class MarkdownChunk:
+    """Markdown-Ausschnitt eines Dokuments, z.B. eine einzelne Seite"""
+    page_number: Optional[int]  # 1-basiert, None wenn der Ausschnitt keiner Seite zugeordnet ist
+    text: str
+
+def is_buffer(source: DocumentSource) -> bool:
+    """Prüft, ob die Eingabe ein Dokumentinhalt im Speicher und kein Dateipfad ist"""
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+def source_label(source: DocumentSource) -> str:
+    """
+    Gibt eine lesbare Bezeichnung der Eingabe für Meldungen zurück
+    
+    Args:
+        source: Dateipfad oder Dokumentinhalt
+        
+    Returns:
+        str: Dateipfad bzw. Beschreibung des Puffers
+    """
+    if is_buffer(source):
+        return f"<Dokument im Speicher, {memoryview(source).nbytes} Bytes>"
+    return os.fspath(source)
+
+def source_key(source: DocumentSource) -> str:
+    """
+    Gibt einen eindeutigen Schlüssel der Eingabe für Zuordnungen je Dokument zurück
+    
+    Anders als source_label unterscheidet der Schlüssel auch gleich große Puffer.
+    
+    Args:
+        source: Dateipfad oder Dokumentinhalt
+        
+    Returns:
+        str: Dateipfad bzw. SHA-256 des Pufferinhalts
+    """
+    if is_buffer(source):
+        return f"sha256:{hashlib.sha256(source).hexdigest()}"
+    return os.fspath(source)
+
+def is_pdf(source: DocumentSource) -> bool:
+    """Erkennt PDFs am Dateinamen bzw. bei Puffern an der PDF-Signatur"""
+    if is_buffer(source):
+        return bytes(memoryview(source)[:5]) == b"%PDF-"
+    return os.fspath(source).lower().endswith('.pdf')
+
+@contextmanager
+def open_binary(source: DocumentSource, mmap_threshold: int = MMAP_THRESHOLD) -> Iterator[BinaryIO]:
+    """
+    Öffnet die Eingabe als binären, seekbaren Datenstrom
+    
+    Puffer werden ohne Umweg über die Festplatte gelesen, große Dateien per mmap
+    eingeblendet, sodass nur tatsächlich gelesene Bereiche geladen werden.
+    
+    Args:
+        source: Dateipfad oder Dokumentinhalt
+        mmap_threshold: Dateigröße in Bytes, ab der mmap verwendet wird
+        
+    Returns:
+        Iterator[BinaryIO]: Kontextmanager mit dem geöffneten Datenstrom
+    """
+    if is_buffer(source):
+        yield io.BytesIO(source)
+        return
+        
+    with open(source, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < mmap_threshold or size == 0:
+            yield f
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
 
 class BaseConverter(ABC):
     """Basisklasse für alle Dokumentenkonverter"""
     
+    # Trennzeichen, mit dem seitenweise konvertiertes Markdown zusammengesetzt wird
+    page_separator: str = "\n\n"
+    
+    # Ob jede Seite unabhängig vom übrigen Dokument konvertiert wird; nur dann dürfen
+    # gespeicherte Seiten einer älteren Revision mit neu konvertierten kombiniert werden
+    pages_independent: bool = False
+    
     @abstractmethod
-    def convert_to_markdown(self, file_path: str) -> Optional[str]:
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
         """
         Konvertiert eine Datei in Markdown-Format
         
         Args:
-            file_path: Pfad zur Eingabedatei
+            source: Pfad zur Eingabedatei oder Dateiinhalt als bytes/bytearray/memoryview
             
         Returns:
             Optional[str]: Markdown-Text oder None bei Fehler
         """
         pass
+    
+    def iter_markdown(self, source: DocumentSource, pages: Optional[Sequence[int]] = None) -> Iterator[MarkdownChunk]:
+        """
+        Konvertiert eine Datei schrittweise und liefert das Markdown seitenweise
+        
+        Nachgelagerte Schritte können so mit den ersten Seiten beginnen, während die
+        Konvertierung noch läuft. Die Standardimplementierung konvertiert das ganze
+        Dokument und liefert es als einen einzigen Ausschnitt.
+        
+        Args:
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+            pages: Optionale Auswahl von Seitennummern (1-basiert)
+            
+        Returns:
+            Iterator[MarkdownChunk]: Markdown-Ausschnitte in Dokumentreihenfolge
+            
+        Raises:
+            NotImplementedError: Wenn eine Seitenauswahl nicht unterstützt wird
+            ValueError: Wenn die Konvertierung fehlschlägt
+        """
+        if pages is not None:
+            raise NotImplementedError(f"{type(self).__name__} unterstützt keine Seitenauswahl")
+        md_text = self.convert_to_markdown(source)
+        if md_text is None:
+            raise ValueError(f"Konvertierung von {source_label(source)} fehlgeschlagen")
+        yield MarkdownChunk(page_number=None, text=md_text)
+    
+    def get_conversion_info(self, source: DocumentSource) -> Dict[str, Any]:
+        """
+        Gibt Zusatzinformationen zur letzten Konvertierung einer Datei zurück
+        
+        Args:
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+            
+        Returns:
+            Dict[str, Any]: Konverterspezifische Angaben, z.B. Anzahl der OCR-Seiten
+        """
+        return {}
+    
+    def get_options(self) -> Dict[str, Any]:
+        """
+        Gibt die Einstellungen zurück, die das Konvertierungsergebnis beeinflussen
+        
+        Wird u.a. für den Schlüssel des Konvertierungs-Caches verwendet. Konverter
+        mit konfigurierbarer Pipeline sollten diese Methode überschreiben.
+        
+        Returns:
+            Dict[str, Any]: JSON-serialisierbare Einstellungen
+        """
+        return {}
+    
+    def convert_all(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Konvertiert mehrere Dateien in einem Durchlauf
+        
+        Die Standardimplementierung konvertiert die Dateien nacheinander. Konverter mit
+        teurer Initialisierung können die Methode für echte Batch-Verarbeitung überschreiben.
+        
+        Args:
+            file_paths: Pfade zu den Eingabedateien
+            
+        Returns:
+            Dict[str, Optional[str]]: Markdown-Text (oder None bei Fehler) je Dateipfad
+        """
+        return {file_path: self.convert_to_markdown(file_path) for file_path in file_paths}
@@ -0,0 +1,239 @@
+"""
+Benchmark der registrierten Dokumentenkonverter
+
+Konvertiert alle Dateien eines Ordners mit jedem Konverter in einem eigenen Worker-Prozess
+und misst Laufzeit, Seiten pro Sekunde, Spitzen-RSS (Worker samt Unterprozessen) und
+Ausgabegröße. Optional wird die Textähnlichkeit zu Referenz-Markdown-Dateien berechnet.
+
+Aufruf:
+    python -m tools.converters.benchmark [PFAD ...] --json ergebnisse.json --csv ergebnisse.csv
+"""
+from dataclasses import asdict, dataclass
+from difflib import SequenceMatcher
+from typing import Any, List, Optional
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from tools.converters.base_converter import is_pdf
+from tools.converters.converter_factory import ConverterFactory
+from tools.converters.pdf_pages import count_pages
+from tools.converters.sandbox import STATUS_OK, SandboxedConverter
+
+_log = logging.getLogger(__name__)
+
+# Mitgelieferter Rahmenlehrplan als Standard-Eingabe
+DEFAULT_FIXTURE = os.path.join("data", "Automobilkaufleute-2016-09-16.pdf")
+
+@dataclass
+class BenchmarkResult:
+    """Messwerte einer Konvertierung"""
+    file: str
+    converter: str
+    run: int
+    status: str
+    duration: float
+    pages: Optional[int] = None
+    pages_per_sec: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    output_chars: int = 0
+    output_bytes: int = 0
+    similarity: Optional[float] = None
+    error: Optional[str] = None
+
+def text_similarity(text: str, reference: str) -> float:
+    """
+    Berechnet die Ähnlichkeit zweier Markdown-Texte (0.0 - 1.0)
+    
+    Verglichen wird zeilenweise nach Normalisierung der Leerzeichen, damit unterschiedliche
+    Umbrüche und Einrückungen das Ergebnis nicht dominieren und auch lange Dokumente
+    schnell verglichen werden.
+    
+    Args:
+        text: Ausgabe des Konverters
+        reference: Referenztext
+        
+    Returns:
+        float: Ähnlichkeitsmaß nach difflib.SequenceMatcher
+    """
+    def lines(value: str) -> List[str]:
+        return [" ".join(line.split()) for line in value.splitlines() if line.strip()]
+    return SequenceMatcher(None, lines(text), lines(reference), autojunk=False).ratio()
+
+def collect_files(paths: List[str]) -> List[str]:
+    """
+    Sammelt die zu konvertierenden PDF-Dateien aus Dateien und Ordnern
+    
+    Args:
+        paths: Dateien oder Ordner (Ordner werden rekursiv durchsucht)
+        
+    Returns:
+        List[str]: Sortierte Dateipfade
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if is_pdf(name))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            _log.warning(f"Pfad nicht gefunden: {path}")
+    return sorted(files)
+
+def load_reference(reference_dir: Optional[str], file_path: str) -> Optional[str]:
+    """Lädt die Referenz <Dateiname ohne Endung>.md aus dem Referenzordner, falls vorhanden"""
+    if not reference_dir:
+        return None
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    reference_path = os.path.join(reference_dir, f"{stem}.md")
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def run_benchmark(file_paths: List[str],
+                  converter_names: Optional[List[str]] = None,
+                  repeat: int = 1,
+                  timeout: float = 600.0,
+                  max_rss_mb: Optional[int] = None,
+                  reference_dir: Optional[str] = None,
+                  markdown_dir: Optional[str] = None) -> List[BenchmarkResult]:
+    """
+    Konvertiert alle Dateien mit allen Konvertern und sammelt die Messwerte
+    
+    Jede Konvertierung läuft in einem frischen Worker-Prozess, damit bereits geladene
+    Modelle oder belegter Speicher die folgenden Messungen nicht verfälschen. Die
+    Laufzeit enthält daher auch das Laden der Modelle. Der Worker importiert nur das
+    Modul des gemessenen Konverters, so dass Laufzeit und Spitzen-RSS keine Abhängigkeiten
+    anderer Konverter (z.B. docling) enthalten.
+    
+    Args:
+        file_paths: Zu konvertierende Dateien
+        converter_names: Zu vergleichende Konverter (None = alle registrierten)
+        repeat: Anzahl der Durchläufe je Datei und Konverter
+        timeout: Zeitbudget je Konvertierung in Sekunden
+        max_rss_mb: Speicherbudget je Worker-Prozess in MB (None = unbegrenzt)
+        reference_dir: Ordner mit Referenz-Markdown für den Ähnlichkeitsvergleich
+        markdown_dir: Ordner, in den die Ausgaben als <Datei>.<Konverter>.md geschrieben werden
+        
+    Returns:
+        List[BenchmarkResult]: Messwerte je Datei, Konverter und Durchlauf
+    """
+    converter_names = converter_names or ConverterFactory.get_converter_names()
+    if markdown_dir:
+        os.makedirs(markdown_dir, exist_ok=True)
+        
+    results = []
+    for file_path in file_paths:
+        try:
+            pages = count_pages(file_path)
+        except Exception as e:
+            _log.warning(f"Seitenzahl von {file_path} nicht ermittelbar: {str(e)}")
+            pages = None
+        reference = load_reference(reference_dir, file_path)
+        
+        for converter_name in converter_names:
+            sandbox = SandboxedConverter(converter_name, timeout=timeout, max_rss_mb=max_rss_mb)
+            for run in range(1, repeat + 1):
+                _log.info(f"{converter_name}: {file_path} (Durchlauf {run}/{repeat})")
+                outcome = sandbox.run(file_path)
+                md_text = outcome.md_text or ""
+                result = BenchmarkResult(
+                    file=file_path,
+                    converter=converter_name,
+                    run=run,
+                    status=outcome.status,
+                    duration=round(outcome.duration, 3),
+                    pages=pages,
+                    peak_rss_mb=round(outcome.peak_rss / (1024 * 1024), 1) if outcome.peak_rss else None,
+                    output_chars=len(md_text),
+                    output_bytes=len(md_text.encode("utf-8")),
+                    error=outcome.error
+                )
+                if outcome.status == STATUS_OK and pages and outcome.duration > 0:
+                    result.pages_per_sec = round(pages / outcome.duration, 2)
+                if outcome.status == STATUS_OK and reference is not None:
+                    result.similarity = round(text_similarity(md_text, reference), 4)
+                if markdown_dir and outcome.status == STATUS_OK and run == 1:
+                    stem = os.path.splitext(os.path.basename(file_path))[0]
+                    suffix = converter_name.split(" ")[0]
+                    with open(os.path.join(markdown_dir, f"{stem}.{suffix}.md"), "w", encoding="utf-8") as f:
+                        f.write(md_text)
+                results.append(result)
+    return results
+
+def write_json(results: List[BenchmarkResult], path: str) -> None:
+    """Schreibt die Messwerte als JSON-Liste"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([asdict(result) for result in results], f, ensure_ascii=False, indent=2)
+
+def write_csv(results: List[BenchmarkResult], path: str) -> None:
+    """Schreibt die Messwerte als CSV mit einer Zeile je Messung"""
+    fieldnames = list(BenchmarkResult.__dataclass_fields__)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(asdict(result))
+
+def format_table(results: List[BenchmarkResult]) -> str:
+    """Formatiert die Messwerte als Texttabelle für die Konsole"""
+    def fmt(value: Any) -> str:
+        return "-" if value is None else str(value)
+        
+    header = ["Datei", "Konverter", "Lauf", "Status", "Zeit (s)", "Seiten/s", "RSS (MB)", "Zeichen", "Ähnlichkeit"]
+    rows = [[
+        os.path.basename(r.file), r.converter, fmt(r.run), r.status, fmt(r.duration),
+        fmt(r.pages_per_sec), fmt(r.peak_rss_mb), fmt(r.output_chars), fmt(r.similarity)
+    ] for r in results]
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in [header] + rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vergleicht die Dokumentenkonverter nach Laufzeit, Speicher und Ausgabe")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_FIXTURE],
+                        help=f"Dateien oder Ordner (Standard: {DEFAULT_FIXTURE})")
+    parser.add_argument("-c", "--converter", action="append", dest="converters",
+                        help="Zu messender Konverter, mehrfach angebbar (Standard: alle)")
+    parser.add_argument("-n", "--repeat", type=int, default=1, help="Durchläufe je Datei und Konverter")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Zeitbudget je Konvertierung in Sekunden")
+    parser.add_argument("--max-rss-mb", type=int, default=None, help="Speicherbudget je Worker-Prozess in MB")
+    parser.add_argument("--reference-dir", help="Ordner mit Referenz-Markdown (<Dateiname>.md)")
+    parser.add_argument("--markdown-dir", help="Ordner für die Markdown-Ausgaben der Konverter")
+    parser.add_argument("--json", dest="json_path", help="Ergebnisse als JSON speichern")
+    parser.add_argument("--csv", dest="csv_path", help="Ergebnisse als CSV speichern")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    
+    file_paths = collect_files(args.paths)
+    if not file_paths:
+        parser.error("Keine PDF-Dateien gefunden")
+    converter_names = [ConverterFactory._resolve_name(name) for name in args.converters or []]
+    unknown = [name for name in converter_names if name not in ConverterFactory.get_converter_names()]
+    if unknown:
+        parser.error(f"Unbekannte Konverter: {', '.join(unknown)}")
+        
+    results = run_benchmark(
+        file_paths,
+        converter_names=converter_names or None,
+        repeat=max(args.repeat, 1),
+        timeout=args.timeout,
+        max_rss_mb=args.max_rss_mb,
+        reference_dir=args.reference_dir,
+        markdown_dir=args.markdown_dir
+    )
+    print(format_table(results))
+    if args.json_path:
+        write_json(results, args.json_path)
+    if args.csv_path:
+        write_csv(results, args.csv_path)
+    return 0 if all(result.status == STATUS_OK for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
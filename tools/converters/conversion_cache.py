@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from tools.cache.disk_cache import CacheStats, DiskCache
+from tools.converters.base_converter import BaseConverter, DocumentSource, MarkdownChunk, is_buffer, open_binary, source_label
+
+_log = logging.getLogger(__name__)
+
+# Erhöhen, wenn sich die Markdown-Ausgabe der Konverter ändert
+CACHE_VERSION = 1
+
+
+class ConversionCache:
+    """Inhaltsadressierter Cache für Konvertierungsergebnisse
+    
+    Der Schlüssel setzt sich aus dem SHA-256 des Dateiinhalts, dem Konverternamen und
+    den Konvertereinstellungen zusammen. Eine ersetzte Datei mit gleichem Namen oder ein
+    Konverterwechsel führt damit zu einem neuen Eintrag statt zu einem veralteten Treffer.
+    """
+    
+    def __init__(self, cache_path: str = "./cache/conversions.sqlite", max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_path: Pfad zur SQLite-Datei des Caches
+            max_bytes: Maximale Größe aller gespeicherten Markdown-Texte in Bytes
+        """
+        self._cache = DiskCache(cache_path, max_bytes=max_bytes)
+    
+    @staticmethod
+    def source_hash(source: DocumentSource, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Berechnet den SHA-256 des Dateiinhalts
+        
+        Args:
+            source: Pfad zur Datei oder Dateiinhalt
+            chunk_size: Größe der gelesenen Blöcke in Bytes
+            
+        Returns:
+            str: Hex-Digest des Inhalts
+        """
+        if is_buffer(source):
+            return hashlib.sha256(source).hexdigest()
+        digest = hashlib.sha256()
+        with open_binary(source) as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def make_key(content_hash: str, converter_name: str, options: Dict[str, Any]) -> str:
+        """
+        Bildet den Cache-Schlüssel aus Inhalt, Konverter und Einstellungen
+        
+        Args:
+            content_hash: SHA-256 des Dateiinhalts
+            converter_name: Name des Konverters
+            options: Einstellungen des Konverters
+            
+        Returns:
+            str: Cache-Schlüssel
+        """
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "content": content_hash,
+            "converter": converter_name,
+            "options": options
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def lookup(self, converter: BaseConverter, converter_name: str, source: DocumentSource) -> Tuple[str, Optional[str]]:
+        """
+        Sucht das Konvertierungsergebnis einer Datei im Cache
+        
+        Args:
+            converter: Zu verwendender Konverter
+            converter_name: Name des Konverters (Teil des Cache-Schlüssels)
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+            
+        Returns:
+            Tuple[str, Optional[str]]: (Cache-Schlüssel, Markdown-Text oder None bei Fehlzugriff)
+        """
+        key = self.make_key(self.source_hash(source), converter_name, converter.get_options())
+        md_text = self._cache.get_text(key)
+        if md_text is not None:
+            _log.info(f"Konvertierungs-Cache-Treffer für {source_label(source)} ({converter_name})")
+        return key, md_text
+    
+    def store(self, key: str, md_text: str, converter_name: str, source: DocumentSource) -> None:
+        """
+        Speichert ein Konvertierungsergebnis unter dem von lookup() gelieferten Schlüssel
+        
+        Args:
+            key: Cache-Schlüssel
+            md_text: Markdown-Text
+            converter_name: Name des Konverters
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+        """
+        self._cache.set_text(key, md_text, meta={"converter": converter_name, "file": source_label(source)})
+    
+    def get_or_convert(self, converter: BaseConverter, converter_name: str, source: DocumentSource) -> Optional[str]:
+        """
+        Liefert das gecachte Markdown oder konvertiert die Datei und speichert das Ergebnis
+        
+        Args:
+            converter: Zu verwendender Konverter
+            converter_name: Name des Konverters (Teil des Cache-Schlüssels)
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+            
+        Returns:
+            Optional[str]: Markdown-Text oder None bei Fehler
+        """
+        key, md_text = self.lookup(converter, converter_name, source)
+        if md_text is not None:
+            return md_text
+            
+        md_text = converter.convert_to_markdown(source)
+        if md_text:
+            self.store(key, md_text, converter_name, source)
+        return md_text
+    
+    def get_or_convert_all(self, converter: BaseConverter, converter_name: str,
+                           file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Wie get_or_convert(), konvertiert alle Fehlzugriffe aber gemeinsam über convert_all()
+        
+        Args:
+            converter: Zu verwendender Konverter
+            converter_name: Name des Konverters (Teil des Cache-Schlüssels)
+            file_paths: Pfade zu den Eingabedateien
+            
+        Returns:
+            Dict[str, Optional[str]]: Markdown-Text (oder None bei Fehler) je Dateipfad
+        """
+        results: Dict[str, Optional[str]] = {}
+        missing: Dict[str, str] = {}
+        for file_path in file_paths:
+            key, md_text = self.lookup(converter, converter_name, file_path)
+            if md_text is not None:
+                results[file_path] = md_text
+            else:
+                missing[file_path] = key
+                
+        if missing:
+            for file_path, md_text in converter.convert_all(list(missing)).items():
+                if md_text:
+                    self.store(missing[file_path], md_text, converter_name, file_path)
+                results[file_path] = md_text
+                
+        return {file_path: results.get(file_path) for file_path in file_paths}
+    
+    def stats(self) -> CacheStats:
+        """Gibt die Trefferstatistik des Caches zurück"""
+        return self._cache.stats()
+    
+    def clear(self) -> None:
+        """Leert den Cache"""
+        self._cache.clear()
+
+
+class CachedConverter(BaseConverter):
+    """Konverter-Wrapper, der Ergebnisse über einen ConversionCache wiederverwendet"""
+    
+    def __init__(self, converter: BaseConverter, converter_name: str, cache: ConversionCache):
+        self.converter = converter
+        self.converter_name = converter_name
+        self.cache = cache
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
+        try:
+            return self.cache.get_or_convert(self.converter, self.converter_name, source)
+        except OSError as e:
+            _log.error(f"Fehler beim Zugriff auf den Konvertierungs-Cache: {str(e)}")
+            return self.converter.convert_to_markdown(source)
+    
+    def convert_all(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        try:
+            return self.cache.get_or_convert_all(self.converter, self.converter_name, file_paths)
+        except OSError as e:
+            _log.error(f"Fehler beim Zugriff auf den Konvertierungs-Cache: {str(e)}")
+            return self.converter.convert_all(file_paths)
+    
+    def iter_markdown(self, source: DocumentSource, pages: Optional[Sequence[int]] = None) -> Iterator[MarkdownChunk]:
+        # Seitenweise Ausgabe wird nicht gecacht, sondern direkt an den Konverter weitergereicht
+        return self.converter.iter_markdown(source, pages)
+    
+    def get_conversion_info(self, source: DocumentSource) -> Dict[str, Any]:
+        return self.converter.get_conversion_info(source)
+    
+    def get_options(self) -> Dict[str, Any]:
+        return self.converter.get_options()
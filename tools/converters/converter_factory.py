@@ -1,25 +1,100 @@
-from typing import Dict, Type
-from .base_converter import BaseConverter
-from .ibm_docling_converter import IBMDoclingConverter
-from .pymupdf_converter import PyMuPDFConverter
-from .pdfplumber_converter import PDFPlumberConverter
+from typing import Dict, List, Optional, Type
+from .base_converter import BaseConverter, load_converter_class
+from .conversion_cache import CachedConverter, ConversionCache
+from .incremental import IncrementalConverter, PageStore
+from .sandbox import FallbackConverter
 
 class ConverterFactory:
     """Factory-Klasse für die Erstellung von Dokumentenkonvertern"""
     
-    _converters: Dict[str, Type[BaseConverter]] = {
-        "IBMDocling (genau)": IBMDoclingConverter,
-        "PyMuPDF4LLM (schnell)": PyMuPDFConverter,
-        "PDFPlumber (robust)": PDFPlumberConverter
+    # Modulpfade der Konverter; ein Modul wird erst importiert, wenn sein Konverter verwendet
+    # wird, damit z.B. Worker-Prozesse für PyMuPDF nicht docling laden
+    _converters: Dict[str, str] = {
+        "IBMDocling (genau)": "tools.converters.ibm_docling_converter:IBMDoclingConverter",
+        "PyMuPDF4LLM (schnell)": "tools.converters.pymupdf_converter:PyMuPDFConverter",
+        "PDFPlumber (robust)": "tools.converters.pdfplumber_converter:PDFPlumberConverter"
     }
     
+    # Bereits geladene bzw. direkt registrierte Konverter-Klassen
+    _classes: Dict[str, Type[BaseConverter]] = {}
+    
+    # Reihenfolge, in der Konverter bei Überschreitung des Zeit- oder Speicherbudgets
+    # nachrücken; der gewählte Konverter wird jeweils an den Anfang gestellt
+    _fallback_order: List[str] = [
+        "PyMuPDF4LLM (schnell)",
+        "PDFPlumber (robust)",
+        "IBMDocling (genau)"
+    ]
+    
+    # Explizit festgelegte Fallback-Ketten je Konverter
+    _fallback_chains: Dict[str, List[str]] = {}
+    
+    @classmethod
+    def _resolve_name(cls, converter_name: str) -> str:
+        """Konvertiert alte Namen in neue Namen"""
+        name_mapping = {
+            "IBMDocling": "IBMDocling (genau)",
+            "PyMuPDF4LLM": "PyMuPDF4LLM (schnell)",
+            "IBMDocling Enhanced": "IBMDocling (genau)",
+            "PDFPlumber": "PDFPlumber (robust)"
+        }
+        return name_mapping.get(converter_name, converter_name)
+    
+    @classmethod
+    def get_converter_path(cls, converter_name: str) -> str:
+        """
+        Gibt den Modulpfad eines Konverters zurück
+        
+        Args:
+            converter_name: Name des Konverters
+            
+        Returns:
+            str: Modul und Klasse im Format "paket.modul:Klasse"
+            
+        Raises:
+            ValueError: Wenn der Konverter nicht gefunden wurde
+        """
+        converter_name = cls._resolve_name(converter_name)
+        path = cls._converters.get(converter_name)
+        if not path:
+            raise ValueError(f"Unbekannter Konverter: {converter_name}")
+        return path
+    
+    @classmethod
+    def get_converter_class(cls, converter_name: str) -> Type[BaseConverter]:
+        """
+        Gibt die Klasse eines Konverters zurück und importiert dazu nur dessen Modul
+        
+        Raises:
+            ValueError: Wenn der Konverter nicht gefunden wurde
+        """
+        converter_name = cls._resolve_name(converter_name)
+        if converter_name not in cls._classes:
+            cls._classes[converter_name] = load_converter_class(cls.get_converter_path(converter_name))
+        return cls._classes[converter_name]
+    
     @classmethod
-    def get_converter(cls, converter_name: str) -> BaseConverter:
+    def get_converter(cls,
+                      converter_name: str,
+                      cache: Optional[ConversionCache] = None,
+                      page_store: Optional[PageStore] = None,
+                      sandboxed: bool = False,
+                      timeout: float = 300.0,
+                      max_rss_mb: Optional[int] = 4096,
+                      **options) -> BaseConverter:
         """
         Erstellt eine Instanz des gewählten Konverters
         
         Args:
             converter_name: Name des gewünschten Konverters
+            cache: Optionaler Konvertierungs-Cache, über den Ergebnisse wiederverwendet werden
+            page_store: Optionaler Seitenspeicher; geänderte Dokumente werden dann nur für die
+                geänderten Seiten neu konvertiert (nicht zusammen mit sandboxed, nur für Konverter
+                mit pages_independent)
+            sandboxed: Konverter in isolierten Worker-Prozessen mit Fallback-Kette ausführen
+            timeout: Zeitbudget je Datei und Konverter in Sekunden (nur mit sandboxed)
+            max_rss_mb: Speicherbudget je Worker-Prozess in MB (nur mit sandboxed)
+            **options: Einstellungen, die an den Konstruktor des Konverters übergeben werden
             
         Returns:
             BaseConverter: Instanz des gewählten Konverters
@@ -27,21 +102,70 @@ class ConverterFactory:
         Raises:
             ValueError: Wenn der Konverter nicht gefunden wurde
         """
-        # Konvertiere alte Namen in neue Namen
-        name_mapping = {
-            "IBMDocling": "IBMDocling (genau)",
-            "PyMuPDF4LLM": "PyMuPDF4LLM (schnell)",
-            "IBMDocling Enhanced": "IBMDocling (genau)",
-            "PDFPlumber": "PDFPlumber (robust)"
-        }
-        
         # Versuche den Namen zu mappen, falls es ein alter Name ist
-        converter_name = name_mapping.get(converter_name, converter_name)
+        converter_name = cls._resolve_name(converter_name)
         
-        converter_class = cls._converters.get(converter_name)
-        if not converter_class:
-            raise ValueError(f"Unbekannter Konverter: {converter_name}")
-        return converter_class()
+        converter_class = cls.get_converter_class(converter_name)
+        if sandboxed:
+            converter = FallbackConverter(
+                cls.get_fallback_chain(converter_name),
+                timeout=timeout,
+                max_rss_mb=max_rss_mb,
+                options={converter_name: options} if options else None
+            )
+        else:
+            converter = converter_class(**options)
+            # Nur Konverter ohne dokumentweiten Zustand (z.B. Überschriftenebenen) seitenweise wiederverwenden
+            if page_store is not None and converter_class.pages_independent:
+                converter = IncrementalConverter(converter, converter_name, page_store)
+        if cache is not None:
+            return CachedConverter(converter, converter_name, cache)
+        return converter
+    
+    @classmethod
+    def get_fallback_chain(cls, converter_name: str) -> List[str]:
+        """
+        Gibt die Fallback-Kette für einen Konverter zurück
+        
+        Args:
+            converter_name: Name des zuerst zu verwendenden Konverters
+            
+        Returns:
+            List[str]: Konverternamen in der Reihenfolge, in der sie versucht werden
+        """
+        converter_name = cls._resolve_name(converter_name)
+        if converter_name in cls._fallback_chains:
+            return list(cls._fallback_chains[converter_name])
+        return [converter_name] + [name for name in cls._fallback_order
+                                   if name != converter_name and name in cls._converters]
+    
+    @classmethod
+    def set_fallback_chain(cls, converter_name: str, chain: List[str]) -> None:
+        """
+        Legt die Fallback-Kette für einen Konverter fest
+        
+        Args:
+            converter_name: Name des zuerst zu verwendenden Konverters
+            chain: Konverternamen in der Reihenfolge, in der sie versucht werden
+            
+        Raises:
+            ValueError: Wenn ein Konverter der Kette nicht registriert ist
+        """
+        chain = [cls._resolve_name(name) for name in chain]
+        unknown = [name for name in chain if name not in cls._converters]
+        if unknown:
+            raise ValueError(f"Unbekannte Konverter in der Fallback-Kette: {', '.join(unknown)}")
+        cls._fallback_chains[cls._resolve_name(converter_name)] = chain
+    
+    @classmethod
+    def get_converter_names(cls) -> List[str]:
+        """
+        Gibt die Namen aller registrierten Konverter zurück
+        
+        Returns:
+            List[str]: Konverternamen in der Reihenfolge der Registrierung
+        """
+        return list(cls._converters)
     
     @classmethod
     def register_converter(cls, name: str, converter_class: Type[BaseConverter]) -> None:
@@ -52,4 +176,5 @@ class ConverterFactory:
             name: Name des Konverters
             converter_class: Konverter-Klasse die BaseConverter implementiert
         """
-        cls._converters[name] = converter_class
+        cls._converters[name] = f"{converter_class.__module__}:{converter_class.__qualname__}"
+        cls._classes[name] = converter_class
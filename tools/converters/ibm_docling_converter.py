@@ -1,36 +1,195 @@
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 import logging
-from docling.datamodel.base_models import InputFormat
+import os
+import threading
+from io import BytesIO
+from docling.datamodel.base_models import ConversionStatus, DocumentStream, InputFormat
 from docling.document_converter import DocumentConverter, PdfFormatOption
 from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
-from tools.converters.base_converter import BaseConverter
+from tools.converters.base_converter import BaseConverter, DocumentSource, MarkdownChunk, is_buffer, is_pdf, source_key, source_label
+from tools.converters.pdf_pages import count_pages, scan_pages
 
 _log = logging.getLogger(__name__)
 
+# Prozessweit geteilte DocumentConverter je Pipeline-Konfiguration. Die Layout-, TableFormer-
+# und OCR-Modelle werden so nur einmal pro Prozess geladen und überleben Streamlit-Reruns.
+_document_converters: Dict[Tuple[Any, ...], DocumentConverter] = {}
+_document_converters_lock = threading.Lock()
+
+def _page_windows(page_numbers: List[int], ocr_pages: Set[int], window_size: int) -> List[Tuple[int, int, bool]]:
+    """
+    Fasst sortierte Seitennummern zu zusammenhängenden Bereichen gleicher OCR-Behandlung zusammen
+    
+    Args:
+        page_numbers: Sortierte Seitennummern (1-basiert)
+        ocr_pages: Seiten, die per OCR erkannt werden sollen
+        window_size: Maximale Anzahl von Seiten je Bereich
+        
+    Returns:
+        List[Tuple[int, int, bool]]: Bereiche als (erste Seite, letzte Seite, OCR), Seiten jeweils inklusive
+    """
+    windows: List[Tuple[int, int, bool]] = []
+    for page_number in page_numbers:
+        do_ocr = page_number in ocr_pages
+        if windows and page_number == windows[-1][1] + 1 and do_ocr == windows[-1][2] \
+                and page_number - windows[-1][0] < window_size:
+            windows[-1] = (windows[-1][0], page_number, do_ocr)
+        else:
+            windows.append((page_number, page_number, do_ocr))
+    return windows
+
+def _docling_input(source: DocumentSource) -> Union[str, DocumentStream]:
+    """Übergibt Dokumente im Speicher als DocumentStream an Docling, ohne sie auf die Festplatte zu schreiben"""
+    if is_buffer(source):
+        name = "dokument.pdf" if is_pdf(source) else "dokument"
+        return DocumentStream(name=name, stream=BytesIO(source))
+    return os.fspath(source)
+
 class IBMDoclingConverter(BaseConverter):
     """IBM Docling Implementierung des Dokumentenkonverters für PDF Dateien"""
     
-    def convert_to_markdown(self, file_path: str) -> Optional[str]:
+    OCR_AUTO = "auto"  # Nur Seiten ohne Textebene per OCR erkennen
+    OCR_ALWAYS = "always"
+    OCR_NEVER = "never"
+    
+    def __init__(self,
+                 table_mode: TableFormerMode = TableFormerMode.ACCURATE,
+                 do_cell_matching: bool = True,
+                 ocr_mode: str = OCR_AUTO,
+                 min_text_chars: int = 32,
+                 window_size: int = 8):
+        """
+        Args:
+            table_mode: Modus der Tabellenerkennung (ACCURATE oder FAST)
+            do_cell_matching: Zellen der Tabellenstruktur mit dem PDF-Text abgleichen
+            ocr_mode: "auto" (nur gescannte Seiten), "always" oder "never"
+            min_text_chars: Mindestanzahl von Zeichen, ab der eine Seite als Textseite gilt
+            window_size: Anzahl der Seiten, die iter_markdown() je Docling-Aufruf konvertiert
+        """
+        if ocr_mode not in (self.OCR_AUTO, self.OCR_ALWAYS, self.OCR_NEVER):
+            raise ValueError(f"Unbekannter OCR-Modus: {ocr_mode}")
+        self.table_mode = table_mode
+        self.do_cell_matching = do_cell_matching
+        self.ocr_mode = ocr_mode
+        self.min_text_chars = min_text_chars
+        self.window_size = window_size
+        # Per OCR erkannte Seiten je konvertierter Datei
+        self.ocr_pages: Dict[str, List[int]] = {}
+    
+    def get_options(self) -> Dict[str, Any]:
+        """Gibt die Pipeline-Einstellungen zurück"""
+        return {
+            "do_table_structure": True,
+            "table_mode": self.table_mode.value,
+            "do_cell_matching": self.do_cell_matching,
+            "ocr_mode": self.ocr_mode,
+            "min_text_chars": self.min_text_chars
+        }
+    
+    def _get_document_converter(self, do_ocr: bool) -> DocumentConverter:
+        """
+        Gibt den geteilten DocumentConverter für die aktuellen Einstellungen zurück
+        
+        Beim ersten Aufruf je Konfiguration werden Pipeline und Modelle geladen, danach
+        wird dieselbe Instanz wiederverwendet.
+        
+        Args:
+            do_ocr: Pipeline mit OCR-Modell anfordern
+        """
+        key = (self.table_mode.value, self.do_cell_matching, do_ocr)
+        with _document_converters_lock:
+            doc_converter = _document_converters.get(key)
+            if doc_converter is None:
+                # PDF-Pipeline-Optionen konfigurieren
+                pipeline_options = PdfPipelineOptions(do_table_structure=True)  # Tabellenextraktion aktivieren
+                pipeline_options.table_structure_options.mode = self.table_mode  # Präzise Tabellenerkennung
+                pipeline_options.table_structure_options.do_cell_matching = self.do_cell_matching  # Bessere Spaltenzuordnung
+                pipeline_options.do_ocr = do_ocr  # OCR nur für Seiten ohne Textebene
+                
+                # DocumentConverter initialisieren und Modelle vorab laden
+                doc_converter = DocumentConverter(
+                    format_options={
+                        InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+                    }
+                )
+                doc_converter.initialize_pipeline(InputFormat.PDF)
+                _document_converters[key] = doc_converter
+                _log.info(f"IBM Docling Pipeline geladen: {self.table_mode.value}, OCR={do_ocr}")
+            return doc_converter
+    
+    def get_conversion_info(self, source: DocumentSource) -> Dict[str, Any]:
+        """Gibt die Anzahl und Nummern der per OCR erkannten Seiten zurück"""
+        key = source_key(source)
+        if key not in self.ocr_pages:
+            return {}
+        return {"ocr_page_count": len(self.ocr_pages[key]), "ocr_pages": self.ocr_pages[key]}
+    
+    def _plan_ocr(self, source: DocumentSource) -> Tuple[List[int], Set[int]]:
+        """
+        Bestimmt die Seiten eines Dokuments und die davon per OCR zu erkennenden Seiten
+        
+        Im Modus "auto" wird die Textebene jeder Seite vorab geprüft. Für Nicht-PDF-Dateien
+        oder wenn die Vorprüfung fehlschlägt, wird OCR für das ganze Dokument verwendet.
+        
+        Args:
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+            
+        Returns:
+            Tuple[List[int], Set[int]]: (Alle Seitennummern, OCR-Seitennummern); leere Seitenliste bei Nicht-PDF-Dateien
+        """
+        if not is_pdf(source):
+            return [], set()
+        
+        if self.ocr_mode != self.OCR_AUTO:
+            page_numbers = list(range(1, count_pages(source) + 1))
+            return page_numbers, set(page_numbers) if self.ocr_mode == self.OCR_ALWAYS else set()
+        
+        try:
+            scans = scan_pages(source, self.min_text_chars)
+        except Exception as e:
+            _log.warning(f"Vorprüfung der Textebene von {source_label(source)} fehlgeschlagen, verwende OCR: {str(e)}")
+            page_numbers = list(range(1, count_pages(source) + 1))
+            return page_numbers, set(page_numbers)
+        return [scan.page_number for scan in scans], {scan.page_number for scan in scans if not scan.has_text_layer}
+    
+    def _record_ocr(self, source: DocumentSource, page_count: int, ocr_pages: Set[int]) -> None:
+        """Protokolliert die per OCR erkannten Seiten einer Datei"""
+        self.ocr_pages[source_key(source)] = sorted(ocr_pages)
+        _log.info(f"IBM Docling OCR für {len(ocr_pages)} von {page_count} Seiten: {source_label(source)}")
+    
+    def _iter_windows(self, source: DocumentSource, page_numbers: List[int], ocr_pages: Set[int]) -> Iterator[MarkdownChunk]:
+        """Konvertiert Seitenfenster mit der jeweils passenden Pipeline und liefert das Markdown seitenweise"""
+        for start, end, do_ocr in _page_windows(page_numbers, ocr_pages, self.window_size):
+            result = self._get_document_converter(do_ocr).convert(_docling_input(source), page_range=(start, end))
+            if not result or not result.document:
+                raise ValueError(f"Konvertierung der Seiten {start}-{end} von {source_label(source)} fehlgeschlagen")
+            for page_number in range(start, end + 1):
+                yield MarkdownChunk(
+                    page_number=page_number,
+                    text=result.document.export_to_markdown(page_no=page_number)
+                )
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
         """
         Konvertiert eine PDF-Datei zu Markdown.
+        
+        Dokumente mit durchgehender Textebene werden ohne OCR konvertiert. Bei gemischten
+        Dokumenten laufen nur die gescannten Seiten durch die OCR-Pipeline.
         """
         try:
-            # PDF-Pipeline-Optionen konfigurieren
-            pipeline_options = PdfPipelineOptions(do_table_structure=True)  # Tabellenextraktion aktivieren
-            pipeline_options.table_structure_options.mode = TableFormerMode.ACCURATE  # Präzise Tabellenerkennung
-            pipeline_options.table_structure_options.do_cell_matching = True  # Bessere Spaltenzuordnung
-            pipeline_options.do_ocr = True  # OCR aktivieren
-
-            # DocumentConverter initialisieren
-            doc_converter = DocumentConverter(
-                format_options={
-                    InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-                }
-            )
-
+            page_numbers, ocr_pages = self._plan_ocr(source)
+            if not page_numbers:
+                do_ocr = self.ocr_mode != self.OCR_NEVER
+            elif not ocr_pages or len(ocr_pages) == len(page_numbers):
+                do_ocr = bool(ocr_pages)
+                self._record_ocr(source, len(page_numbers), ocr_pages)
+            else:
+                self._record_ocr(source, len(page_numbers), ocr_pages)
+                return self.page_separator.join(chunk.text for chunk in self._iter_windows(source, page_numbers, ocr_pages))
+            
             # Dokument konvertieren
-            result = doc_converter.convert(file_path)
-
+            result = self._get_document_converter(do_ocr).convert(_docling_input(source))
+            
             # Markdown-Export erzeugen
             if result and result.document:
                 return result.document.export_to_markdown()
@@ -39,3 +198,64 @@ class IBMDoclingConverter(BaseConverter):
         except Exception as e:
             _log.error(f"Fehler bei der Konvertierung mit IBM Docling: {str(e)}")
             return None
+    
+    def iter_markdown(self, source: DocumentSource, pages: Optional[Sequence[int]] = None) -> Iterator[MarkdownChunk]:
+        """
+        Konvertiert das Dokument in Seitenfenstern und liefert das Markdown seitenweise
+        
+        Es wird jeweils nur ein Fenster von window_size Seiten im Speicher gehalten.
+        """
+        all_pages, ocr_pages = self._plan_ocr(source)
+        if not all_pages:
+            yield from super().iter_markdown(source, pages)
+            return
+        
+        page_numbers = sorted(pages) if pages is not None else all_pages
+        ocr_pages = ocr_pages.intersection(page_numbers)
+        self._record_ocr(source, len(page_numbers), ocr_pages)
+        yield from self._iter_windows(source, page_numbers, ocr_pages)
+    
+    def convert_all(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Konvertiert mehrere Dateien in Docling-Batches mit einmalig geladenen Modellen.
+        
+        Dateien ohne bzw. nur mit gescannten Seiten werden gemeinsam in je einem Batch
+        konvertiert, gemischte Dokumente einzeln mit seitenweiser OCR-Auswahl.
+        """
+        results: Dict[str, Optional[str]] = {file_path: None for file_path in file_paths}
+        batches: Dict[bool, List[str]] = {False: [], True: []}
+        
+        for file_path in file_paths:
+            try:
+                page_numbers, ocr_pages = self._plan_ocr(file_path)
+            except Exception as e:
+                _log.error(f"Fehler bei der Vorprüfung von {file_path}: {str(e)}")
+                continue
+            if not page_numbers:
+                batches[self.ocr_mode != self.OCR_NEVER].append(file_path)
+            elif not ocr_pages or len(ocr_pages) == len(page_numbers):
+                self._record_ocr(file_path, len(page_numbers), ocr_pages)
+                batches[bool(ocr_pages)].append(file_path)
+            else:
+                results[file_path] = self.convert_to_markdown(file_path)
+        
+        for do_ocr, batch in batches.items():
+            if batch:
+                self._convert_batch(batch, do_ocr, results)
+        return results
+    
+    def _convert_batch(self, file_paths: List[str], do_ocr: bool, results: Dict[str, Optional[str]]) -> None:
+        """Konvertiert mehrere Dateien mit derselben Pipeline und trägt die Ergebnisse in results ein"""
+        try:
+            doc_converter = self._get_document_converter(do_ocr)
+            paths_by_name = {os.path.abspath(file_path): file_path for file_path in file_paths}
+            
+            for result in doc_converter.convert_all(file_paths, raises_on_error=False):
+                file_path = paths_by_name.get(os.path.abspath(str(result.input.file)), str(result.input.file))
+                if result.status in (ConversionStatus.SUCCESS, ConversionStatus.PARTIAL_SUCCESS) and result.document:
+                    results[file_path] = result.document.export_to_markdown()
+                else:
+                    _log.error(f"Fehler bei der Konvertierung von {file_path} mit IBM Docling: {result.status}")
+                    
+        except Exception as e:
+            _log.error(f"Fehler bei der Batch-Konvertierung mit IBM Docling: {str(e)}")
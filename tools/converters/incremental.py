@@ -0,0 +1,142 @@
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from tools.cache.disk_cache import CacheStats, DiskCache
+from tools.converters.base_converter import BaseConverter, DocumentSource, MarkdownChunk, is_pdf, source_key, source_label
+from tools.converters.conversion_cache import ConversionCache
+from tools.converters.pdf_pages import page_fingerprints
+
+_log = logging.getLogger(__name__)
+
+
+class PageStore:
+    """Speicher für das Markdown einzelner Seiten, adressiert über ihren Fingerabdruck
+    
+    Der Schlüssel setzt sich wie beim ConversionCache aus Inhalt (hier dem Fingerabdruck
+    der Seite), Konverter und Konvertereinstellungen zusammen.
+    """
+    
+    def __init__(self, cache_path: str = "./cache/pages.sqlite", max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_path: Pfad zur SQLite-Datei des Seitenspeichers
+            max_bytes: Maximale Größe aller gespeicherten Seiten in Bytes
+        """
+        self._cache = DiskCache(cache_path, max_bytes=max_bytes)
+    
+    @staticmethod
+    def make_key(fingerprint: str, converter_name: str, options: Dict[str, Any]) -> str:
+        """Bildet den Schlüssel einer Seite aus Fingerabdruck, Konverter und Einstellungen"""
+        return ConversionCache.make_key(fingerprint, converter_name, options)
+    
+    def get(self, key: str) -> Optional[str]:
+        """Liest das Markdown einer Seite oder None, wenn es nicht vorliegt"""
+        return self._cache.get_text(key)
+    
+    def set(self, key: str, md_text: str, converter_name: str, page_number: int) -> None:
+        """Speichert das Markdown einer Seite"""
+        self._cache.set_text(key, md_text, meta={"converter": converter_name, "page": page_number})
+    
+    def stats(self) -> CacheStats:
+        """Gibt die Trefferstatistik des Seitenspeichers zurück"""
+        return self._cache.stats()
+    
+    def clear(self) -> None:
+        """Leert den Seitenspeicher"""
+        self._cache.clear()
+
+
+class IncrementalConverter(BaseConverter):
+    """Konverter-Wrapper, der bei neuen Revisionen eines Dokuments nur geänderte Seiten konvertiert
+    
+    Für jede Seite wird ein Fingerabdruck aus Textebene und Seitenobjekten gebildet. Seiten,
+    deren Markdown bereits im PageStore liegt, werden übernommen; nur die übrigen Seiten
+    werden über iter_markdown(pages=...) konvertiert. Vorausgesetzt wird, dass der innere
+    Konverter jede Seite unabhängig von den übrigen Seiten konvertiert (pages_independent).
+    """
+    
+    def __init__(self, converter: BaseConverter, converter_name: str, store: PageStore):
+        self.converter = converter
+        self.converter_name = converter_name
+        self.store = store
+        self.page_separator = converter.page_separator
+        # Wiederverwendete und neu konvertierte Seiten je Dokument
+        self.page_stats: Dict[str, Dict[str, int]] = {}
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
+        try:
+            chunks = list(self.iter_markdown(source))
+        except NotImplementedError:
+            return self.converter.convert_to_markdown(source)
+        except Exception as e:
+            _log.error(f"Fehler bei der inkrementellen Konvertierung von {source_label(source)}: {str(e)}")
+            return None
+        return self.page_separator.join(chunk.text for chunk in chunks)
+    
+    def iter_markdown(self, source: DocumentSource, pages: Optional[Sequence[int]] = None) -> Iterator[MarkdownChunk]:
+        """
+        Liefert das Markdown seitenweise, gespeicherte Seiten ohne erneute Konvertierung
+        
+        Raises:
+            NotImplementedError: Wenn der innere Konverter keine Seitenauswahl unterstützt
+        """
+        if not is_pdf(source):
+            yield from self.converter.iter_markdown(source, pages)
+            return
+            
+        fingerprints = page_fingerprints(source)
+        page_numbers = list(pages) if pages is not None else list(range(1, len(fingerprints) + 1))
+        options = self.converter.get_options()
+        keys = {page_number: self.store.make_key(fingerprints[page_number - 1], self.converter_name, options)
+                for page_number in page_numbers}
+                
+        stored: Dict[int, str] = {}
+        for page_number in page_numbers:
+            md_text = self.store.get(keys[page_number])
+            if md_text is not None:
+                stored[page_number] = md_text
+        missing = [page_number for page_number in page_numbers if page_number not in stored]
+        
+        self.page_stats[source_key(source)] = {
+            "reused_pages": len(stored),
+            "converted_pages": len(missing)
+        }
+        if stored:
+            _log.info(f"{len(stored)} von {len(page_numbers)} Seiten aus {source_label(source)} wiederverwendet")
+            
+        converted = self._convert_pages(source, missing, all_pages=pages is None and not stored)
+        for page_number in page_numbers:
+            if page_number in stored:
+                yield MarkdownChunk(page_number=page_number, text=stored[page_number])
+                continue
+            chunk = next(converted, None)
+            if chunk is None:
+                raise ValueError(f"{self.converter_name} lieferte für {source_label(source)} weniger Seiten "
+                                 f"als angefordert (Seite {page_number} fehlt)")
+            if chunk.page_number is None:
+                # Konverter ohne seitenweise Ausgabe: Ergebnis ungespeichert weiterreichen
+                yield chunk
+                yield from converted
+                return
+            self.store.set(keys[page_number], chunk.text, self.converter_name, page_number)
+            yield chunk
+    
+    def _convert_pages(self, source: DocumentSource, page_numbers: List[int], all_pages: bool) -> Iterator[MarkdownChunk]:
+        """
+        Konvertiert die fehlenden Seiten mit dem inneren Konverter in Seitenreihenfolge
+        
+        Args:
+            source: Pfad zur Eingabedatei oder Dateiinhalt
+            page_numbers: Zu konvertierende Seitennummern (1-basiert, aufsteigend)
+            all_pages: Ob alle Seiten fehlen; dann wird ohne Seitenauswahl konvertiert
+        """
+        if not page_numbers:
+            return
+        yield from self.converter.iter_markdown(source, None if all_pages else page_numbers)
+    
+    def get_conversion_info(self, source: DocumentSource) -> Dict[str, Any]:
+        info = dict(self.converter.get_conversion_info(source))
+        info.update(self.page_stats.get(source_key(source), {}))
+        return info
+    
+    def get_options(self) -> Dict[str, Any]:
+        return self.converter.get_options()
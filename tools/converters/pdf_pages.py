@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List
+import hashlib
+import os
+import pypdfium2 as pdfium
+from tools.converters.base_converter import DocumentSource, is_buffer
+
+@dataclass
+class PageScan:
+    """Ergebnis der Vorprüfung einer PDF-Seite"""
+    page_number: int  # 1-basiert
+    char_count: int
+    has_text_layer: bool
+
+# Erhöhen, wenn sich die Bildung der Seiten-Fingerabdrücke ändert
+FINGERPRINT_VERSION = 1
+
+def _open_pdf(source: DocumentSource) -> pdfium.PdfDocument:
+    """Öffnet eine PDF aus einem Dateipfad oder direkt aus dem Speicher"""
+    if isinstance(source, bytes):
+        return pdfium.PdfDocument(source)
+    if is_buffer(source):
+        return pdfium.PdfDocument(BytesIO(source))
+    return pdfium.PdfDocument(os.fspath(source))
+
+def count_pages(source: DocumentSource) -> int:
+    """
+    Ermittelt die Seitenzahl einer PDF-Datei
+    
+    Args:
+        source: Pfad zur PDF-Datei oder Dateiinhalt
+        
+    Returns:
+        int: Anzahl der Seiten
+    """
+    pdf = _open_pdf(source)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def scan_pages(source: DocumentSource, min_chars: int = 32) -> List[PageScan]:
+    """
+    Prüft für jede Seite, ob sie eine Textebene besitzt oder gescannt ist
+    
+    Liest nur die eingebettete Textebene aus und ist damit um Größenordnungen
+    schneller als Layout-Analyse oder OCR.
+    
+    Args:
+        source: Pfad zur PDF-Datei oder Dateiinhalt
+        min_chars: Mindestanzahl sichtbarer Zeichen für eine Seite mit Textebene
+        
+    Returns:
+        List[PageScan]: Ergebnis je Seite in Seitenreihenfolge
+    """
+    scans = []
+    pdf = _open_pdf(source)
+    try:
+        for page_idx in range(len(pdf)):
+            page = pdf[page_idx]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+            char_count = sum(1 for char in text if not char.isspace())
+            scans.append(PageScan(
+                page_number=page_idx + 1,
+                char_count=char_count,
+                has_text_layer=char_count >= min_chars
+            ))
+    finally:
+        pdf.close()
+    return scans
+
+def _page_fingerprint(page: pdfium.PdfPage) -> str:
+    """
+    Bildet den Fingerabdruck einer Seite aus Format, Textebene und Seitenobjekten
+    
+    Eingebettete Bilder gehen mit ihren Rohdaten ein, übrige Objekte mit Typ und Position.
+    """
+    digest = hashlib.sha256(f"v{FINGERPRINT_VERSION}".encode("utf-8"))
+    width, height = page.get_size()
+    digest.update(f"{width:.2f}x{height:.2f}r{page.get_rotation()}".encode("utf-8"))
+    
+    textpage = page.get_textpage()
+    try:
+        digest.update(textpage.get_text_range().encode("utf-8", "surrogatepass"))
+    finally:
+        textpage.close()
+        
+    for obj in page.get_objects():
+        # get_pos() heißt ab pypdfium2 5 get_bounds()
+        get_bounds = getattr(obj, "get_bounds", None) or obj.get_pos
+        left, bottom, right, top = get_bounds()
+        digest.update(f"|{obj.type}:{left:.1f},{bottom:.1f},{right:.1f},{top:.1f}".encode("utf-8"))
+        if isinstance(obj, pdfium.PdfImage):
+            try:
+                digest.update(bytes(obj.get_data(decode_simple=False)))
+            except Exception:
+                # Nicht auslesbare Bilddaten: nur Position und Typ berücksichtigen
+                pass
+    return digest.hexdigest()
+
+def page_fingerprints(source: DocumentSource) -> List[str]:
+    """
+    Berechnet für jede Seite einen Fingerabdruck ihres Inhalts
+    
+    Seiten mit unverändertem Fingerabdruck liefern bei gleichem Konverter dasselbe
+    Markdown und müssen in einer neuen Revision des Dokuments nicht erneut konvertiert
+    werden. Das Lesen von Textebene und Objekten kostet nur einen Bruchteil einer
+    Konvertierung.
+    
+    Args:
+        source: Pfad zur PDF-Datei oder Dateiinhalt
+        
+    Returns:
+        List[str]: Hex-Digest je Seite in Seitenreihenfolge
+    """
+    fingerprints = []
+    pdf = _open_pdf(source)
+    try:
+        for page_idx in range(len(pdf)):
+            page = pdf[page_idx]
+            try:
+                fingerprints.append(_page_fingerprint(page))
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+    return fingerprints
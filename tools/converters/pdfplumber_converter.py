@@ -1,63 +1,216 @@
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
-import pandas as pd
-from pdfplumber.utils import extract_text, get_bbox_overlap, obj_to_bbox
-from tools.converters.base_converter import BaseConverter
+from pdfplumber.utils import extract_text
+from tools.converters.base_converter import BaseConverter, DocumentSource, MarkdownChunk, is_buffer, open_binary
 
 _log = logging.getLogger(__name__)
 
-class PDFPlumberConverter(BaseConverter):
-    """PDFPlumber Implementierung des Dokumentenkonverters für PDF Dateien"""
+Bbox = Tuple[float, float, float, float]
+
+class _TableIndex:
+    """Räumlicher Index der Tabellen einer Seite in horizontalen Bändern fester Höhe"""
     
-    def convert_to_markdown(self, file_path: str) -> Optional[str]:
+    def __init__(self, bboxes: List[Bbox], band_height: float = 24.0):
         """
-        Konvertiert eine PDF-Datei zu Markdown mit festen Einstellungen.
+        Args:
+            bboxes: Tabellenbereiche als (x0, top, x1, bottom)
+            band_height: Höhe eines Bandes in PDF-Punkten
         """
-        try:
-            # Feste Einstellungen für die Tabellenerkennung
-            table_settings = {
-                "vertical_strategy": "lines",
-                "horizontal_strategy": "lines",
-                "snap_tolerance": 3,
-                "join_tolerance": 3,
-                "min_words_vertical": 1,
-                "min_words_horizontal": 1
-            }
-            
-            all_text = []
-            
-            with pdfplumber.open(file_path) as pdf:
-                # Verarbeite alle Seiten
-                for page in pdf.pages:
-                    filtered_page = page
-                    chars = filtered_page.chars
+        self.bboxes = bboxes
+        self.band_height = band_height
+        self.bands: Dict[int, List[int]] = {}
+        for table_idx, (x0, top, x1, bottom) in enumerate(bboxes):
+            for band in range(int(top // band_height), int(bottom // band_height) + 1):
+                self.bands.setdefault(band, []).append(table_idx)
+    
+    def find(self, x0: float, top: float, x1: float, bottom: float) -> Optional[int]:
+        """
+        Sucht die erste Tabelle, die das Rechteck berührt oder überlappt
+        
+        Entspricht der Semantik von pdfplumber.utils.get_bbox_overlap(...) is not None.
+        
+        Returns:
+            Optional[int]: Index der Tabelle oder None für Fließtext
+        """
+        for band in range(int(top // self.band_height), int(bottom // self.band_height) + 1):
+            for table_idx in self.bands.get(band, ()):
+                t_x0, t_top, t_x1, t_bottom = self.bboxes[table_idx]
+                width = min(x1, t_x1) - max(x0, t_x0)
+                height = min(bottom, t_bottom) - max(top, t_top)
+                if width >= 0 and height >= 0 and width + height > 0:
+                    return table_idx
+        return None
 
-                    # Tabellen auf der Seite finden und extrahieren
-                    for table in page.find_tables(table_settings):
-                        # Erster Charakter in der Tabelle
-                        first_table_char = page.crop(table.bbox).chars[0]
-                        
-                        # Tabelle aus der Seite filtern, um Text zu erhalten
-                        filtered_page = filtered_page.filter(lambda obj: 
-                            get_bbox_overlap(obj_to_bbox(obj), table.bbox) is None
-                        )
-                        chars = filtered_page.chars
+def _table_to_markdown(rows: List[List[Optional[str]]]) -> str:
+    """
+    Schreibt eine extrahierte Tabelle als Markdown, die erste Zeile wird zur Kopfzeile
+    
+    Args:
+        rows: Zellinhalte je Zeile (None für leere Zellen)
+        
+    Returns:
+        str: Markdown-Tabelle
+    """
+    def cell(value: Optional[str]) -> str:
+        if value is None:
+            return ""
+        return " ".join(value.split()).replace("|", "\\|")
+    
+    width = max(len(row) for row in rows)
+    lines = []
+    for row_idx, row in enumerate(rows):
+        cells = [cell(value) for value in row] + [""] * (width - len(row))
+        lines.append("| " + " | ".join(cells) + " |")
+        if row_idx == 0:
+            lines.append("|" + "|".join(["---"] * width) + "|")
+    return "\n".join(lines)
 
-                        # Tabelle in Markdown konvertieren
-                        df = pd.DataFrame(table.extract())
-                        if not df.empty:
-                            df.columns = df.iloc[0]
-                            markdown = df.drop(0).to_markdown(index=False)
-                            # Tabelle dem Text hinzufügen
-                            chars.append(first_table_char | {"text": markdown})
+def _page_to_text(page, table_settings: Dict[str, Any]) -> str:
+    """
+    Extrahiert den Text einer Seite mit Layout und fügt erkannte Tabellen als Markdown ein
+    
+    Alle Zeichen werden in einem Durchlauf über einen räumlichen Index entweder einer
+    Tabelle oder dem Fließtext zugeordnet.
+    
+    Args:
+        page: pdfplumber-Seite
+        table_settings: Einstellungen für die Tabellenerkennung
+        
+    Returns:
+        str: Text der Seite
+    """
+    chars = page.chars
+    tables = page.find_tables(table_settings)
+    if not tables:
+        return extract_text(chars, layout=True)
+    
+    # Zeichen einmalig auf Tabellen und Fließtext verteilen
+    index = _TableIndex([table.bbox for table in tables])
+    body_chars = []
+    first_table_chars: List[Optional[Dict[str, Any]]] = [None] * len(tables)
+    for char in chars:
+        table_idx = index.find(char["x0"], char["top"], char["x1"], char["bottom"])
+        if table_idx is None:
+            body_chars.append(char)
+        elif first_table_chars[table_idx] is None:
+            first_table_chars[table_idx] = char
+    
+    # Tabellen als Markdown an der Position ihres ersten Zeichens einfügen
+    for table, first_table_char in zip(tables, first_table_chars):
+        rows = table.extract()
+        if rows and first_table_char is not None:
+            body_chars.append(first_table_char | {"text": _table_to_markdown(rows)})
+    
+    # Text extrahieren und Layout erhalten
+    return extract_text(body_chars, layout=True)
 
-                    # Text extrahieren und Layout erhalten
-                    page_text = extract_text(chars, layout=True)
-                    all_text.append(page_text)
+def _convert_pages(file_path: str, page_numbers: List[int], table_settings: Dict[str, Any]) -> List[str]:
+    """
+    Konvertiert ausgewählte Seiten einer PDF-Datei (Einstiegspunkt der Worker-Prozesse)
+    
+    Args:
+        file_path: Pfad zur PDF-Datei
+        page_numbers: Seitennummern (1-basiert)
+        table_settings: Einstellungen für die Tabellenerkennung
+        
+    Returns:
+        List[str]: Text je Seite in Reihenfolge von page_numbers
+    """
+    with pdfplumber.open(file_path, pages=page_numbers) as pdf:
+        return [_page_to_text(page, table_settings) for page in pdf.pages]
 
-            return "\n".join(all_text)
+class PDFPlumberConverter(BaseConverter):
+    """PDFPlumber Implementierung des Dokumentenkonverters für PDF Dateien"""
+    
+    page_separator = "\n"
+    pages_independent = True
+    
+    # Feste Einstellungen für die Tabellenerkennung
+    TABLE_SETTINGS = {
+        "vertical_strategy": "lines",
+        "horizontal_strategy": "lines",
+        "snap_tolerance": 3,
+        "join_tolerance": 3,
+        "min_words_vertical": 1,
+        "min_words_horizontal": 1
+    }
+    
+    def __init__(self, max_workers: Optional[int] = None, min_pages_for_parallel: int = 16):
+        """
+        Args:
+            max_workers: Anzahl der Worker-Prozesse (None = Anzahl der CPU-Kerne, 1 = seriell)
+            min_pages_for_parallel: Ab dieser Seitenzahl werden die Seiten parallel verarbeitet
+        """
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.min_pages_for_parallel = min_pages_for_parallel
+    
+    def get_options(self) -> Dict[str, Any]:
+        """Gibt die Einstellungen der Tabellenerkennung zurück"""
+        return {"table_settings": self.TABLE_SETTINGS}
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
+        """
+        Konvertiert eine PDF-Datei zu Markdown mit festen Einstellungen.
+        
+        Größere Dokumente werden in Seitenbereiche aufgeteilt, die parallel in einem
+        Prozesspool konvertiert und anschließend in Seitenreihenfolge zusammengesetzt werden.
+        """
+        try:
+            return self.page_separator.join(chunk.text for chunk in self.iter_markdown(source))
             
         except Exception as e:
             _log.error(f"Fehler bei der Konvertierung mit PDFPlumber: {str(e)}")
             return None
+    
+    def iter_markdown(self, source: DocumentSource, pages: Optional[Sequence[int]] = None) -> Iterator[MarkdownChunk]:
+        """
+        Liefert den Text seitenweise, bei größeren Dokumenten aus parallel konvertierten Seitenbereichen
+        
+        Dokumente im Speicher werden seriell konvertiert, damit der Inhalt nicht an jeden
+        Worker-Prozess kopiert werden muss.
+        """
+        with open_binary(source) as stream:
+            with pdfplumber.open(stream) as pdf:
+                page_numbers = list(pages) if pages is not None else list(range(1, len(pdf.pages) + 1))
+                invalid = [page_number for page_number in page_numbers if not 1 <= page_number <= len(pdf.pages)]
+                if invalid:
+                    raise ValueError(f"Ungültige Seitennummern {invalid}, das Dokument hat {len(pdf.pages)} Seiten")
+                
+                if is_buffer(source) or self.max_workers <= 1 or len(page_numbers) < self.min_pages_for_parallel:
+                    for page_number in page_numbers:
+                        page = pdf.pages[page_number - 1]
+                        yield MarkdownChunk(page_number=page_number, text=_page_to_text(page, self.TABLE_SETTINGS))
+                        # Geparste Seitenobjekte freigeben, um den Speicherbedarf zu begrenzen
+                        page.close()
+                    return
+        
+        yield from self._iter_parallel(source, page_numbers)
+    
+    def _iter_parallel(self, file_path: str, page_numbers: List[int]) -> Iterator[MarkdownChunk]:
+        """
+        Verteilt zusammenhängende Seitenbereiche auf einen Prozesspool
+        
+        Args:
+            file_path: Pfad zur PDF-Datei
+            page_numbers: Zu konvertierende Seitennummern (1-basiert)
+            
+        Returns:
+            Iterator[MarkdownChunk]: Text je Seite in Seitenreihenfolge
+        """
+        workers = min(self.max_workers, len(page_numbers))
+        # Mehrere Bereiche je Worker gleichen unterschiedlich aufwändige Seiten aus
+        chunk_size = max(1, -(-len(page_numbers) // (workers * 4)))
+        batches = [page_numbers[i:i + chunk_size] for i in range(0, len(page_numbers), chunk_size)]
+        
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(_convert_pages, file_path, batch, self.TABLE_SETTINGS) for batch in batches]
+            # Ergebnisse in Reihenfolge der Seitenbereiche ausgeben, sobald sie vorliegen
+            for batch, future in zip(batches, futures):
+                for page_number, text in zip(batch, future.result()):
+                    yield MarkdownChunk(page_number=page_number, text=text)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
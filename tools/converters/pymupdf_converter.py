@@ -1,13 +1,44 @@
-from typing import Optional
+from typing import Iterator, Optional, Sequence
+import pymupdf
 import pymupdf4llm
-from .base_converter import BaseConverter
+from .base_converter import BaseConverter, DocumentSource, MarkdownChunk, is_buffer
+
+def _open_document(source: DocumentSource) -> pymupdf.Document:
+    """Öffnet eine PDF aus einem Dateipfad oder direkt aus dem Speicher"""
+    if is_buffer(source):
+        # PyMuPDF akzeptiert keine memoryviews als Stream
+        data = source.tobytes() if isinstance(source, memoryview) else source
+        return pymupdf.open(stream=data, filetype="pdf")
+    return pymupdf.open(source)
 
 class PyMuPDFConverter(BaseConverter):
     """PyMuPDF4LLM Implementierung des Dokumentenkonverters"""
     
-    def convert_to_markdown(self, file_path: str) -> Optional[str]:
+    # to_markdown() hängt die Seiten ohne zusätzliches Trennzeichen aneinander
+    page_separator = ""
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
         try:
-            return pymupdf4llm.to_markdown(file_path)
+            doc = _open_document(source)
+            try:
+                return pymupdf4llm.to_markdown(doc)
+            finally:
+                doc.close()
         except Exception as e:
             print(f"Fehler bei der Konvertierung mit PyMuPDF4LLM: {e}")
             return None
+    
+    def iter_markdown(self, source: DocumentSource, pages: Optional[Sequence[int]] = None) -> Iterator[MarkdownChunk]:
+        """Konvertiert die Seiten einzeln, die Überschriftenerkennung erfolgt einmal für das ganze Dokument"""
+        doc = _open_document(source)
+        try:
+            hdr_info = pymupdf4llm.IdentifyHeaders(doc)
+            page_numbers = pages if pages is not None else range(1, doc.page_count + 1)
+            invalid = [page_number for page_number in page_numbers if not 1 <= page_number <= doc.page_count]
+            if invalid:
+                raise ValueError(f"Ungültige Seitennummern {invalid}, das Dokument hat {doc.page_count} Seiten")
+            for page_number in page_numbers:
+                text = pymupdf4llm.to_markdown(doc, pages=[page_number - 1], hdr_info=hdr_info)
+                yield MarkdownChunk(page_number=page_number, text=text)
+        finally:
+            doc.close()
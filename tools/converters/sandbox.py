@@ -0,0 +1,292 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from tools.converters.base_converter import BaseConverter, DocumentSource, load_converter_class, source_key, source_label
+
+_log = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+STATUS_MEMORY = "memory"
+STATUS_ERROR = "error"
+
+@dataclass
+class SandboxResult:
+    """Ergebnis einer Konvertierung in einem isolierten Worker-Prozess"""
+    converter_name: str
+    status: str
+    md_text: Optional[str] = None
+    duration: float = 0.0
+    peak_rss: int = 0  # Bytes samt Unterprozessen, 0 wenn nicht messbar
+    error: Optional[str] = None
+
+def _read_rss(pid: int) -> Optional[int]:
+    """
+    Liest den aktuellen Arbeitsspeicher (RSS) eines Prozesses in Bytes
+    
+    Nutzt /proc unter Linux und psutil, falls installiert, auf anderen Systemen.
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+def _own_peak_rss() -> int:
+    """
+    Liest den Spitzen-Arbeitsspeicher des eigenen Prozesses zuzüglich des größten beendeten
+    Unterprozesses in Bytes (0, wenn nicht messbar)
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss ist unter macOS in Bytes, sonst in Kilobytes angegeben
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _child_pids(pid: int) -> List[int]:
+    """Gibt die Prozess-IDs aller Nachfahren eines Prozesses zurück (z.B. Prozess-Pools der Konverter)"""
+    descendants = []
+    stack = [pid]
+    while stack:
+        parent = stack.pop()
+        children = []
+        try:
+            for task in os.listdir(f"/proc/{parent}/task"):
+                with open(f"/proc/{parent}/task/{task}/children", "r") as f:
+                    children.extend(int(child) for child in f.read().split())
+        except OSError:
+            try:
+                import psutil
+                return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+            except Exception:
+                return descendants
+        descendants.extend(children)
+        stack.extend(children)
+    return descendants
+
+def _read_tree_rss(pid: int) -> Optional[int]:
+    """Liest den Arbeitsspeicher (RSS) eines Prozesses und aller Nachfahren in Bytes"""
+    rss = _read_rss(pid)
+    if rss is None:
+        return None
+    for child in _child_pids(pid):
+        rss += _read_rss(child) or 0
+    return rss
+
+def _kill_tree(process: multiprocessing.Process) -> None:
+    """Beendet den Worker samt aller Prozesse seiner Prozessgruppe, damit keine Pool-Prozesse verwaist weiterlaufen"""
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    for child in _child_pids(process.pid):
+        try:
+            os.kill(child, signal.SIGKILL)
+        except OSError:
+            pass
+    process.kill()
+
+def _worker(conn, converter_path: str, source: DocumentSource, options: Dict[str, Any]) -> None:
+    """Einstiegspunkt des Worker-Prozesses: konvertiert die Datei und sendet das Ergebnis zurück"""
+    if hasattr(os, "setsid"):
+        # Eigene Prozessgruppe, damit Budgetüberschreitungen auch Pool-Prozesse des Konverters beenden
+        os.setsid()
+    try:
+        # Nur das Modul des gewählten Konverters importieren, damit z.B. docling nicht
+        # das Zeit- und Speicherbudget leichter Konverter belastet
+        converter = load_converter_class(converter_path)(**options)
+        md_text = converter.convert_to_markdown(source)
+        conn.send((STATUS_OK, md_text, _own_peak_rss()))
+    except BaseException as e:
+        conn.send((STATUS_ERROR, f"{type(e).__name__}: {e}", _own_peak_rss()))
+    finally:
+        conn.close()
+
+class SandboxedConverter(BaseConverter):
+    """Führt einen registrierten Konverter in einem eigenen Prozess mit Zeit- und Speicherbudget aus
+    
+    Da jeder Aufruf einen frischen Prozess startet, entfällt die Wiederverwendung bereits
+    geladener Modelle. Dafür kann ein hängender oder speicherhungriger Konverter den
+    Hauptprozess nicht blockieren.
+    """
+    
+    def __init__(self,
+                 converter_name: str,
+                 timeout: float = 300.0,
+                 max_rss_mb: Optional[int] = 4096,
+                 poll_interval: float = 0.2,
+                 options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            converter_name: Name des Konverters in der ConverterFactory
+            timeout: Maximale Laufzeit je Datei in Sekunden
+            max_rss_mb: Maximaler Arbeitsspeicher des Worker-Prozesses samt Unterprozessen in MB (None = unbegrenzt)
+            poll_interval: Abstand der Budgetprüfungen in Sekunden
+            options: Einstellungen für den Konstruktor des Konverters
+        """
+        self.converter_name = converter_name
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.poll_interval = poll_interval
+        self.options = options or {}
+    
+    def run(self, source: DocumentSource) -> SandboxResult:
+        """
+        Konvertiert eine Datei im Worker-Prozess und überwacht Laufzeit und Speicher
+        
+        Args:
+            source: Pfad zur Eingabedatei oder Dateiinhalt (wird an den Worker übertragen)
+            
+        Returns:
+            SandboxResult: Ergebnis inklusive Status, Laufzeit und Spitzen-RSS
+        """
+        if isinstance(source, memoryview):
+            # memoryviews lassen sich nicht an den Worker-Prozess übertragen
+            source = source.tobytes()
+        # Import hier, um zirkuläre Importe mit der ConverterFactory zu vermeiden
+        from tools.converters.converter_factory import ConverterFactory
+        converter_path = ConverterFactory.get_converter_path(self.converter_name)
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_worker,
+            args=(child_conn, converter_path, source, self.options),
+            # Kein Daemon-Prozess, damit Konverter eigene Prozess-Pools starten können;
+            # der Worker wird im finally-Block in jedem Fall beendet
+            daemon=False
+        )
+        
+        start = time.monotonic()
+        process.start()
+        child_conn.close()
+        
+        result = SandboxResult(converter_name=self.converter_name, status=STATUS_ERROR)
+        max_rss = self.max_rss_mb * 1024 * 1024 if self.max_rss_mb else None
+        try:
+            while True:
+                if parent_conn.poll(self.poll_interval):
+                    # Der Worker meldet seinen Spitzenwert selbst, auch bei Laufzeiten unter einem Prüfintervall
+                    result.status, payload, worker_peak_rss = parent_conn.recv()
+                    result.peak_rss = max(result.peak_rss, worker_peak_rss)
+                    if result.status == STATUS_OK:
+                        result.md_text = payload
+                    else:
+                        result.error = payload
+                    break
+                    
+                rss = _read_tree_rss(process.pid)
+                if rss:
+                    result.peak_rss = max(result.peak_rss, rss)
+                if max_rss and rss and rss > max_rss:
+                    result.status = STATUS_MEMORY
+                    result.error = f"Speicherbudget von {self.max_rss_mb} MB überschritten"
+                    break
+                if time.monotonic() - start > self.timeout:
+                    result.status = STATUS_TIMEOUT
+                    result.error = f"Zeitbudget von {self.timeout:.0f} s überschritten"
+                    break
+                if not process.is_alive() and not parent_conn.poll():
+                    result.error = f"Worker-Prozess unerwartet beendet (Exit-Code {process.exitcode})"
+                    break
+        except EOFError:
+            result.error = f"Worker-Prozess unerwartet beendet (Exit-Code {process.exitcode})"
+        finally:
+            result.duration = time.monotonic() - start
+            parent_conn.close()
+            if process.is_alive():
+                _kill_tree(process)
+            process.join(timeout=5)
+            
+        return result
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
+        result = self.run(source)
+        if result.status != STATUS_OK:
+            _log.error(f"Fehler bei der Konvertierung mit {self.converter_name}: {result.error}")
+        return result.md_text
+    
+    def get_options(self) -> Dict[str, Any]:
+        return {"converter": self.converter_name, **self.options}
+
+class FallbackConverter(BaseConverter):
+    """Probiert eine Kette von Konvertern in isolierten Worker-Prozessen nacheinander aus
+    
+    Überschreitet ein Konverter sein Zeit- oder Speicherbudget, schlägt fehl oder liefert
+    keinen Text, wird die Datei mit dem nächsten Konverter der Kette konvertiert.
+    """
+    
+    def __init__(self,
+                 chain: List[str],
+                 timeout: float = 300.0,
+                 max_rss_mb: Optional[int] = 4096,
+                 options: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Args:
+            chain: Namen der Konverter in der Reihenfolge, in der sie versucht werden
+            timeout: Maximale Laufzeit je Datei und Konverter in Sekunden
+            max_rss_mb: Maximaler Arbeitsspeicher je Worker-Prozess in MB
+            options: Optionale Konstruktor-Einstellungen je Konvertername
+        """
+        if not chain:
+            raise ValueError("Die Fallback-Kette muss mindestens einen Konverter enthalten")
+        self.chain = chain
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.options = options or {}
+        # Alle Versuche je konvertierter Datei
+        self.attempts: Dict[str, List[SandboxResult]] = {}
+    
+    def convert_to_markdown(self, source: DocumentSource) -> Optional[str]:
+        if isinstance(source, memoryview):
+            source = source.tobytes()
+        label = source_label(source)
+        attempts = self.attempts[source_key(source)] = []
+        for converter_name in self.chain:
+            result = SandboxedConverter(
+                converter_name,
+                timeout=self.timeout,
+                max_rss_mb=self.max_rss_mb,
+                options=self.options.get(converter_name)
+            ).run(source)
+            attempts.append(result)
+            
+            if result.status == STATUS_OK and result.md_text:
+                return result.md_text
+            _log.warning(
+                f"{converter_name} für {label} fehlgeschlagen ({result.status}: {result.error}), "
+                f"versuche nächsten Konverter"
+            )
+            
+        _log.error(f"Alle Konverter der Fallback-Kette für {label} fehlgeschlagen")
+        return None
+    
+    def get_conversion_info(self, source: DocumentSource) -> Dict[str, Any]:
+        """Gibt den erfolgreichen Konverter und die fehlgeschlagenen Versuche zurück"""
+        attempts = self.attempts.get(source_key(source), [])
+        succeeded = [a.converter_name for a in attempts if a.status == STATUS_OK and a.md_text]
+        return {
+            "converter": succeeded[0] if succeeded else None,
+            "failed_attempts": [
+                {"converter": a.converter_name, "status": a.status, "error": a.error}
+                for a in attempts if not (a.status == STATUS_OK and a.md_text)
+            ]
+        }
+    
+    def get_options(self) -> Dict[str, Any]:
+        return {"chain": self.chain, "options": self.options}
@@ -1,16 +1,136 @@
 import requests
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 import json
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tools.pipeline.tracing import current_span, span
+from .response_cache import ESCOResponseCache
+
+_log = logging.getLogger(__name__)
+
+# Verbindungsaufbau und Lesen je Anfrage in Sekunden
+DEFAULT_TIMEOUT = (5.0, 30.0)
+# Kompetenzen je Seite und maximale Seiten je Relation, wenn die Gesamtzahl unbekannt ist
+PAGE_SIZE = 100
+MAX_PAGES = 50
 
 class ESCOClient:
-    """Client für die ESCO API Integration"""
+    """Client für die ESCO API Integration
+    
+    Alle Anfragen laufen über eine Session mit Verbindungspool, Zeitlimits und
+    Wiederholungen bei Überlastung. Antworten werden optional in einem ESCOResponseCache
+    gespeichert und nach Ablauf per ETag bzw. Last-Modified revalidiert. Gleichzeitige
+    identische Anfragen werden zu einer einzigen zusammengefasst.
+    """
     
-    def __init__(self):
+    def __init__(self,
+                 cache: Optional[ESCOResponseCache] = None,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 pool_size: int = 8,
+                 max_retries: int = 2):
+        """
+        Args:
+            cache: Persistenter Cache für API-Antworten (None = ohne Cache)
+            timeout: Zeitlimits für Verbindungsaufbau und Lesen in Sekunden
+            pool_size: Maximale Anzahl offener Verbindungen und paralleler Seitenabfragen
+            max_retries: Wiederholungen bei Verbindungsfehlern und HTTP 429/5xx
+        """
         self.base_url = "https://ec.europa.eu/esco/api"
         self.headers = {
             "Accept": "application/json",
             "Content-Type": "application/json"
         }
+        self.cache = cache
+        self.timeout = timeout
+        
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        self._in_flight: Dict[str, Future] = {}
+        self._in_flight_lock = threading.Lock()
+        # Parallele Seitenabfragen, höchstens so viele wie Verbindungen im Pool
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="esco")
+    
+    def _fetch(self, url: str, params: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """Fragt eine Ressource ab und revalidiert dabei eine abgelaufene Antwort aus dem Cache"""
+        cached = self.cache.get(key) if self.cache else None
+        call_span = current_span()
+        if cached is not None and cached.fresh:
+            if call_span:
+                call_span.set(cache="hit")
+            return cached.data
+            
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+                
+        response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            self.cache.refresh(key)
+            if call_span:
+                call_span.set(cache="revalidated")
+            return cached.data
+        response.raise_for_status()
+        data = response.json()
+        if self.cache:
+            self.cache.set(key, data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        if call_span:
+            call_span.set(cache="miss")
+        return data
+    
+    def _get_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gibt die JSON-Antwort einer Ressource zurück, aus dem Cache oder von der API
+        
+        Läuft für dieselbe URL mit denselben Parametern bereits eine Anfrage, wird auf
+        deren Ergebnis gewartet, statt eine zweite zu senden.
+        
+        Args:
+            url: URL der Ressource
+            params: Abfrageparameter
+            
+        Returns:
+            Dict[str, Any]: Antwort der API
+            
+        Raises:
+            requests.RequestException: Bei Verbindungs- und HTTP-Fehlern
+        """
+        key = ESCOResponseCache.make_key(url, params)
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                
+        if not leader:
+            return future.result()
+            
+        try:
+            future.set_result(self._fetch(url, params, key))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+        return future.result()
     
     def get_occupation(self, berufsbild_name: str) -> Optional[Dict[str, Any]]:
         """
@@ -33,14 +153,13 @@ class ESCOClient:
                 'limit': 3  # Hole die Top 3 Treffer
             }
             
-            response = requests.get(search_url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            with span("esco.search", kind="esco", text=berufsbild_name):
+                data = self._get_json(search_url, params)
+                
             if not data.get('_embedded', {}).get('results', []):
                 print(f"Kein passender Beruf gefunden für: {berufsbild_name}")
                 return None
-            
+                
             # Nimm den ersten Treffer
             occupation = data['_embedded']['results'][0]
             return {
@@ -53,10 +172,46 @@ class ESCOClient:
             print(f"Fehler bei der ESCO-Berufssuche: {e}")
             return None
     
+    def _related_page(self, occupation_uri: str, relation: str, offset: int) -> Dict[str, Any]:
+        """Fragt eine Seite der Kompetenzen eines Berufs mit der angegebenen Relation ab"""
+        params = {
+            'uri': occupation_uri,
+            'relation': relation,
+            'language': 'de',
+            'full': 'true',
+            'limit': PAGE_SIZE,
+            'offset': offset
+        }
+        with span("esco.related", kind="esco", relation=relation, offset=offset):
+            return self._get_json(f"{self.base_url}/resource/related", params)
+    
+    def _submit(self, fn: Callable[..., Any], *args) -> Future:
+        """Führt eine Funktion im Thread-Pool aus, Spans werden dem aktuellen Schritt zugeordnet"""
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+    
+    @staticmethod
+    def _remaining_offsets(data: Dict[str, Any], relation: str) -> List[int]:
+        """Offsets der weiteren Seiten laut Gesamtzahl der ersten Seite (leer, wenn unbekannt)"""
+        total = data.get('total')
+        received = len(data.get('_embedded', {}).get(relation, []))
+        if not isinstance(total, int) or received == 0:
+            return []
+        return list(range(received, total, received))
+    
+    @staticmethod
+    def _has_next(data: Dict[str, Any], relation: str) -> bool:
+        """Prüft, ob auf eine Seite ohne Gesamtzahl weitere Seiten folgen"""
+        received = len(data.get('_embedded', {}).get(relation, []))
+        return received > 0 and ('next' in data.get('_links', {}) or received >= PAGE_SIZE)
+    
     def get_skills(self, occupation_uri: str) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
         """
         Holt die wesentlichen und optionalen Kompetenzen für einen Beruf
         
+        Beide Relationen werden gleichzeitig abgefragt. Nennt die erste Seite die Gesamtzahl,
+        werden alle weiteren Seiten parallel geladen, sonst wird den Seiten nacheinander
+        gefolgt, bis keine weitere mehr gemeldet wird.
+        
         Args:
             occupation_uri: URI des Berufs
             
@@ -64,40 +219,67 @@ class ESCOClient:
             Tuple[List[Dict[str, str]], List[Dict[str, str]]]: (Wesentliche Kompetenzen, Optionale Kompetenzen)
         """
         try:
-            essential_skills = []
-            optional_skills = []
+            relations = ['hasEssentialSkill', 'hasOptionalSkill']
+            first_pages = [self._submit(self._related_page, occupation_uri, relation, 0) for relation in relations]
+            pages: Dict[str, List[Dict[str, Any]]] = {
+                relation: [future.result()] for relation, future in zip(relations, first_pages)
+            }
             
-            # Hole die Kompetenzen für beide Typen
-            for skill_type in ['hasEssentialSkill', 'hasOptionalSkill']:
-                skills_url = f"{self.base_url}/resource/related"
-                params = {
-                    'uri': occupation_uri,
-                    'relation': skill_type,
-                    'language': 'de',
-                    'full': 'true',
-                    'limit': 100  # Maximale Anzahl von Kompetenzen
-                }
-                
-                response = requests.get(skills_url, params=params)
-                response.raise_for_status()
-                
-                data = response.json()
-                skills = data.get('_embedded', {}).get(skill_type, [])
+            # Weitere Seiten beider Relationen gemeinsam parallel laden
+            more_pages = [
+                (relation, self._submit(self._related_page, occupation_uri, relation, offset))
+                for relation in relations for offset in self._remaining_offsets(pages[relation][0], relation)
+            ]
+            for relation, future in more_pages:
+                pages[relation].append(future.result())
                 
-                for skill in skills:
-                    skill_info = {
-                        "name": skill['preferredLabel'].get('de', skill['preferredLabel'].get('en', '')),
-                        "description": skill.get('description', {}).get('de', skill.get('description', {}).get('en', '')),
-                        "uri": skill['uri']
-                    }
+            # Ohne Gesamtzahl den Seiten nacheinander folgen
+            for relation in relations:
+                if isinstance(pages[relation][0].get('total'), int):
+                    continue
+                offset = 0
+                while self._has_next(pages[relation][-1], relation):
+                    if len(pages[relation]) >= MAX_PAGES:
+                        _log.warning(f"Kompetenzen von {occupation_uri} ({relation}) nach {MAX_PAGES} Seiten abgeschnitten")
+                        break
+                    offset += len(pages[relation][-1]['_embedded'][relation])
+                    pages[relation].append(self._related_page(occupation_uri, relation, offset))
                     
-                    if skill_type == 'hasEssentialSkill':
-                        essential_skills.append(skill_info)
-                    else:
-                        optional_skills.append(skill_info)
-            
+            essential_skills, optional_skills = [], []
+            for relation, target in zip(relations, (essential_skills, optional_skills)):
+                seen = set()
+                for page in pages[relation]:
+                    for skill in page.get('_embedded', {}).get(relation, []):
+                        if skill['uri'] in seen:
+                            continue
+                        seen.add(skill['uri'])
+                        target.append({
+                            "name": skill['preferredLabel'].get('de', skill['preferredLabel'].get('en', '')),
+                            "description": skill.get('description', {}).get('de', skill.get('description', {}).get('en', '')),
+                            "uri": skill['uri']
+                        })
+                        
             return essential_skills, optional_skills
             
         except Exception as e:
             print(f"Fehler beim Abrufen der ESCO-Kompetenzen: {e}")
             return [], []
+    
+    def get_skills_bulk(self,
+                        occupation_uris: List[str],
+                        max_concurrency: int = 4) -> Dict[str, Tuple[List[Dict[str, str]], List[Dict[str, str]]]]:
+        """
+        Holt die Kompetenzen mehrerer Berufe
+        
+        Args:
+            occupation_uris: URIs der Berufe (Duplikate werden nur einmal abgefragt)
+            max_concurrency: Anzahl gleichzeitig bearbeiteter Berufe
+            
+        Returns:
+            Dict[str, Tuple[List[Dict[str, str]], List[Dict[str, str]]]]: (Wesentliche, Optionale Kompetenzen) je URI
+        """
+        unique_uris = list(dict.fromkeys(occupation_uris))
+        # Eigener Pool für die Berufe, damit deren Seitenabfragen im Pool des Clients nicht blockieren
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self.get_skills, uri) for uri in unique_uris]
+            return {uri: future.result() for uri, future in zip(unique_uris, futures)}
@@ -0,0 +1,364 @@
+import argparse
+import csv
+import difflib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from tools.pipeline.tracing import span
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "./cache/esco_index.sqlite"
+LANGUAGES = ("de", "en")
+# Kandidaten aus der Volltextsuche, die anschließend nach Ähnlichkeit sortiert werden
+SEARCH_CANDIDATES = 200
+# Mindestähnlichkeit eines Treffers zum Suchtext (0.0 - 1.0), bei Treffern nur über
+# gemeinsame Trigramme (abweichende Schreibweise) gilt die strengere Schwelle
+MIN_SIMILARITY = 0.3
+MIN_FUZZY_SIMILARITY = 0.6
+
+SCHEMA = """
+CREATE TABLE concepts (
+    uri TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    label_de TEXT,
+    label_en TEXT,
+    description_de TEXT,
+    description_en TEXT
+);
+CREATE TABLE relations (
+    occupation_uri TEXT NOT NULL,
+    skill_uri TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    PRIMARY KEY (occupation_uri, skill_uri)
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE labels USING fts5(
+    label,
+    uri UNINDEXED,
+    kind UNINDEXED,
+    language UNINDEXED,
+    label_type UNINDEXED,
+    tokenize = 'trigram'
+);
+"""
+
+
+def find_dump_file(dump_dirs: Sequence[str], stem: str, language: str) -> Optional[str]:
+    """
+    Sucht eine CSV-Datei des ESCO-Downloads, z.B. occupations_de.csv
+    
+    Args:
+        dump_dirs: Ordner mit den entpackten ESCO-Downloads (werden rekursiv durchsucht)
+        stem: Dateiname ohne Sprachkürzel, z.B. "occupations" oder "occupationSkillRelations"
+        language: Sprachkürzel, z.B. "de"
+        
+    Returns:
+        Optional[str]: Pfad der Datei oder None, wenn sie nicht gefunden wurde
+    """
+    target = f"{stem}_{language}.csv".lower()
+    for dump_dir in dump_dirs:
+        for root, dirs, files in os.walk(dump_dir):
+            for file in files:
+                if file.lower() == target:
+                    return os.path.join(root, file)
+    return None
+
+def _read_csv(path: str) -> Iterator[Dict[str, str]]:
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+def _split_labels(value: Optional[str]) -> List[str]:
+    """Alternative und versteckte Bezeichnungen stehen zeilenweise in einer Zelle"""
+    return [label.strip() for label in (value or "").split("\n") if label.strip()]
+
+def _similarity(text: str, label: str) -> float:
+    """Ähnlichkeit zur ganzen Bezeichnung oder einer ihrer Formen, z.B. Kaufmann/Kauffrau"""
+    text = text.lower()
+    return max(difflib.SequenceMatcher(None, text, part.strip()).ratio()
+               for part in [label.lower()] + label.lower().split("/"))
+
+
+def build_index(dump_dirs: Sequence[str], index_path: str = DEFAULT_INDEX_PATH,
+                languages: Sequence[str] = LANGUAGES) -> Dict[str, int]:
+    """
+    Baut den Offline-Index aus den CSV-Dateien des ESCO-Downloads
+    
+    Erwartet je Sprache occupations_<sprache>.csv und skills_<sprache>.csv sowie einmal
+    occupationSkillRelations_<sprache>.csv, wie sie der ESCO-Download im CSV-Format
+    enthält. Der Index wird in eine temporäre Datei geschrieben und erst nach
+    erfolgreichem Aufbau an die Stelle des bisherigen Index gesetzt.
+    
+    Args:
+        dump_dirs: Ordner mit den entpackten ESCO-Downloads
+        index_path: Pfad der SQLite-Datei des Index
+        languages: Sprachen, deren Bezeichnungen übernommen werden
+        
+    Returns:
+        Dict[str, int]: Anzahl der Berufe, Kompetenzen, Bezeichnungen und Relationen
+        
+    Raises:
+        FileNotFoundError: Wenn für keine Sprache Berufe bzw. keine Relationen gefunden wurden
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+        
+    counts = {"occupations": 0, "skills": 0, "labels": 0, "relations": 0}
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        found_languages = []
+        for language in languages:
+            for stem, kind in (("occupations", "occupation"), ("skills", "skill")):
+                path = find_dump_file(dump_dirs, stem, language)
+                if path is None:
+                    _log.warning(f"{stem}_{language}.csv nicht im ESCO-Download gefunden")
+                    continue
+                if kind == "occupation":
+                    found_languages.append(language)
+                _log.info(f"Lese {path}")
+                for row in _read_csv(path):
+                    uri = row.get("conceptUri")
+                    label = (row.get("preferredLabel") or "").strip()
+                    if not uri or not label:
+                        continue
+                    conn.execute("INSERT OR IGNORE INTO concepts (uri, kind) VALUES (?, ?)", (uri, kind))
+                    conn.execute(
+                        f"UPDATE concepts SET label_{language} = ?, description_{language} = ? WHERE uri = ?",
+                        (label, (row.get("description") or "").strip(), uri)
+                    )
+                    labels = [(label, "preferred")]
+                    labels += [(alt, "alt") for alt in _split_labels(row.get("altLabels"))]
+                    labels += [(hidden, "hidden") for hidden in _split_labels(row.get("hiddenLabels"))]
+                    conn.executemany(
+                        "INSERT INTO labels (label, uri, kind, language, label_type) VALUES (?, ?, ?, ?, ?)",
+                        [(text, uri, kind, language, label_type) for text, label_type in labels]
+                    )
+                    counts["labels"] += len(labels)
+        if not found_languages:
+            raise FileNotFoundError(f"Keine occupations_<sprache>.csv in {', '.join(dump_dirs)} gefunden")
+            
+        # Die Relationen sind in allen Sprachfassungen gleich und werden einmal gelesen
+        relations_path = next((path for path in (find_dump_file(dump_dirs, "occupationSkillRelations", language)
+                                                 for language in languages) if path), None)
+        if relations_path is None:
+            raise FileNotFoundError(f"Keine occupationSkillRelations_<sprache>.csv in {', '.join(dump_dirs)} gefunden")
+        conn.executemany(
+            "INSERT OR REPLACE INTO relations (occupation_uri, skill_uri, relation) VALUES (?, ?, ?)",
+            ((row["occupationUri"], row["skillUri"], row["relationType"].strip().lower())
+             for row in _read_csv(relations_path) if row.get("occupationUri") and row.get("skillUri"))
+        )
+        conn.execute("CREATE INDEX relations_occupation ON relations (occupation_uri, relation)")
+        
+        counts["occupations"] = conn.execute("SELECT COUNT(*) FROM concepts WHERE kind = 'occupation'").fetchone()[0]
+        counts["skills"] = conn.execute("SELECT COUNT(*) FROM concepts WHERE kind = 'skill'").fetchone()[0]
+        counts["relations"] = conn.execute("SELECT COUNT(*) FROM relations").fetchone()[0]
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ("built_at", time.strftime("%Y-%m-%d %H:%M:%S")),
+            ("languages", ",".join(found_languages)),
+            ("relations_file", os.path.basename(relations_path)),
+            *((key, str(value)) for key, value in counts.items())
+        ])
+        conn.execute("INSERT INTO labels (labels) VALUES ('optimize')")
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    
+    os.replace(tmp_path, index_path)
+    _log.info(f"ESCO-Index {index_path} erstellt: {counts}")
+    return counts
+
+
+class ESCOIndex:
+    """Lesezugriff auf den Offline-Index mit Volltextsuche über alle Bezeichnungen
+    
+    Die Bezeichnungen (bevorzugt, alternativ und versteckt) liegen in einer FTS5-Tabelle
+    mit Trigramm-Tokenizer, so dass auch Teile zusammengesetzter Wörter gefunden werden,
+    z.B. "Kaufmann" in "Automobilkaufmann". Die Treffer werden nach Ähnlichkeit der
+    Bezeichnung zum Suchtext sortiert.
+    """
+    
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            index_path: Pfad der SQLite-Datei des Index
+            
+        Raises:
+            FileNotFoundError: Wenn der Index noch nicht erstellt wurde
+        """
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"ESCO-Index {index_path} nicht gefunden, bitte zuerst aus dem ESCO-Download erstellen")
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{os.path.abspath(index_path)}?mode=ro", uri=True, check_same_thread=False)
+    
+    def info(self) -> Dict[str, str]:
+        """Gibt Erstellungszeitpunkt, Sprachen und Umfang des Index zurück"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+    
+    def _candidates(self, query: str, kind: str) -> List[Tuple[str, str, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT uri, label, label_type FROM labels WHERE labels MATCH ? AND kind = ? "
+                "ORDER BY bm25(labels) LIMIT ?",
+                (query, kind, SEARCH_CANDIDATES)
+            ).fetchall()
+    
+    def search(self, text: str, kind: str = "occupation", limit: int = 3) -> List[Tuple[str, float]]:
+        """
+        Sucht Konzepte über ihre Bezeichnungen in allen Sprachen
+        
+        Zuerst werden Bezeichnungen gesucht, die die Wörter des Suchtexts enthalten; gibt
+        es keine, werden Bezeichnungen mit gemeinsamen Trigrammen gesucht, so dass auch
+        abweichende Schreibweisen gefunden werden.
+        
+        Args:
+            text: Suchtext, z.B. der Name eines Berufsbildes
+            kind: "occupation" oder "skill"
+            limit: Maximale Anzahl der Treffer
+            
+        Returns:
+            List[Tuple[str, float]]: URI und Ähnlichkeit (0.0 - 1.0) der besten Treffer
+        """
+        words = [word for word in re.findall(r"\w+", text.lower()) if len(word) >= 3]
+        long_words = [word for word in words if len(word) >= 4] or words
+        if not long_words:
+            return []
+        rows = self._candidates(" OR ".join(f'"{word}"' for word in long_words), kind)
+        min_similarity = MIN_SIMILARITY
+        if not rows:
+            trigrams = {word[i:i + 3] for word in long_words for i in range(len(word) - 2)}
+            rows = self._candidates(" OR ".join(f'"{trigram}"' for trigram in sorted(trigrams)), kind)
+            min_similarity = MIN_FUZZY_SIMILARITY
+            
+        scores: Dict[str, float] = {}
+        for uri, label, label_type in rows:
+            # Bevorzugte Bezeichnungen gewinnen bei gleicher Ähnlichkeit
+            score = _similarity(text, label) + (0.01 if label_type == "preferred" else 0.0)
+            if score > scores.get(uri, 0.0):
+                scores[uri] = score
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(uri, min(score, 1.0)) for uri, score in ranked[:limit] if score >= min_similarity]
+    
+    def get_concept(self, uri: str, language: str = "de") -> Optional[Dict[str, str]]:
+        """Gibt Bezeichnung und Beschreibung eines Konzepts, ersatzweise auf Englisch, zurück"""
+        other = "en" if language == "de" else "de"
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT uri, kind, COALESCE(NULLIF(label_{language}, ''), label_{other}, ''), "
+                f"COALESCE(NULLIF(description_{language}, ''), description_{other}, '') FROM concepts WHERE uri = ?",
+                (uri,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"uri": row[0], "kind": row[1], "label": row[2], "description": row[3]}
+    
+    def get_related_skills(self, occupation_uri: str, relation: str, language: str = "de") -> List[Dict[str, str]]:
+        """
+        Gibt die Kompetenzen eines Berufs mit der angegebenen Relation zurück
+        
+        Args:
+            occupation_uri: URI des Berufs
+            relation: "essential" oder "optional"
+            language: Bevorzugte Sprache der Bezeichnungen
+            
+        Returns:
+            List[Dict[str, str]]: Kompetenzen mit uri, label und description
+        """
+        with self._lock:
+            uris = [row[0] for row in self._conn.execute(
+                "SELECT skill_uri FROM relations WHERE occupation_uri = ? AND relation = ? ORDER BY skill_uri",
+                (occupation_uri, relation)
+            )]
+        concepts = (self.get_concept(uri, language) for uri in uris)
+        return [concept for concept in concepts if concept is not None]
+
+
+class OfflineESCOClient:
+    """ESCO-Client auf Basis des lokalen Index mit derselben Schnittstelle wie ESCOClient
+    
+    Beantwortet Berufssuche und Kompetenzabfrage ohne Netzwerkzugriff.
+    """
+    
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, language: str = "de"):
+        """
+        Args:
+            index_path: Pfad der SQLite-Datei des Index
+            language: Bevorzugte Sprache der Bezeichnungen und Beschreibungen
+        """
+        self.index = ESCOIndex(index_path)
+        self.language = language
+    
+    def get_occupation(self, berufsbild_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Sucht nach einem Beruf im Offline-Index basierend auf dem Berufsbildnamen
+        
+        Args:
+            berufsbild_name: Name des Berufsbildes
+            
+        Returns:
+            Optional[Dict[str, Any]]: Gefundener Beruf oder None
+        """
+        with span("esco.search", kind="esco", text=berufsbild_name, backend="offline"):
+            hits = self.index.search(berufsbild_name, "occupation", limit=1)
+        if not hits:
+            _log.info(f"Kein passender Beruf gefunden für: {berufsbild_name}")
+            return None
+        occupation = self.index.get_concept(hits[0][0], self.language)
+        return {
+            "uri": occupation["uri"],
+            "title": occupation["label"],
+            "description": occupation["description"]
+        }
+    
+    def get_skills(self, occupation_uri: str) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        """
+        Holt die wesentlichen und optionalen Kompetenzen für einen Beruf aus dem Offline-Index
+        
+        Args:
+            occupation_uri: URI des Berufs
+            
+        Returns:
+            Tuple[List[Dict[str, str]], List[Dict[str, str]]]: (Wesentliche Kompetenzen, Optionale Kompetenzen)
+        """
+        with span("esco.related", kind="esco", uri=occupation_uri, backend="offline"):
+            essential, optional = (
+                [{"name": skill["label"], "description": skill["description"], "uri": skill["uri"]}
+                 for skill in self.index.get_related_skills(occupation_uri, relation, self.language)]
+                for relation in ("essential", "optional")
+            )
+        return essential, optional
+    
+    def get_skills_bulk(self,
+                        occupation_uris: List[str],
+                        max_concurrency: int = 4) -> Dict[str, Tuple[List[Dict[str, str]], List[Dict[str, str]]]]:
+        """Holt die Kompetenzen mehrerer Berufe (lokal ohne Nebenläufigkeit, max_concurrency wird ignoriert)"""
+        return {uri: self.get_skills(uri) for uri in dict.fromkeys(occupation_uris)}
+
+
+def main() -> None:
+    """Baut den Offline-Index: python -m tools.esco.offline_index <ESCO-Download-Ordner> ..."""
+    parser = argparse.ArgumentParser(description="Baut den ESCO-Offline-Index aus dem CSV-Download")
+    parser.add_argument("dump_dirs", nargs="+", help="Ordner mit den entpackten ESCO-CSV-Dateien (de und en)")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Pfad der SQLite-Datei des Index")
+    parser.add_argument("--languages", default=",".join(LANGUAGES), help="Sprachen, z.B. de,en")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    counts = build_index(args.dump_dirs, args.index, [language.strip() for language in args.languages.split(",")])
+    print(f"ESCO-Index {args.index}: {counts['occupations']} Berufe, {counts['skills']} Kompetenzen, "
+          f"{counts['labels']} Bezeichnungen, {counts['relations']} Relationen")
+
+if __name__ == "__main__":
+    main()
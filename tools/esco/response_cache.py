@@ -0,0 +1,74 @@
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from tools.cache.disk_cache import CacheStats, DiskCache
+
+
+@dataclass
+class CachedResponse:
+    """Gespeicherte Antwort der ESCO-API mit Validatoren für bedingte Anfragen"""
+    data: Dict[str, Any]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+class ESCOResponseCache:
+    """Persistenter HTTP-Cache für Antworten der ESCO-API
+    
+    Antworten gelten für ttl Sekunden als frisch und werden ohne Anfrage beantwortet.
+    Danach bleiben sie gespeichert und werden mit If-None-Match bzw. If-Modified-Since
+    revalidiert; antwortet die API mit 304, wird die gespeicherte Antwort weiterverwendet.
+    Die Lebensdauer wird deshalb hier und nicht über die TTL des DiskCache geprüft, der
+    abgelaufene Einträge sonst verwerfen würde.
+    """
+    
+    def __init__(self,
+                 cache_path: str = "./cache/esco_responses.sqlite",
+                 max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 7 * 24 * 3600):
+        """
+        Args:
+            cache_path: Pfad zur SQLite-Datei des Caches
+            max_bytes: Maximale Größe aller gespeicherten Antworten in Bytes
+            ttl: Sekunden, die eine Antwort ohne Revalidierung verwendet wird
+        """
+        self.ttl = ttl
+        self._cache = DiskCache(cache_path, max_bytes=max_bytes)
+    
+    @staticmethod
+    def make_key(url: str, params: Dict[str, Any]) -> str:
+        """Bildet den Cache-Schlüssel aus URL und Abfrageparametern"""
+        payload = json.dumps({"url": url, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Liest eine gespeicherte Antwort, auch wenn sie revalidiert werden muss"""
+        entry = self._cache.get_entry(key)
+        if entry is None:
+            return None
+        return CachedResponse(
+            data=json.loads(entry.value.decode("utf-8")),
+            etag=entry.meta.get("etag"),
+            last_modified=entry.meta.get("last_modified"),
+            fresh=time.time() - entry.created_at <= self.ttl
+        )
+    
+    def set(self, key: str, data: Dict[str, Any], etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Speichert eine Antwort mit ihren Validatoren"""
+        self._cache.set(key, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                        meta={"etag": etag, "last_modified": last_modified})
+    
+    def refresh(self, key: str) -> None:
+        """Markiert eine Antwort nach erfolgreicher Revalidierung (304) wieder als frisch"""
+        self._cache.touch(key)
+    
+    def stats(self) -> CacheStats:
+        """Gibt die Trefferstatistik des Caches zurück"""
+        return self._cache.stats()
+    
+    def clear(self) -> None:
+        """Leert den Cache"""
+        self._cache.clear()
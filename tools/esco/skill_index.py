@@ -0,0 +1,279 @@
+import hashlib
+import io
+import json
+import logging
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from tools.cache.disk_cache import CacheStats, DiskCache
+
+_log = logging.getLogger(__name__)
+
+# Erhöhen, wenn sich Merkmale oder Gewichtung des Index ändern
+INDEX_VERSION = 2
+# Zeichen-N-Gramme innerhalb von Wörtern, damit Teile zusammengesetzter Wörter übereinstimmen
+NGRAM_SIZES = (3, 4, 5)
+# Gewicht der Merkmale aus der Bezeichnung gegenüber der Beschreibung
+LABEL_WEIGHT = 2.0
+# Füllwörter ohne Aussage über die Kompetenz, werden ignoriert
+STOP_WORDS = frozenset("""
+    ab als am an auf aus bei bis das dem den der des die durch ein eine einem einen einer eines
+    für gegen im in ins mit nach oder sich sowie über um und unter vom von vor zu zum zur
+""".split())
+# Häufige Tätigkeitsverben, die in vielen Lernzielen und Kompetenzen vorkommen; ihre Merkmale
+# werden abgeschwächt, damit der Gegenstand ("Kundenberatung", "Buchhaltung") die Ähnlichkeit bestimmt
+ACTION_VERBS = frozenset("""
+    analysieren anwenden auswählen auswerten beachten bearbeiten beherrschen beraten berücksichtigen
+    beschreiben beurteilen bewerten darstellen dokumentieren durchführen durchzuführen einhalten
+    einrichten einsetzen entwickeln erfassen erkennen erläutern erstellen führen gestalten handhaben
+    kennen kontrollieren koordinieren nutzen organisieren planen prüfen sicherstellen umsetzen
+    unterstützen verwenden vorbereiten überprüfen überwachen
+""".split())
+ACTION_VERB_WEIGHT = 0.2
+# Zuordnung ohne LLM: Mindestähnlichkeit, Anteil an der besten Ähnlichkeit je Lernziel und Höchstzahl
+MIN_MATCH_SIMILARITY = 0.35
+RELATIVE_CUTOFF = 0.7
+MAX_MATCHES = 3
+
+
+def skill_text(value: Any) -> str:
+    """Liefert den Text eines Feldes der ESCO-API, das auch als {"literal": ...} vorliegen kann"""
+    if isinstance(value, dict):
+        return str(value.get("literal", ""))
+    return str(value or "")
+
+def _features(text: str) -> Counter:
+    """Zerlegt einen Text in Wörter und Zeichen-N-Gramme, ohne Füllwörter und mit abgeschwächten Tätigkeitsverben"""
+    features: Counter = Counter()
+    for word in re.findall(r"\w+", text.lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        weight = ACTION_VERB_WEIGHT if word in ACTION_VERBS else 1.0
+        features[f"w:{word}"] += weight
+        padded = f"<{word}>"
+        for size in NGRAM_SIZES:
+            for i in range(len(padded) - size + 1):
+                features[padded[i:i + size]] += weight
+    return features
+
+
+class SkillIndex:
+    """TF-IDF-Index über Bezeichnungen und Beschreibungen der ESCO-Kompetenzen eines Berufs
+    
+    Die Kompetenzen werden als L2-normierte Zeilen einer Matrix gespeichert, so dass
+    sich die Kosinus-Ähnlichkeit aller Lernziele zu allen Kompetenzen mit einem
+    Matrixprodukt berechnen lässt. Merkmale sind Wörter und Zeichen-N-Gramme, wodurch
+    auch Flexionen und Teile zusammengesetzter Wörter ("Kundenberatung" / "Kunden
+    beraten") übereinstimmen. Füllwörter entfallen, häufige Tätigkeitsverben wie
+    "durchführen" zählen nur mit ACTION_VERB_WEIGHT.
+    """
+    
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, matrix: np.ndarray):
+        """
+        Args:
+            vocabulary: Spalte je Merkmal
+            idf: Inverse Dokumenthäufigkeit je Merkmal
+            matrix: L2-normierte TF-IDF-Vektoren der Kompetenzen (Kompetenzen x Merkmale)
+        """
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix
+    
+    @classmethod
+    def build(cls, skills: Sequence[Dict[str, Any]]) -> "SkillIndex":
+        """
+        Erstellt den Index
+        
+        Args:
+            skills: Kompetenzen mit "label" und optional "description"
+            
+        Returns:
+            SkillIndex: Index mit einer Zeile je Kompetenz in der übergebenen Reihenfolge
+        """
+        documents = []
+        for skill in skills:
+            features = _features(skill_text(skill.get("description")))
+            for feature, count in _features(skill_text(skill.get("label"))).items():
+                features[feature] += LABEL_WEIGHT * count
+            documents.append(features)
+            
+        vocabulary: Dict[str, int] = {}
+        for features in documents:
+            for feature in features:
+                vocabulary.setdefault(feature, len(vocabulary))
+                
+        counts = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for row, features in enumerate(documents):
+            for feature, count in features.items():
+                counts[row, vocabulary[feature]] = count
+                
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return cls(vocabulary, idf, cls._normalize(np.log1p(counts) * idf))
+    
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+    
+    def vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        """Bildet L2-normierte TF-IDF-Vektoren für Texte; Merkmale außerhalb des Index entfallen"""
+        counts = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in _features(text).items():
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    counts[row, column] = count
+        return self._normalize(np.log1p(counts) * self.idf)
+    
+    def similarities(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Berechnet die Kosinus-Ähnlichkeit von Texten zu allen Kompetenzen
+        
+        Returns:
+            np.ndarray: Matrix Texte x Kompetenzen mit Werten zwischen 0 und 1
+        """
+        if not len(texts) or not len(self.matrix):
+            return np.zeros((len(texts), len(self.matrix)), dtype=np.float32)
+        return self.vectorize(texts) @ self.matrix.T
+    
+    def shortlist(self, texts: Sequence[str], k: int) -> List[List[int]]:
+        """
+        Gibt je Text die Indizes der k ähnlichsten Kompetenzen zurück
+        
+        Args:
+            texts: Texte, z.B. Lernziele
+            k: Anzahl der Kandidaten je Text
+            
+        Returns:
+            List[List[int]]: Kompetenzindizes je Text, absteigend nach Ähnlichkeit
+        """
+        return self._top_k(self.similarities(texts), k)
+    
+    def match(self,
+              texts: Sequence[str],
+              min_similarity: float = MIN_MATCH_SIMILARITY,
+              max_matches: int = MAX_MATCHES,
+              relative_cutoff: float = RELATIVE_CUTOFF) -> List[List[Tuple[int, float]]]:
+        """
+        Ordnet Texten die ähnlichsten Kompetenzen zu, alle Texte mit einem Matrixprodukt
+        
+        Eine Kompetenz wird zugeordnet, wenn ihre Ähnlichkeit min_similarity und den Anteil
+        relative_cutoff der besten Ähnlichkeit des Textes erreicht.
+        
+        Args:
+            texts: Texte, z.B. Lernziele
+            min_similarity: Mindestähnlichkeit einer Zuordnung
+            max_matches: Höchstzahl der Zuordnungen je Text
+            relative_cutoff: Mindestanteil an der besten Ähnlichkeit des Textes
+            
+        Returns:
+            List[List[Tuple[int, float]]]: Je Text (Kompetenzindex, Ähnlichkeit), absteigend sortiert
+        """
+        scores = self.similarities(texts)
+        if not scores.size or max_matches <= 0:
+            return [[] for _ in texts]
+        best = scores.max(axis=1, keepdims=True)
+        scores = np.where((scores >= min_similarity) & (scores >= best * relative_cutoff), scores, 0)
+        matches = []
+        for row, candidates in zip(scores, self._top_k(scores, max_matches)):
+            matches.append([(int(j), round(float(row[j]), 3)) for j in candidates if row[j] > 0])
+        return matches
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> List[List[int]]:
+        """Gibt je Zeile einer Ähnlichkeitsmatrix die Spalten der k höchsten Werte zurück, absteigend"""
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        return np.take_along_axis(top, order, axis=1).tolist()
+    
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, idf=self.idf, matrix=self.matrix,
+                            vocabulary=np.frombuffer(json.dumps(self.vocabulary).encode("utf-8"), dtype=np.uint8))
+        return buffer.getvalue()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SkillIndex":
+        with np.load(io.BytesIO(data)) as arrays:
+            vocabulary = json.loads(arrays["vocabulary"].tobytes().decode("utf-8"))
+            return cls(vocabulary, arrays["idf"], arrays["matrix"])
+
+
+class SkillIndexCache:
+    """Persistenter Cache für SkillIndex-Instanzen, je Kompetenzliste einmal erstellt
+    
+    Der Schlüssel ist der Hash der Kompetenzen (URI, Bezeichnung, Beschreibung), so dass
+    derselbe Beruf in Rahmenlehrplan und Ausbildungsrahmenplan denselben Index verwendet.
+    Zuletzt verwendete Indizes bleiben zusätzlich im Speicher.
+    """
+    
+    def __init__(self,
+                 cache_path: str = "./cache/esco_skill_index.sqlite",
+                 max_bytes: int = 128 * 1024 * 1024,
+                 memory_entries: int = 16):
+        """
+        Args:
+            cache_path: Pfad zur SQLite-Datei des Caches
+            max_bytes: Maximale Größe aller gespeicherten Indizes in Bytes
+            memory_entries: Anzahl der im Speicher gehaltenen Indizes
+        """
+        self._cache = DiskCache(cache_path, max_bytes=max_bytes)
+        self._memory: "OrderedDict[str, SkillIndex]" = OrderedDict()
+        self._memory_entries = memory_entries
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(skills: Sequence[Dict[str, Any]]) -> str:
+        payload = json.dumps({
+            "version": INDEX_VERSION,
+            "skills": [[skill.get("uri"), skill_text(skill.get("label")), skill_text(skill.get("description"))]
+                       for skill in skills]
+        }, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get_or_build(self, skills: Sequence[Dict[str, Any]]) -> SkillIndex:
+        """
+        Gibt den Index einer Kompetenzliste aus dem Cache zurück oder erstellt ihn
+        
+        Args:
+            skills: Kompetenzen mit "uri", "label" und optional "description"
+            
+        Returns:
+            SkillIndex: Index mit einer Zeile je Kompetenz in der übergebenen Reihenfolge
+        """
+        key = self.make_key(skills)
+        with self._lock:
+            index = self._memory.get(key)
+            if index is not None:
+                self._memory.move_to_end(key)
+                return index
+                
+        index = None
+        try:
+            data = self._cache.get(key)
+            if data is not None:
+                index = SkillIndex.from_bytes(data)
+        except Exception as e:
+            _log.error(f"Fehler beim Lesen des Kompetenzindex aus dem Cache: {str(e)}")
+        if index is None:
+            index = SkillIndex.build(skills)
+            try:
+                self._cache.set(key, index.to_bytes(), meta={"skills": len(skills)})
+            except Exception as e:
+                _log.error(f"Fehler beim Speichern des Kompetenzindex im Cache: {str(e)}")
+                
+        with self._lock:
+            self._memory[key] = index
+            while len(self._memory) > self._memory_entries:
+                self._memory.popitem(last=False)
+        return index
+    
+    def stats(self) -> CacheStats:
+        """Gibt die Trefferstatistik des Caches zurück"""
+        return self._cache.stats()
@@ -0,0 +1,153 @@
+import logging
+import math
+from typing import Any, Dict, List, Optional
+import tiktoken
+from .sections import SectionIndex, normalize_text
+
+_log = logging.getLogger(__name__)
+
+# Tokens, die je Anfrage für das Dokument zur Verfügung stehen. Der Rest des
+# Kontextfensters bleibt für Systemnachricht, Anweisung und Antwort.
+MODEL_CONTEXT_BUDGETS: Dict[str, int] = {
+    'gpt-4o': 100_000,
+    'gpt-4o-mini': 100_000,
+    'gpt-4-turbo-preview': 100_000,
+    'gpt-4': 6_000,
+    'gpt-3.5-turbo': 12_000,
+    'gpt-3.5-turbo-16k': 12_000
+}
+DEFAULT_CONTEXT_BUDGET = 6_000
+# Schätzung, falls kein Tokenizer verfügbar ist (deutscher Text, eher vorsichtig)
+CHARS_PER_TOKEN = 3.0
+
+_encodings: Dict[str, Optional[Any]] = {}
+
+def context_budget(model: str) -> int:
+    """Gibt das Kontextbudget eines Modells für den Dokumenttext in Tokens zurück"""
+    return MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+def _encoding(model: str) -> Optional[Any]:
+    """Lädt den Tokenizer eines Modells einmalig, None wenn er nicht verfügbar ist"""
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            _log.warning(f"Kein Tokenizer für {model} verfügbar, Tokens werden geschätzt: {str(e)}")
+            _encodings[model] = None
+    return _encodings[model]
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Zählt die Tokens eines Textes für ein Modell
+    
+    Args:
+        text: Zu zählender Text
+        model: Name des Modells
+        
+    Returns:
+        int: Anzahl Tokens, geschätzt über CHARS_PER_TOKEN, wenn kein Tokenizer verfügbar ist
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _split_lines(lines: List[str], max_tokens: int, model: str) -> List[List[str]]:
+    """Teilt einen zu großen Abschnitt zeilenweise in Teile innerhalb des Budgets"""
+    parts: List[List[str]] = [[]]
+    tokens = 0
+    for line in lines:
+        line_tokens = count_tokens(line, model) + 1
+        if parts[-1] and tokens + line_tokens > max_tokens:
+            parts.append([])
+            tokens = 0
+        parts[-1].append(line)
+        tokens += line_tokens
+    return parts
+
+def split_markdown(md_text: str, max_tokens: int, model: str) -> List[str]:
+    """
+    Teilt ein Dokument an Abschnittsgrenzen in Teile innerhalb des Kontextbudgets
+    
+    Abschnitte (Überschriften, Lernfeld-Markierungen, Tabellen) werden der Reihe nach
+    zusammengefasst, solange das Budget reicht. Ab dem zweiten Teil wird der Dokumentkopf
+    vorangestellt, damit jede Anfrage Titel und Berufsbezeichnung kennt.
+    
+    Args:
+        md_text: Markdown des Dokuments
+        max_tokens: Kontextbudget je Teil in Tokens
+        model: Name des Modells für die Tokenzählung
+        
+    Returns:
+        List[str]: Teile des Dokuments in Dokumentreihenfolge
+    """
+    index = SectionIndex(md_text)
+    header = index.header
+    header_tokens = count_tokens(header, model)
+    available = max(max_tokens - header_tokens, max_tokens // 2)
+    
+    chunks: List[List[str]] = [[]]
+    tokens = 0
+    for section in index.sections:
+        lines = index.lines[section.start_line:section.end_line]
+        section_tokens = count_tokens("\n".join(lines), model)
+        parts = [lines] if section_tokens <= available else _split_lines(lines, available, model)
+        for part in parts:
+            part_tokens = section_tokens if len(parts) == 1 else count_tokens("\n".join(part), model)
+            if chunks[-1] and tokens + part_tokens > available:
+                chunks.append([])
+                tokens = 0
+            chunks[-1].extend(part)
+            tokens += part_tokens
+            
+    texts = ["\n".join(lines) for lines in chunks]
+    return [texts[0]] + [f"{header}\n\n[...]\n\n{text}" for text in texts[1:]]
+
+def chunks_mentioning(chunks: List[str], name: str) -> List[str]:
+    """Gibt die Teile zurück, in denen ein Lernfeldname vorkommt"""
+    target = normalize_text(name)
+    return [chunk for chunk in chunks if target and target in normalize_text(chunk)]
+
+def _zeit_unspezifisch(zeit: Dict[str, str]) -> bool:
+    return zeit.get("wert", "").strip() in ("", "unspezifisch")
+
+def merge_lernfelder(results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Führt die strukturierten Lernfelder mehrerer Teile zusammen
+    
+    Lernfelder und Zeiträume gelten unabhängig von Schreibweise und Formatierung als gleich,
+    wenn ihre Namen übereinstimmen; so werden an Teilgrenzen geteilte Lernfelder nur
+    einmal übernommen. Doppelte Lernziele entfallen, fehlende Zeitangaben werden aus
+    späteren Teilen ergänzt.
+    
+    Args:
+        results: Lernfelder je Teil im Format von LERNFELD_SCHEMA
+        
+    Returns:
+        List[Dict[str, Any]]: Zusammengeführte Lernfelder in der Reihenfolge ihres ersten Auftretens
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for lernfelder in results:
+        for lernfeld in lernfelder:
+            key = normalize_text(lernfeld["lernfeld"])
+            if not key:
+                continue
+            target = merged.setdefault(key, {"lernfeld": lernfeld["lernfeld"].strip(), "zeitraeume": []})
+            
+            for zeitraum in lernfeld.get("zeitraeume", []):
+                zeitraum_key = normalize_text(zeitraum["zeitraum"])
+                existing = next((z for z in target["zeitraeume"] if normalize_text(z["zeitraum"]) == zeitraum_key), None)
+                if existing is None:
+                    existing = {"zeitraum": zeitraum["zeitraum"], "zeit": dict(zeitraum.get("zeit", {})), "lernziele": []}
+                    target["zeitraeume"].append(existing)
+                elif _zeit_unspezifisch(existing["zeit"]) and not _zeit_unspezifisch(zeitraum.get("zeit", {})):
+                    existing["zeit"] = dict(zeitraum["zeit"])
+                    
+                known = {normalize_text(lernziel) for lernziel in existing["lernziele"]}
+                for lernziel in zeitraum.get("lernziele", []):
+                    lernziel_key = normalize_text(lernziel)
+                    if lernziel_key and lernziel_key not in known:
+                        known.add(lernziel_key)
+                        existing["lernziele"].append(lernziel)
+                        
+    return list(merged.values())
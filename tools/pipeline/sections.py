@@ -0,0 +1,262 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+_log = logging.getLogger(__name__)
+
+HEADING_PATTERN = re.compile(r"^\s{0,3}(#{1,6})\s+(.*)$")
+LERNFELD_PATTERN = re.compile(r"^[\s|*_#>-]*Lernfeld\s+(\d+)\b", re.IGNORECASE)
+TABLE_ROW_PATTERN = re.compile(r"^\s*\|")
+# Erste Tabellenzelle, die einen neuen Eintrag beginnt, z.B. "| 3 |", "| 3. |" oder "| Lernfeld 3"
+TABLE_ITEM_PATTERN = re.compile(r"^\s*\|\s*(?:\d+\.?\s|\d+\.?\s*\||Lernfeld\s+\d+)", re.IGNORECASE)
+TABLE_SEPARATOR_PATTERN = re.compile(r"^\s*\|[\s:|-]+\|?\s*$")
+# Anzahl Zeilen, über die ein umbrochener Lernfeldname gesucht wird
+MATCH_WINDOW = 3
+
+
+@dataclass
+class Section:
+    """Abschnitt eines Markdown-Dokuments zwischen zwei Abschnittsgrenzen"""
+    kind: str  # "heading", "lernfeld", "table" oder "text"
+    title: str
+    start_line: int
+    end_line: int  # exklusiv
+    level: int = 0  # Überschriftenebene, 0 für Abschnitte ohne Überschrift
+    lernfeld_number: Optional[int] = None
+
+
+def normalize_text(text: str) -> str:
+    """Reduziert Text auf Kleinbuchstaben und Ziffern, damit Silbentrennung und Formatierung den Abgleich nicht stören"""
+    return "".join(ch for ch in text.lower() if ch.isalnum())
+
+def _words(text: str) -> List[str]:
+    """Liefert die aussagekräftigen Wörter eines Textes für den unscharfen Abgleich"""
+    return [w for w in re.findall(r"\w+", text.lower()) if len(w) > 3]
+
+
+class SectionIndex:
+    """Abschnittsindex eines konvertierten Dokuments für die Abfrage einzelner Lernfelder
+    
+    Der Index wird einmal je Dokument aus Überschriften, "Lernfeld N"-Markierungen und
+    Tabellengrenzen gebildet. Für ein Lernfeld liefert er nur dessen Abschnitt samt
+    weiterer Fundstellen (z.B. der Zeile der Übersichtstabelle mit dem Zeitrichtwert) und
+    einem kurzen Dokumentkopf, statt bei jeder Anfrage das ganze Dokument zu senden.
+    """
+    
+    def __init__(self,
+                 md_text: str,
+                 header_chars: int = 1000,
+                 context_lines: int = 2,
+                 max_section_chars: int = 24000,
+                 max_share: float = 0.5):
+        """
+        Args:
+            md_text: Markdown des Dokuments
+            header_chars: Länge des Dokumentkopfs, der jedem Ausschnitt vorangestellt wird
+            context_lines: Folgezeilen, die zu weiteren Fundstellen mitgesendet werden
+            max_section_chars: Maximale Länge des Hauptabschnitts eines Lernfelds; bei längeren
+                Abschnitten wird das ganze Dokument verwendet, statt den Abschnitt abzuschneiden
+            max_share: Anteil am Dokument, ab dem statt des Ausschnitts das ganze Dokument verwendet wird
+        """
+        self.md_text = md_text
+        self.lines = md_text.split("\n")
+        self.header_chars = header_chars
+        self.context_lines = context_lines
+        self.max_section_chars = max_section_chars
+        self.max_share = max_share
+        self._normalized = [normalize_text(line) for line in self.lines]
+        self.sections = self._build_sections()
+        self._section_of_line = [0] * len(self.lines)
+        for index, section in enumerate(self.sections):
+            for line_number in range(section.start_line, section.end_line):
+                self._section_of_line[line_number] = index
+    
+    def _build_sections(self) -> List[Section]:
+        """Zerlegt das Dokument an Überschriften, Lernfeld-Markierungen und Tabellengrenzen"""
+        sections: List[Section] = []
+        in_table = False
+        
+        for line_number, line in enumerate(self.lines):
+            heading = HEADING_PATTERN.match(line)
+            lernfeld = LERNFELD_PATTERN.match(line)
+            is_row = bool(TABLE_ROW_PATTERN.match(line))
+            
+            section = None
+            if lernfeld:
+                section = Section("lernfeld", line, line_number, line_number,
+                                  level=len(heading.group(1)) if heading else 0,
+                                  lernfeld_number=int(lernfeld.group(1)))
+            elif heading:
+                section = Section("heading", heading.group(2), line_number, line_number, level=len(heading.group(1)))
+            elif is_row and not in_table:
+                section = Section("table", line, line_number, line_number)
+            elif not is_row and in_table:
+                section = Section("text", line, line_number, line_number)
+            elif not sections:
+                section = Section("text", line, line_number, line_number)
+            in_table = is_row
+            
+            if section is not None:
+                if sections:
+                    sections[-1].end_line = line_number
+                sections.append(section)
+                
+        if sections:
+            sections[-1].end_line = len(self.lines)
+        return sections
+    
+    @property
+    def header(self) -> str:
+        """Dokumentkopf mit Titel und Berufsbezeichnung"""
+        return self.md_text[:self.header_chars].strip()
+    
+    def _matching_lines(self, name: str) -> List[int]:
+        """
+        Sucht die Zeilen, in denen ein Lernfeldname beginnt
+        
+        Der Name wird über MATCH_WINDOW Zeilen hinweg gesucht, damit auch umbrochene und
+        getrennte Namen gefunden werden. Wird der Name nicht wörtlich gefunden, werden die
+        Zeilen mit der größten Übereinstimmung der Wörter verwendet.
+        """
+        target = normalize_text(name)
+        if not target:
+            return []
+        
+        def window(start: int, size: int = MATCH_WINDOW) -> str:
+            return "".join(self._normalized[start:start + size])
+            
+        # Treffer nur in der Zeile zählen, ohne die der Name im Fenster nicht vollständig wäre
+        hits = [
+            line_number for line_number in range(len(self.lines))
+            if self._normalized[line_number]
+            and target in window(line_number)
+            and target not in window(line_number + 1, MATCH_WINDOW - 1)
+        ]
+        if hits:
+            return hits
+            
+        words = set(_words(name))
+        if len(words) < 2:
+            return []
+        scores = [len(words & set(_words(" ".join(self.lines[n:n + MATCH_WINDOW])))) / len(words)
+                  for n in range(len(self.lines))]
+        best = max(scores, default=0.0)
+        if best < 0.7:
+            return []
+        # Nur die erste Zeile eines Treffers behalten, der sich über mehrere Fenster erstreckt
+        return [n for n, score in enumerate(scores) if score == best and (n == 0 or scores[n - 1] < best)]
+    
+    def _enclosing_level(self, section_index: int) -> int:
+        """Ebene der nächsten vorangehenden Überschrift, 6 wenn es keine gibt"""
+        for section in reversed(self.sections[:section_index]):
+            if section.level:
+                return section.level
+        return 6
+    
+    def _span_from(self, line_number: int) -> Tuple[int, int]:
+        """
+        Bestimmt den Abschnitt eines Lernfelds ab seiner Fundstelle
+        
+        Returns:
+            Tuple[int, int]: Erste und letzte (exklusive) Zeile des Abschnitts
+        """
+        section_index = self._section_of_line[line_number]
+        section = self.sections[section_index]
+        
+        if section.kind == "table":
+            # Tabellenzeilen bis zum nächsten Eintrag, Kopfzeile der Tabelle voranstellen
+            end = line_number + 1
+            while end < section.end_line and not TABLE_ITEM_PATTERN.match(self.lines[end]):
+                end += 1
+            return line_number, end
+            
+        if section.kind == "text" and line_number - section.start_line >= MATCH_WINDOW:
+            return line_number, section.end_line
+            
+        # Fundstelle gehört zur Überschrift bzw. Lernfeld-Markierung des Abschnitts
+        if section.kind == "text" and section_index > 0 and self.sections[section_index - 1].kind in ("heading", "lernfeld") \
+                and section.start_line - self.sections[section_index - 1].start_line < MATCH_WINDOW:
+            section_index -= 1
+            section = self.sections[section_index]
+        level = section.level or self._enclosing_level(section_index)
+        
+        end = section.end_line
+        for following in self.sections[section_index + 1:]:
+            if following.kind == "lernfeld" and following.lernfeld_number != section.lernfeld_number:
+                break
+            if following.kind == "heading" and following.level <= level:
+                break
+            end = following.end_line
+        return section.start_line, end
+    
+    def _table_header(self, line_number: int) -> List[str]:
+        """Kopfzeile und Trennzeile der Tabelle, zu der eine Zeile gehört"""
+        section = self.sections[self._section_of_line[line_number]]
+        if section.kind != "table" or line_number <= section.start_line + 1:
+            return []
+        header = [self.lines[section.start_line]]
+        if section.start_line + 1 < section.end_line and TABLE_SEPARATOR_PATTERN.match(self.lines[section.start_line + 1]):
+            header.append(self.lines[section.start_line + 1])
+        return header
+    
+    def find(self, name: str) -> Optional[Tuple[Tuple[int, int], List[int]]]:
+        """
+        Findet Hauptabschnitt und weitere Fundstellen eines Lernfelds
+        
+        Args:
+            name: Name des Lernfelds bzw. Ausbildungsteils
+            
+        Returns:
+            Optional[Tuple[Tuple[int, int], List[int]]]: Zeilenbereich des Hauptabschnitts und
+            Zeilen weiterer Fundstellen oder None, wenn das Lernfeld nicht gefunden wurde
+        """
+        hits = self._matching_lines(name)
+        if not hits:
+            return None
+            
+        spans = [self._span_from(line_number) for line_number in hits]
+        # Beschreibungen unter einer Lernfeld-Markierung haben Vorrang vor Übersichten und Verweisen
+        marked = [span for span in spans
+                  if self.sections[self._section_of_line[span[0]]].kind == "lernfeld"]
+        main = marked[0] if marked else max(spans, key=lambda span: span[1] - span[0])
+        others = [line_number for line_number in hits if not main[0] <= line_number < main[1]]
+        return main, others
+    
+    def slice_for(self, name: str) -> Optional[str]:
+        """
+        Liefert den Ausschnitt des Dokuments für ein Lernfeld
+        
+        Args:
+            name: Name des Lernfelds bzw. Ausbildungsteils
+            
+        Returns:
+            Optional[str]: Dokumentkopf, Hauptabschnitt und weitere Fundstellen oder None,
+            wenn das Lernfeld nicht gefunden wurde, der Hauptabschnitt max_section_chars
+            überschreitet oder der Ausschnitt kaum kürzer wäre
+        """
+        found = self.find(name)
+        if found is None:
+            _log.info(f"Kein Abschnitt für '{name}' gefunden, verwende das ganze Dokument")
+            return None
+        (start, end), others = found
+        
+        main = "\n".join(self._table_header(start) + self.lines[start:end])
+        if len(main) > self.max_section_chars:
+            # Abschneiden würde spätere Lernziele stillschweigend verlieren
+            _log.info(f"Abschnitt für '{name}' umfasst {len(main)} Zeichen (mehr als {self.max_section_chars}), "
+                      f"verwende das ganze Dokument")
+            return None
+        parts = [self.header, main]
+        for line_number in others:
+            context = self._table_header(line_number) + self.lines[line_number:line_number + 1 + self.context_lines]
+            parts.append("\n".join(context))
+            
+        text = "\n\n[...]\n\n".join(part for part in parts if part.strip())
+        if len(text) >= self.max_share * len(self.md_text):
+            return None
+        return text
+    
+    def text_for(self, name: str) -> str:
+        """Liefert den Ausschnitt eines Lernfelds oder, falls keiner gefunden wird, das ganze Dokument"""
+        return self.slice_for(name) or self.md_text
@@ -0,0 +1,167 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+_log = logging.getLogger(__name__)
+
+# Schema eines Lernfelds bzw. Ausbildungsteils mit Zeiträumen, Zeitwerten und Lernzielen
+LERNFELD_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "lernfeld": {"type": "string"},
+        "zeitraeume": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "zeitraum": {"type": "string"},
+                    "zeit": {
+                        "type": "object",
+                        "properties": {
+                            "wert": {"type": "string"},
+                            "einheit": {"type": "string"}
+                        },
+                        "required": ["wert", "einheit"],
+                        "additionalProperties": False
+                    },
+                    "lernziele": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["zeitraum", "zeit", "lernziele"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["lernfeld", "zeitraeume"],
+    "additionalProperties": False
+}
+
+# Schema für alle Lernfelder eines Dokuments in einer Antwort
+DOCUMENT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "lernfelder": {"type": "array", "items": LERNFELD_SCHEMA}
+    },
+    "required": ["lernfelder"],
+    "additionalProperties": False
+}
+
+LERNFELD_INSTRUCTION = """Extrahiere für das Lernfeld bzw. den Ausbildungsteil '{lernfeld_name}' alle Zeiträume mit der jeweiligen Zeitangabe und den zugehörigen Lernzielen.
+Bekannte Zeiträume: {zeitraeume}
+
+Gib die Zeit als Zahl (wert) und Einheit (einheit) an, z.B. wert '40' und einheit 'Stunden'.
+Fehlt eine Zeitangabe, setze wert und einheit auf 'unspezifisch'.
+Jedes Lernziel ist ein eigener Listeneintrag ohne Aufzählungszeichen oder Nummerierung."""
+
+DOCUMENT_INSTRUCTION = """Extrahiere alle Lernfelder bzw. Ausbildungsteile des Dokuments mit ihren Zeiträumen, der jeweiligen Zeitangabe und den zugehörigen Lernzielen.
+Entferne Nummerierungen und Aufzählungszeichen vor den Namen der Lernfelder bzw. Ausbildungsteile.
+
+Gib die Zeit als Zahl (wert) und Einheit (einheit) an, z.B. wert '40' und einheit 'Stunden'.
+Fehlt eine Zeitangabe, setze wert und einheit auf 'unspezifisch'.
+Jedes Lernziel ist ein eigener Listeneintrag ohne Aufzählungszeichen oder Nummerierung."""
+
+def json_schema_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Erstellt das response_format für strukturierte Ausgaben nach JSON-Schema
+    
+    Args:
+        name: Name des Schemas
+        schema: JSON-Schema der erwarteten Antwort
+        
+    Returns:
+        Dict[str, Any]: Wert für den Parameter response_format der Chat-API
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema}
+    }
+
+def parse_json_response(response: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Liest eine JSON-Antwort ein, gibt bei leerer oder ungültiger Antwort None zurück"""
+    if not response:
+        return None
+    try:
+        return json.loads(response)
+    except json.JSONDecodeError as e:
+        _log.error(f"Ungültige JSON-Antwort: {str(e)}")
+        return None
+
+def _zeit_text(zeit: Dict[str, str]) -> str:
+    """Setzt Wert und Einheit einer Zeitangabe wieder zusammen"""
+    wert = zeit.get("wert", "").strip()
+    einheit = zeit.get("einheit", "").strip()
+    if not wert or wert == "unspezifisch":
+        return "unspezifisch"
+    return f"{wert} {einheit}".strip() if einheit != "unspezifisch" else wert
+
+def lernfeld_to_rows(document_type: str, berufsbild_name: str, lernfeld: Dict[str, Any]) -> List[List[str]]:
+    """
+    Wandelt ein strukturiertes Lernfeld in Tabellenzeilen um
+    
+    Args:
+        document_type: Erkannter Dokumententyp
+        berufsbild_name: Erkanntes Berufsbild
+        lernfeld: Lernfeld im Format von LERNFELD_SCHEMA
+        
+    Returns:
+        List[List[str]]: Zeilen [Dokumententyp, Berufsbild, Lernfeld, Zeitraum, Zeit, Lernziel]
+    """
+    rows = []
+    for zeitraum in lernfeld.get("zeitraeume", []):
+        zeit = _zeit_text(zeitraum.get("zeit", {}))
+        for lernziel in zeitraum.get("lernziele", []):
+            if lernziel.strip():
+                rows.append([
+                    document_type,
+                    berufsbild_name,
+                    lernfeld["lernfeld"],
+                    zeitraum["zeitraum"].strip(),
+                    zeit,
+                    lernziel.strip()
+                ])
+    return rows
+
+def build_document_data(berufsbezeichnung: str, berufsbeschreibung: str,
+                        lernfelder: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Baut die hierarchische Dokumentstruktur direkt aus strukturierten Lernfeldern
+    
+    Entspricht dem Ergebnis von process_document_data() in app.py, ohne den Umweg über
+    Semikolon-getrennte Tabellenzeilen.
+    
+    Args:
+        berufsbezeichnung: Erkanntes Berufsbild
+        berufsbeschreibung: Generierte Berufsbeschreibung
+        lernfelder: Lernfelder im Format von LERNFELD_SCHEMA
+        
+    Returns:
+        Dict[str, Any]: Dokumentdaten mit Lernfeldern, Zeiträumen und Lernzielen
+    """
+    doc_data = {
+        "berufsbezeichnung": berufsbezeichnung,
+        "berufsbeschreibung": berufsbeschreibung,
+        "lernfelder_ausbildungsteile": {}
+    }
+    
+    for lernfeld in lernfelder:
+        lernfeld_data = doc_data["lernfelder_ausbildungsteile"].setdefault(lernfeld["lernfeld"], {
+            "beschreibung": lernfeld["lernfeld"],
+            "zeitraeume": {}
+        })
+        for zeitraum in lernfeld.get("zeitraeume", []):
+            zeit = zeitraum.get("zeit", {})
+            zeitraum_data = lernfeld_data["zeitraeume"].setdefault(zeitraum["zeitraum"].strip(), {
+                "zeit": {
+                    "wert": zeit.get("wert", "").strip() or "unspezifisch",
+                    "einheit": zeit.get("einheit", "").strip() or "unspezifisch"
+                },
+                "lernziele": {}
+            })
+            for lernziel in zeitraum.get("lernziele", []):
+                if lernziel.strip():
+                    lz_id = f"dok_lz_{len(zeitraum_data['lernziele']) + 1}"
+                    zeitraum_data["lernziele"][lz_id] = {
+                        "text": lernziel.strip(),
+                        "esco_mappings": []
+                    }
+                    
+    return doc_data
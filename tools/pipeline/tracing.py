@@ -0,0 +1,239 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+_log = logging.getLogger(__name__)
+
+# Kennzahlen, die über alle Unterspans eines Schritts aufsummiert werden
+METRICS = ("calls", "retries", "cache_hits", "prompt_tokens", "cached_tokens", "completion_tokens", "cost")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_metrics_lock = threading.Lock()
+
+
+class Span:
+    """Zeitabschnitt der Verarbeitung mit Attributen, Kennzahlen und Unterspans
+    
+    kind unterscheidet Dokumente ("document"), Verarbeitungsschritte ("step"),
+    Konvertierungen ("conversion"), lokale Indizes ("index") sowie einzelne LLM- ("llm")
+    und ESCO-Aufrufe ("esco").
+    """
+    
+    def __init__(self, name: str, kind: str = "step", **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = attributes
+        self.metrics: Dict[str, float] = {}
+        self.children: List["Span"] = []
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self._started = time.monotonic()
+    
+    def set(self, **attributes) -> None:
+        """Setzt Attribute des Spans"""
+        self.attributes.update(attributes)
+    
+    def add(self, metric: str, amount: float = 1) -> None:
+        """Erhöht eine Kennzahl des Spans (auch aus nebenläufigen Aufrufen)"""
+        with _metrics_lock:
+            self.metrics[metric] = self.metrics.get(metric, 0) + amount
+    
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.monotonic() - self._started
+    
+    @property
+    def elapsed(self) -> float:
+        """Dauer in Sekunden, bei laufenden Spans bis jetzt"""
+        return self.duration if self.duration is not None else time.monotonic() - self._started
+    
+    def totals(self) -> Dict[str, float]:
+        """
+        Summiert die Kennzahlen des Spans und aller Unterspans
+        
+        Zusätzlich enthält das Ergebnis die Anzahl der ESCO-Aufrufe (esco_calls) und die
+        Summe der Dauer aller LLM- bzw. ESCO-Aufrufe (llm_seconds, esco_seconds); bei
+        nebenläufigen Aufrufen kann sie die Dauer des Schritts übersteigen.
+        """
+        totals = {metric: 0.0 for metric in METRICS + ("esco_calls", "llm_seconds", "esco_seconds")}
+        stack = [self]
+        while stack:
+            span = stack.pop()
+            for metric, value in span.metrics.items():
+                totals[metric] = totals.get(metric, 0.0) + value
+            if span.kind == "esco":
+                totals["esco_calls"] += 1
+            if span.kind in ("llm", "esco"):
+                totals[f"{span.kind}_seconds"] += span.elapsed
+            stack.extend(span.children)
+        return totals
+    
+    def descendants(self, kind: str) -> List["Span"]:
+        """Gibt alle Unterspans einer Art in Aufrufreihenfolge zurück, z.B. alle LLM-Aufrufe"""
+        found = []
+        for child in self.children:
+            if child.kind == kind:
+                found.append(child)
+            found.extend(child.descendants(kind))
+        return found
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Gibt den Span mit allen Unterspans als JSON-serialisierbares Dictionary zurück"""
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "start": datetime.fromtimestamp(self.start).isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.elapsed * 1000, 1),
+            "attributes": self.attributes,
+            "metrics": self.metrics,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+
+def current_span() -> Optional[Span]:
+    """Gibt den aktuell geöffneten Span zurück, None außerhalb eines Traces"""
+    return _current_span.get()
+
+def add_metric(metric: str, amount: float = 1) -> None:
+    """Erhöht eine Kennzahl des aktuellen Spans, ohne Wirkung außerhalb eines Traces"""
+    span = _current_span.get()
+    if span is not None:
+        span.add(metric, amount)
+
+def record_usage(usage: Any) -> None:
+    """Überträgt die Token-Nutzung und Kosten eines API-Aufrufs (CallUsage) in den aktuellen Span"""
+    span = _current_span.get()
+    if span is None:
+        return
+    span.add("prompt_tokens", usage.prompt_tokens)
+    span.add("cached_tokens", usage.cached_tokens)
+    span.add("completion_tokens", usage.completion_tokens)
+    span.add("cost", usage.cost)
+
+@contextmanager
+def span(name: str, kind: str = "step", **attributes) -> Iterator[Span]:
+    """
+    Öffnet einen Span als Unterspan des aktuellen Spans
+    
+    Der Span gilt im Block als aktueller Span, auch in Coroutinen, die aus dem Block
+    gestartet werden (contextvars). Außerhalb eines Traces wird er nur gemessen.
+    
+    Args:
+        name: Name des Spans
+        kind: Art des Spans, siehe Span
+        **attributes: Attribute des Spans
+    """
+    parent = _current_span.get()
+    new_span = Span(name, kind, **attributes)
+    if parent is not None:
+        parent.children.append(new_span)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except Exception as e:
+        new_span.set(error=str(e))
+        raise
+    finally:
+        new_span.end()
+        _current_span.reset(token)
+
+
+class DocumentTrace:
+    """Trace der Verarbeitung eines Dokuments aus nacheinander ablaufenden Schritten
+    
+    step() beendet den laufenden Schritt und beginnt den nächsten, so dass sich der
+    Trace an bestehende Fortschrittsmeldungen anhängen lässt. Als Kontextmanager
+    verwendet, endet der Trace auch bei vorzeitigem Abbruch der Verarbeitung und wird,
+    falls ein Pfad angegeben ist, als JSON gespeichert.
+    """
+    
+    def __init__(self, name: str, output_path: Optional[str] = None, **attributes):
+        """
+        Args:
+            name: Name des Dokuments
+            output_path: Pfad der JSON-Datei, in die der Trace beim Beenden geschrieben wird
+            **attributes: Attribute des Dokument-Spans
+        """
+        self.root = Span(name, "document", **attributes)
+        self.output_path = output_path
+        self._step: Optional[Span] = None
+        self._token: Optional[contextvars.Token] = None
+        self._step_token: Optional[contextvars.Token] = None
+    
+    def __enter__(self) -> "DocumentTrace":
+        self._token = _current_span.set(self.root)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.root.set(error=str(exc))
+        self.end()
+    
+    def _end_step(self) -> None:
+        if self._step is not None:
+            self._step.end()
+            _current_span.reset(self._step_token)
+            self._step = None
+    
+    def step(self, name: str, **attributes) -> Span:
+        """
+        Beendet den laufenden Schritt und beginnt einen neuen
+        
+        Args:
+            name: Name des Schritts
+            **attributes: Attribute des Schritts
+            
+        Returns:
+            Span: Span des neuen Schritts
+        """
+        self._end_step()
+        self._step = Span(name, "step", **attributes)
+        self.root.children.append(self._step)
+        self._step_token = _current_span.set(self._step)
+        return self._step
+    
+    def attach(self, span: Span) -> None:
+        """Hängt einen außerhalb des Traces gemessenen Span an, z.B. die gemeinsame Konvertierung"""
+        self.root.children.append(span)
+    
+    def end(self) -> None:
+        """Beendet Schritt und Trace und speichert ihn, falls ein Pfad angegeben ist"""
+        if self.root.duration is not None:
+            return
+        self._end_step()
+        self.root.end()
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        if self.output_path:
+            self.save(self.output_path)
+    
+    def save(self, path: str) -> None:
+        """Speichert den Trace als JSON-Datei"""
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.root.to_dict(), f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            _log.error(f"Fehler beim Speichern des Traces {path}: {str(e)}")
+    
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Fasst den Trace je Schritt zusammen
+        
+        Returns:
+            List[Dict[str, Any]]: Je Schritt Name, Dauer und aufsummierte Kennzahlen,
+            zuletzt eine Zeile "Gesamt" für das ganze Dokument
+        """
+        rows = []
+        for span in self.root.children + [self.root]:
+            rows.append({
+                "schritt": "Gesamt" if span is self.root else span.name,
+                "dauer": span.elapsed,
+                **span.totals()
+            })
+        return rows